@@ -459,19 +459,17 @@ def loadXArray(varname=None, varlist=None, folder=None, grid=None, bias_correcti
         folder = '{}/{}'.format(folder,grid) # non-native grids are stored in sub-folders
         # auto-detect resampling folders 
         if resampling is None:
-            old_folder = os.getcwd()
-            os.chdir(folder)
-            # inspect folder
+            # inspect folder (without changing the working directory)
             nc_file = False; default_folder = False; folder_list = []
-            for item in os.listdir():
-                if os.path.isfile(item):
+            for item in os.listdir(folder):
+                itempath = os.path.join(folder,item)
+                if os.path.isfile(itempath):
                     if item.endswith('.nc'): nc_file = True
-                elif os.path.isdir(item):
+                elif os.path.isdir(itempath):
                     if item.lower() == 'default': default_folder = item
                     folder_list.append(item)
                 else:
                     raise IOError(item)
-            os.chdir(old_folder) # return
             # evaluate findings
             if nc_file: resampling = None
             elif default_folder: resampling = default_folder
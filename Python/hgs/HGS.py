@@ -12,9 +12,10 @@ import datetime as dt
 import numpy as np
 import pandas as pd
 import os.path as osp
-import os, glob
+import os
 import inspect
 from copy import deepcopy
+from warnings import warn
 # internal imports
 from geodata.misc import ArgumentError, VariableError, DataError, isNumber, DatasetError, translateSeasons
 from datasets.common import BatchLoad, getRootFolder
@@ -25,10 +26,10 @@ from geodata.gdal import grid_folder as common_grid_folder
 # Graham's package
 from hgs_output import binary
 # local imports
-from hgs.misc import interpolateIrregular, convertDate, parseObsWells
+from hgs.misc import interpolateIrregular, convertDate, parseObsWells, planMemory, formatMemPlan, allocateArray
 from hgs.PGMN import loadMetadata, loadPGMN_TS
 # import filename patterns
-from hgsrun.misc import hydro_files, well_files, newton_file, water_file
+from hgsrun.misc import hydro_files, well_files, newton_file, water_file, RunDirIndex, lastRecord
 
 ## HGS Meta-vardata
 
@@ -311,6 +312,13 @@ def loadHGS_StnTS(station=None, well=None, varlist='default', layers=None, z_lay
       line = f.readline(); lline = line.lower() # 3rd line
       if "zone" not in lline: raise GageStationError(line,filepath)
       if zone.lower() not in lline: raise GageStationError(line,filepath)
+  # check if the record is complete, before the entire file is parsed (only the end of the file is read)
+  last_record = lastRecord(filepath, lwell=well is not None)
+  last_time = last_record[0] if last_record else 0.
+  end_time = ( time_resampled[-1].astype('datetime64[s]') - start_datetime.astype('datetime64[s]') ) / np.timedelta64(1,'s')
+  max_gap = 3*86400. if lcheckComplete else 5*86400. # same thresholds as in interpolateIrregular
+  if ( end_time - last_time ) > max_gap:
+      warn("Data record ends more than {:d} days befor end of period: {} days\n('{:s}')".format(int(max_gap/86400.),(end_time-last_time)/86400.,filepath))
   # figure out varlist and vardata columns
   if variable_order[0].lower() == 'time':
       offset = 1 
@@ -458,7 +466,8 @@ def loadHGS_StnTS(station=None, well=None, varlist='default', layers=None, z_lay
   # call function to interpolate irregular HGS timeseries to regular monthly timseries  
   data = interpolateIrregular(old_time=time_series, lkgs=lkgs, data=data, new_time=time_resampled, 
                               start_date=start_datetime, interp_kind='linear', 
-                              lcheckComplete=lcheckComplete, usecols=varcols, fill_value=np.NaN)
+                              lcheckComplete=None, usecols=varcols, fill_value=np.NaN)
+  # N.B.: completeness was already checked above, based on the last record in the file
   assert data.shape[0] == len(time), (data.shape,len(time),len(variable_order))
   
 #   print("Interpolating:",time_fct()-toc)  
@@ -754,10 +763,16 @@ def loadHGS(varlist=None, folder=None, name=None, title=None, basin=None, season
             mode='climatology', file_mode='last_12', file_pattern='{PREFIX}o.head_olf.????',  
             lkgs=False, varatts=None, constatts=None, lstrip=True, lxyt=True, grid_folder=None, 
             basin_list=None, metadata=None, conservation_authority=None, var_opts=None,
-            override_k_option='Anisotropic Elemental K', lallelem=False, **kwargs):
+            override_k_option='Anisotropic Elemental K', lallelem=False, mem_budget=None, mem_reduce=None,
+            mem_folder=None, lprint=False, **kwargs):
   ''' Get a properly formatted WRF dataset with monthly time-series at station locations; as in
-      the hgsrun module, the capitalized kwargs can be used to construct folders and/or names '''
+      the hgsrun module, the capitalized kwargs can be used to construct folders and/or names;
+      if a memory budget is given (bytes or fraction of available memory), the size of the request is
+      estimated before allocation and variables are either reduced along the time axis ('mem_reduce'),
+      or backed by temporary files in 'mem_folder', if they do not fit into memory; the load plan is 
+      printed, if 'lprint' is True '''
   if folder is None: raise ArgumentError
+  if mem_reduce and mem_reduce not in ('mean','sum','min','max'): raise ArgumentError(mem_reduce)
   if metadata is None: metadata = dict()
   # unit options: cubic meters or kg  
   varatts = deepcopy( varatts or ( binary_attributes_kgs if lkgs else binary_attributes_mms ) )
@@ -795,7 +810,7 @@ def loadHGS(varlist=None, folder=None, name=None, title=None, basin=None, season
   # find files/time-steps to load
   if not t_list:
       glob_folder = osp.join(folder.format(**expargs),file_pattern.format(**expargs))
-      file_list = glob.glob(glob_folder)
+      file_list = RunDirIndex(folder).glob(file_pattern.format(**expargs)) # single folder scan
       if len(file_list) == 0: 
           raise DataError("No binary output files found:\n '{}'".format(glob_folder))
       t_list = [int(f[-4:]) for f in file_list]
@@ -1007,8 +1022,8 @@ def loadHGS(varlist=None, folder=None, name=None, title=None, basin=None, season
   # remove constant variables from varlist (already loaded)
   varlist = [var for var in varlist if var not in constatts]  
      
-  # initialize variables
-  load_varlist = []
+  # determine variable shapes
+  var_axes = dict()
   for hgsvar in varlist:
       atts = varatts[hgsvar]
       aa = atts['atts']
@@ -1021,13 +1036,34 @@ def loadHGS(varlist=None, folder=None, name=None, title=None, basin=None, season
           axes = (node_ax,)
           if aa.get('pm',False): axes = (sheet_ax,)+axes
       if aa.get('vector',False): axes = axes+(vector_ax,)
-      axes = (time,)+axes
+      var_axes[hgsvar] = (time,)+axes
+  # estimate memory requirements and decide how to load (before any allocation)
+  plan = planMemory({hgsvar:tuple(len(ax) for ax in axes) for hgsvar,axes in var_axes.items()}, 
+                    mem_budget=mem_budget, mem_reduce=mem_reduce)
+  lreduce = plan['mode'] == 'reduce'
+  if lprint: print(formatMemPlan(plan))
+  dataset.atts['load_plan'] = plan['mode']
+  # initialize variables
+  load_varlist = []
+  for hgsvar in varlist:
+      atts = varatts[hgsvar]
+      axes = var_axes[hgsvar]
+      if lreduce: 
+          axes = axes[1:] # reduce time axis
+          atts['atts']['time_reduction'] = mem_reduce
       shape = tuple([len(ax) for ax in axes]) 
       # save name and variable
-      dataset += Variable(data=np.zeros(shape),axes=axes, **atts)
+      dataset += Variable(data=allocateArray(shape, plan=plan, mem_folder=mem_folder), axes=axes, **atts)
       load_varlist.append(atts['name'])
   # add simulation time variable
   dataset += Variable(data=np.zeros((te,)), axes=(time,), **constatts['model_time'])
+  # function to store a time step in a variable (or apply the reduction)
+  def storeData(variable, i, data):
+      if not lreduce: variable.data_array[i,:] = data
+      elif i == 0: variable.data_array[:] = data
+      elif mem_reduce == 'min': np.minimum(variable.data_array, data, out=variable.data_array)
+      elif mem_reduce == 'max': np.maximum(variable.data_array, data, out=variable.data_array)
+      else: variable.data_array[:] += data # sum or mean
     
   # now fill in the remaining data
   for i,t in enumerate(t_list):
@@ -1084,7 +1120,7 @@ def loadHGS(varlist=None, folder=None, name=None, title=None, basin=None, season
 #                         data = data[1:] 
               else:
                   raise NotImplementedError(fct_name)
-              variable.data_array[i,:] = data       
+              storeData(variable, i, data)
           elif aa.get('vector',False):
               df = reader.read_vec(hgsvar)
               if linterp:
@@ -1092,7 +1128,7 @@ def loadHGS(varlist=None, folder=None, name=None, title=None, basin=None, season
                   else: data = reader.interpolate_node2element(df, elements=elem_olf_offset, lpd=False)
               else: data = df.values
               if l3d: data = data.reshape(shp3d+(3,))   
-              variable.data_array[i,:] = data
+              storeData(variable, i, data)
 #               else:        
 #                   for j in range(3): # transposing vectors
 #                       variable.data_array[i,j,:] = data[:,j]
@@ -1107,13 +1143,13 @@ def loadHGS(varlist=None, folder=None, name=None, title=None, basin=None, season
                   if linterp:
                       data = reader.interpolate_node2element(df, elements=elem_pm, lpd=False)
                   else: data = df.values
-                  variable.data_array[i,:] = data.reshape(shp3d)
+                  storeData(variable, i, data.reshape(shp3d))
               else:
                   df = reader.read_var(hgsvar, ne)
                   if linterp:
                       data = reader.interpolate_node2element(df, elements=elem_olf_offset, lpd=False)
                   else: data = df.values
-                  variable.data_array[i,:] = data.squeeze()
+                  storeData(variable, i, data.squeeze())
           # save dependencies
           if hgsvar in all_deps: all_deps[hgsvar] = df # dataframes are not interpolated to elements
           if linterp and hgsvar+'_elm' in all_deps: 
@@ -1121,6 +1157,9 @@ def loadHGS(varlist=None, folder=None, name=None, title=None, basin=None, season
               all_deps[hgsvar+'_elm'] = data
       # save timestamp
       dataset['model_time'].data_array[i] = sim_time              
+  # finalize averaging for reduced variables
+  if lreduce and mem_reduce == 'mean':
+      for var in load_varlist: dataset[var].data_array[:] /= te
     
   # now remove all unwanted variables...
   if lstrip:
@@ -7,6 +7,7 @@ A module contianing various utility functions for HGS data
 '''
 
 # external imports
+import os, tempfile
 import numpy as np
 import pandas as pd
 from scipy.interpolate import interp1d
@@ -89,7 +90,9 @@ def interpolateIrregular(old_time, data, new_time, start_date=None, lkgs=True, l
     old_time = np.concatenate(([0],old_time), axis=0) # integrated flow at time zero must be zero...
     data = np.concatenate(([[0,]*ncols],data), axis=0) # ... this is probably better than interpolation
     # N.B.: we are adding zeros here so we don't have to extrapolate to the left; on the right we just fill in NaN's
-    if ( new_time[-1] - old_time[-1] ) > 3*86400. and lcheckComplete: 
+    # N.B.: lcheckComplete=None skips the check (e.g. if the caller already checked the record)
+    if lcheckComplete is None: pass
+    elif ( new_time[-1] - old_time[-1] ) > 3*86400. and lcheckComplete: 
         warn("Data record ends more than 3 days befor end of period: {} days".format((new_time[-1]-old_time[-1])/86400.))
     elif (new_time[-1]-old_time[-1]) > 5*86400.: 
         if lcheckComplete: 
@@ -251,5 +254,95 @@ def parseObsWells(filepath, variables=None, constants=None, layers=None, z_layer
     else: return time,data,const
   
 
+## memory planning for binary data loading
+
+# function to determine available physical memory
+def availableMemory():
+    ''' return the amount of available physical memory in bytes, or None if it cannot be determined '''
+    # Linux: MemAvailable also accounts for reclaimable caches
+    if os.path.exists('/proc/meminfo'):
+        with open('/proc/meminfo','r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1])*1024 # given in kB
+    # fall back to POSIX sysconf (free pages only)
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, AttributeError, OSError):
+        return None
+
+# function to convert a memory budget specification to bytes
+def resolveMemBudget(mem_budget):
+    ''' convert a memory budget to bytes: numbers between 0 and 1 are interpreted as fractions of the 
+        available memory, other numbers as bytes, and strings may have a unit suffix (e.g. '16GB') '''
+    if mem_budget is None: return None
+    if isinstance(mem_budget,str):
+        units = dict(K=2**10, M=2**20, G=2**30, T=2**40)
+        budget = mem_budget.strip().upper().rstrip('B')
+        if budget and budget[-1] in units: 
+            return int(float(budget[:-1])*units[budget[-1]])
+        else: 
+            return int(float(budget))
+    elif isinstance(mem_budget,(int,np.integer,float,np.inexact)) and not isinstance(mem_budget,(bool,np.bool_)):
+        if 0 < mem_budget <= 1:
+            available = availableMemory()
+            if available is None: 
+                raise ArgumentError("Unable to determine available memory; specify 'mem_budget' in bytes.")
+            return int(mem_budget*available)
+        elif mem_budget > 1: return int(mem_budget)
+        else: raise ValueError(mem_budget)
+    else: raise TypeError(mem_budget)
+
+# function to estimate memory requirements and select a load mode
+def planMemory(shapes, mem_budget=None, mem_reduce=None, dtype=np.float64, taxis=0):
+    ''' estimate the memory required to hold variables with the given shapes (a dictionary of name:shape)
+        and select a load mode based on the memory budget:
+          'in-core': all variables are held in memory (default behavior)
+          'reduce' : variables are reduced along the time axis while streaming through time steps
+          'memmap' : variables are backed by temporary files and filled one time step at a time
+        the reduction mode is only selected, if an operation is specified ('mem_reduce'); the working 
+        set of one time step (plus a temporary copy) is always required in memory '''
+    itemsize = np.dtype(dtype).itemsize
+    nbytes = 0; step_bytes = 0; reduced_bytes = 0
+    for shape in shapes.values():
+        size = int(np.prod(shape, dtype=np.int64))
+        step = size // shape[taxis] if shape[taxis] > 0 else 0
+        nbytes += size*itemsize
+        step_bytes += 2*step*itemsize # temporary reader arrays and interpolated copies
+        reduced_bytes += step*itemsize
+    budget = resolveMemBudget(mem_budget)
+    # select load mode
+    if budget is None or nbytes + step_bytes <= budget: mode = 'in-core'
+    elif mem_reduce and reduced_bytes + step_bytes <= budget: mode = 'reduce'
+    else: mode = 'memmap'
+    if budget is not None and step_bytes > budget:
+        warn("The working set of a single time step ({:.1f} MB) exceeds the memory budget ({:.1f} MB).".format(
+             step_bytes/2.**20,budget/2.**20))
+    plan = dict(mode=mode, budget=budget, nbytes=nbytes, step_bytes=step_bytes, reduced_bytes=reduced_bytes,
+                reduction=mem_reduce if mode == 'reduce' else None, nvar=len(shapes))
+    return plan
+
+# function to format the load plan for reporting
+def formatMemPlan(plan):
+    ''' return a one-line summary of a load plan '''
+    budget = 'unlimited' if plan['budget'] is None else '{:.1f} MB'.format(plan['budget']/2.**20)
+    report = "Load plan: '{:s}' for {:d} variables; requested {:.1f} MB, per time step {:.1f} MB, budget {:s}".format(
+             plan['mode'], plan['nvar'], plan['nbytes']/2.**20, plan['step_bytes']/2.**20, budget)
+    if plan['reduction']: report += " (time-{:s} reduction: {:.1f} MB)".format(plan['reduction'], plan['reduced_bytes']/2.**20)
+    return report
+
+# function to allocate an array according to a load plan
+def allocateArray(shape, plan=None, dtype=np.float64, mem_folder=None):
+    ''' allocate a zero-initialized array in memory or backed by an anonymous temporary file (empty 
+        arrays are always allocated in memory, since files of size zero can not be mapped) '''
+    if plan is None or plan['mode'] != 'memmap':
+        return np.zeros(shape, dtype=dtype)
+    elif int(np.prod(shape, dtype=np.int64)) == 0:
+        return np.empty(shape, dtype=dtype)
+    else:
+        # N.B.: the temporary file is unlinked immediately, so disk space is released with the mapping
+        return np.memmap(tempfile.TemporaryFile(dir=mem_folder), dtype=dtype, mode='w+', shape=shape)
+  
+
 if __name__ == '__main__':
     pass
\ No newline at end of file
@@ -0,0 +1,105 @@
+'''
+Created on Oct 19, 2026
+
+Unittests for hgs components.
+'''
+
+import unittest
+import numpy as np
+import shutil, tempfile
+from unittest import mock
+
+# import modules to be tested
+from hgs.misc import resolveMemBudget, planMemory, formatMemPlan, allocateArray, ArgumentError
+
+
+## tests for memory planning in loadHGS
+class MemPlanTest(unittest.TestCase):
+
+  def setUp(self):
+    ''' create a folder for memory-mapped arrays '''
+    self.mem_folder = tempfile.mkdtemp(prefix='hgs_memplan_')
+    # two variables with 10 time steps: 10*100*8 = 8000 bytes and 10*50*3*8 = 12000 bytes
+    self.shapes = dict(head=(10,100), flux=(10,50,3))
+
+  def tearDown(self):
+    shutil.rmtree(self.mem_folder)
+
+  def testBudget(self):
+    ''' test conversion of memory budgets to bytes '''
+    assert resolveMemBudget(None) is None
+    assert resolveMemBudget(2048) == 2048 and resolveMemBudget(2048.) == 2048
+    assert resolveMemBudget('16GB') == 16*2**30 and resolveMemBudget('512m') == 512*2**20
+    assert resolveMemBudget('1.5K') == 1536 and resolveMemBudget('4096') == 4096
+    # fractions of available memory
+    with mock.patch('hgs.misc.availableMemory', return_value=2**30):
+      assert resolveMemBudget(0.25) == 2**28 and resolveMemBudget(1) == 2**30
+    with mock.patch('hgs.misc.availableMemory', return_value=None):
+      self.assertRaises(ArgumentError, resolveMemBudget, 0.5)
+    self.assertRaises(ValueError, resolveMemBudget, -1)
+    self.assertRaises(ValueError, resolveMemBudget, 'lots')
+    self.assertRaises(TypeError, resolveMemBudget, True)
+
+  def testPlan(self):
+    ''' test selection of the load mode based on the memory budget '''
+    # per time step: 2*(100 + 150)*8 = 4000 bytes; reduced variables: (100 + 150)*8 = 2000 bytes
+    plan = planMemory(self.shapes)
+    assert plan['mode'] == 'in-core' and plan['budget'] is None and plan['nvar'] == 2
+    assert plan['nbytes'] == 20000 and plan['step_bytes'] == 4000 and plan['reduced_bytes'] == 2000
+    assert planMemory(self.shapes, mem_budget=24000)['mode'] == 'in-core'
+    assert planMemory(self.shapes, mem_budget='10KB')['mode'] == 'memmap' # no reduction
+    plan = planMemory(self.shapes, mem_budget='10KB', mem_reduce='mean')
+    assert plan['mode'] == 'reduce' and plan['reduction'] == 'mean'
+    assert planMemory(self.shapes, mem_budget=5000, mem_reduce='mean')['mode'] == 'memmap'
+    assert "'reduce'" in formatMemPlan(plan) and 'mean' in formatMemPlan(plan)
+
+  def testAllocate(self):
+    ''' test allocation of arrays in memory and backed by temporary files '''
+    plan = planMemory(self.shapes, mem_budget=5000)
+    array = allocateArray((10,100), plan=plan, mem_folder=self.mem_folder)
+    assert isinstance(array, np.memmap) and array.shape == (10,100) and np.all(array == 0)
+    array[3,:] = 1.; assert array.sum() == 100.
+    # empty time axis (files of size zero can not be mapped)
+    array = allocateArray((0,100), plan=plan, mem_folder=self.mem_folder)
+    assert not isinstance(array, np.memmap) and array.shape == (0,100)
+    array = allocateArray((10,100), plan=planMemory(self.shapes))
+    assert not isinstance(array, np.memmap) and np.all(array == 0)
+
+
+if __name__ == "__main__":
+
+    # list of tests to be performed
+    tests = []
+    # list of variable tests
+    tests += ['MemPlan']
+
+    # construct dictionary of test classes defined above
+    test_classes = dict()
+    local_values = locals().copy()
+    for key,val in list(local_values.items()):
+      if key[-4:] == 'Test':
+        test_classes[key[:-4]] = val
+
+    # run tests
+    report = []
+    for test in tests: # test+'.test'+specific_test
+      s = unittest.TestLoader().loadTestsFromTestCase(test_classes[test])
+      report.append(unittest.TextTestRunner(verbosity=2).run(s))
+
+    # print summary
+    runs = 0; errs = 0; fails = 0
+    for name,test in zip(tests,report):
+      #print test, dir(test)
+      runs += test.testsRun
+      e = len(test.errors)
+      errs += e
+      f = len(test.failures)
+      fails += f
+      if e+ f != 0: print(("\nErrors in '{:s}' Tests: {:s}".format(name,str(test))))
+    if errs + fails == 0:
+      print(("\n   ***   All {:d} Test(s) successfull!!!   ***   \n".format(runs)))
+    else:
+      print(("\n   ###     Test Summary:      ###   \n" + 
+            "   ###     Ran {:2d} Test(s)     ###   \n".format(runs) + 
+            "   ###      {:2d} Failure(s)     ###   \n".format(fails)+ 
+            "   ###      {:2d} Error(s)       ###   \n".format(errs)))
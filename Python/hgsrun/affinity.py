@@ -0,0 +1,153 @@
+'''
+Created on Oct 19, 2026
+
+CPU affinity and priority of Grok and HGS processes: disjoint sets of cores are assigned to concurrent
+ensemble members (cores on the same NUMA node are preferred, so that a member does not contend for the
+memory bandwidth of other sockets), and child processes are pinned to their cores and reniced by
+prefixing the command with the 'taskset', 'nice' and 'ionice' utilities, so that the settings apply
+before the executable starts its threads (a 'preexec_fn' is not safe with threads in the parent).
+N.B.: CPU affinity is only supported on Linux; on other platforms processes are launched unpinned.
+'''
+
+# external imports
+import os, glob, shutil
+from warnings import warn
+
+# location of the NUMA topology in the sysfs file system (Linux only)
+numa_folder = '/sys/devices/system/node'
+
+
+# helper functions to determine the available cores and NUMA nodes
+def parseCPUList(cpulist):
+  ''' parse a Linux CPU list (e.g. '0-3,8-11') and return a list of core indices '''
+  cores = []
+  for item in cpulist.strip().split(','):
+    if not item: continue
+    if '-' in item:
+      first, last = item.split('-')
+      cores.extend(range(int(first), int(last)+1))
+    else: cores.append(int(item))
+  return cores
+
+def availableCores():
+  ''' return a sorted list of the cores that this process is allowed to run on (or None, if CPU affinity
+      is not supported on this platform) '''
+  if not hasattr(os, 'sched_getaffinity'): return None
+  return sorted(os.sched_getaffinity(0))
+
+def numaNodes(cores=None, folder=numa_folder):
+  ''' return a list of the available cores, grouped by NUMA node (a single group, if the topology can not
+      be determined); 'cores' restricts the result to a subset of cores (default: all available cores) '''
+  if cores is None: cores = availableCores() or []
+  cores = set(cores)
+  nodes = []
+  node_folders = glob.glob(os.path.join(folder,'node[0-9]*'))
+  for node_folder in sorted(node_folders, key=lambda nf: int(os.path.basename(nf)[4:])):
+    try:
+      with open(os.path.join(node_folder,'cpulist'), 'r') as f: node_cores = parseCPUList(f.read())
+    except (IOError, ValueError): continue
+    node_cores = [core for core in node_cores if core in cores]
+    if node_cores: nodes.append(node_cores)
+  # cores that do not appear in the topology (or no topology at all)
+  missing = sorted(cores.difference(core for node in nodes for core in node))
+  if missing: nodes.append(missing)
+  return nodes
+
+
+## a set of cores that can be assigned to concurrent jobs
+class CoreSet(object):
+  '''
+    A class that keeps track of free cores and assigns disjoint sets of cores to jobs; jobs are placed
+    on a single NUMA node, if possible (best fit, i.e. the node with the fewest free cores that can hold
+    the job); larger jobs are spread over the nodes with the most free cores.
+  '''
+  nodes = None # cores managed by this set, grouped by NUMA node
+  free = None # free cores on each node (sets)
+
+  def __init__(self, ncores=None, cores=None, lnuma=True, nodes=None):
+    ''' initialize with the first 'ncores' available cores (default: all); whole NUMA nodes are used
+        first, if 'lnuma' is True; otherwise all cores are treated as one node; the topology can also
+        be passed explicitly as a list of cores for each node ('nodes') '''
+    if nodes is None:
+      if cores is None: cores = availableCores() or []
+      nodes = numaNodes(cores) if lnuma else [sorted(cores)]
+    if ncores is not None and ncores > 0:
+      # use whole nodes first, so that members share as few nodes as possible
+      selected = []; remaining = int(ncores)
+      for node in nodes:
+        if remaining <= 0: break
+        selected.append(node[:remaining]); remaining -= len(selected[-1])
+      nodes = selected
+    self.nodes = [list(node) for node in nodes if node]
+    self.free = [set(node) for node in self.nodes]
+
+  def __len__(self):
+    return sum(len(node) for node in self.nodes)
+
+  def nfree(self):
+    ''' return the number of free cores '''
+    return sum(len(free) for free in self.free)
+
+  def allocate(self, ncpu):
+    ''' reserve 'ncpu' cores and return a sorted list of cores (or None, if not enough cores are free) '''
+    ncpu = max(1, int(ncpu))
+    if ncpu > self.nfree(): return None
+    fits = [i for i,free in enumerate(self.free) if len(free) >= ncpu]
+    if fits:
+      # best fit: the node with the fewest free cores that can hold the job
+      inode = min(fits, key=lambda i: len(self.free[i]))
+      cores = sorted(self.free[inode])[:ncpu]
+    else:
+      # spread over the nodes with the most free cores
+      cores = []
+      for i in sorted(range(len(self.free)), key=lambda i: -len(self.free[i])):
+        cores += sorted(self.free[i])[:ncpu-len(cores)]
+        if len(cores) == ncpu: break
+    for free in self.free: free.difference_update(cores)
+    return sorted(cores)
+
+  def release(self, cores):
+    ''' return cores to the set of free cores '''
+    if not cores: return
+    for node,free in zip(self.nodes,self.free):
+      free.update(core for core in cores if core in node)
+
+
+# functions to launch processes with CPU affinity and priority
+def ioniceCommand(ionice):
+  ''' return a command prefix that sets the I/O scheduling class and level with the 'ionice' utility;
+      'ionice' is a class (1: realtime, 2: best-effort, 3: idle), a tuple (class, level) or a string
+      'class:level'; returns an empty list, if 'ionice' is not available '''
+  if ionice is None: return []
+  if isinstance(ionice, str): ionice = tuple(int(i) for i in ionice.split(':'))
+  elif isinstance(ionice, int): ionice = (ionice,)
+  executable = shutil.which('ionice')
+  if executable is None: return []
+  command = [executable, '-c', str(ionice[0])]
+  if len(ionice) > 1 and ionice[0] in (1,2): command += ['-n', str(ionice[1])] # levels only for these classes
+  return command
+
+def niceCommand(nice):
+  ''' return a command prefix that increases the niceness with the 'nice' utility (an empty list, if 
+      'nice' is not set or not available) '''
+  if not nice: return []
+  executable = shutil.which('nice')
+  if executable is None: return []
+  return [executable, '-n', str(int(nice))]
+
+def tasksetCommand(cpus):
+  ''' return a command prefix that pins a process to the given cores with the 'taskset' utility (an empty
+      list, if no cores are given or 'taskset' is not available) '''
+  if not cpus: return []
+  executable = shutil.which('taskset')
+  if executable is None:
+    warn("The 'taskset' utility is not available; processes are not pinned to cores.")
+    return []
+  return [executable, '-c', ','.join(str(core) for core in sorted(cpus))]
+
+def launchCommand(command, affinity=None):
+  ''' return the command with prefixes that apply the CPU affinity and the priority in 'affinity' (a 
+      dictionary with the optional keys 'cpus', 'nice' and 'ionice') '''
+  if not affinity or os.name == 'nt': return list(command)
+  return ( ioniceCommand(affinity.get('ionice')) + niceCommand(affinity.get('nice')) + 
+           tasksetCommand(affinity.get('cpus')) + list(command) )
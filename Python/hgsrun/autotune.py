@@ -0,0 +1,147 @@
+'''
+Created on Oct 19, 2026
+
+Automatic tuning of the parallel execution settings of HGS (parallelindx.dat): a member is configured
+with a short run time (using the runtime override), Grok is executed once, and short HGS runs with
+different numbers of CPUs, domain partitions, solver types and input coloring are launched in parallel
+(packed onto the available cores by the scheduler); the simulated-time throughput of each trial is
+measured from the Newton log and the best settings are applied to the ensemble. Results are cached per
+mesh hash, so that a mesh is only tuned once.
+'''
+
+# external imports
+import os, copy, json, time, shutil
+# internal imports
+from hgsrun.misc import coords_pm_file, newtonSummary, materializeFolder
+from hgsrun.grok_cache import fileChecksum
+from hgsrun.scheduler import CoreScheduler, Job
+
+# name of the cache file (in the cache folder)
+cache_file = 'autotune.json'
+# parallel settings that are passed to HGS.writeParallelIndex
+pidx_settings = ('NP','dom_parts','solver','input_coloring')
+
+
+# helper functions
+def meshHash(folders, problem):
+  ''' return the checksum of the node coordinate file (a proxy for the mesh) from the first folder that
+      contains Grok output (or None, if the mesh has not been generated) '''
+  coords_file = coords_pm_file.format(PROBLEM=problem)
+  for folder in folders:
+    if folder and os.path.isfile(os.path.join(folder,coords_file)):
+      return fileChecksum(os.path.join(folder,coords_file))
+  return None
+
+def candidateSettings(NP, nps=None, dom_factors=(1,2), solvers=(1,2), colorings=(False,True)):
+  ''' return a list of parallel settings (dictionaries) for trial runs: all combinations of the numbers of
+      CPUs (default: NP), domain partitions (multiples of the number of CPUs), solver types and input
+      coloring; duplicate combinations are removed '''
+  settings = []
+  for np_ in (nps or (NP,)):
+    for factor in dom_factors:
+      for solver in solvers:
+        for coloring in colorings:
+          setting = dict(NP=int(np_), dom_parts=int(np_*factor), solver=solver, input_coloring=coloring)
+          if setting not in settings: settings.append(setting)
+  return settings
+
+def runTrial(member, settings, logfile='log.hgs_trial'):
+  ''' execute a short HGS run with the given parallel settings in the run folder of a member (a prepared
+      copy) and return a record with the settings and the simulated-time throughput (None, if HGS failed) '''
+  member.writeParallelIndex(**settings)
+  command = [os.path.abspath(os.path.join(member.rundir,member.hgs_bin))]
+  lec, wall_time, reason = member.executeHGS(command, logfile=logfile)
+  record = dict(settings=settings, wall_time=wall_time, sim_time=None, throughput=None, lsuccess=bool(lec))
+  newton_file = os.path.join(member.rundir,member.newton_file)
+  if lec and wall_time and os.path.isfile(newton_file):
+    record['sim_time'] = newtonSummary(newton_file)['sim_time']
+    record['throughput'] = record['sim_time'] / wall_time # simulated seconds per wall-clock second
+  return record
+
+
+## the autotuner
+class Autotuner(object):
+  '''
+    A class that determines the best parallel settings for a member, based on short trial runs in copies
+    of a prepared run folder; results are stored in a cache file (JSON) with the mesh hash and the maximum
+    number of CPUs as key.
+  '''
+  cache_folder = None # folder with the cache file (None: no caching)
+  runtime = 3600. # simulated time of trial runs (seconds; passed as runtime override)
+  settings = None # list of parallel settings to test (default: see candidateSettings)
+  ncores = None # number of cores available for trial runs (default: all)
+  lcleanup = True # remove trial folders after tuning
+
+  def __init__(self, cache_folder=None, runtime=3600., settings=None, ncores=None, lcleanup=True):
+    ''' initialize autotuner; environment variables in the cache folder are expanded '''
+    self.cache_folder = os.path.expandvars(cache_folder) if cache_folder else None
+    self.runtime = float(runtime)
+    self.settings = settings
+    self.ncores = ncores
+    self.lcleanup = lcleanup
+
+  def _key(self, mesh_hash, NP):
+    return '{:s}.NP{:d}'.format(mesh_hash, NP)
+
+  def readCache(self):
+    ''' return the contents of the cache file (an empty dictionary, if there is none) '''
+    if not self.cache_folder: return dict()
+    filepath = os.path.join(self.cache_folder,cache_file)
+    if not os.path.exists(filepath): return dict()
+    with open(filepath, 'r') as cf: return json.load(cf)
+
+  def writeCache(self, key, record):
+    ''' add a record to the cache file (written to a temporary file first) '''
+    if not self.cache_folder: return
+    os.makedirs(self.cache_folder, exist_ok=True)
+    cache = self.readCache(); cache[key] = record
+    filepath = os.path.join(self.cache_folder,cache_file)
+    with open(filepath+'.tmp', 'w') as cf: json.dump(cache, cf, indent=1, sort_keys=True)
+    os.replace(filepath+'.tmp', filepath)
+
+  def lookup(self, member):
+    ''' return the cached record for the mesh of a member (or None) '''
+    mesh_hash = meshHash((member.rundir,member.template_folder), member.problem)
+    if mesh_hash is None: return None
+    return self.readCache().get(self._key(mesh_hash, member.NP))
+
+  def tune(self, member, folder=None, template_folder=None, bin_folder='{HGSDIR:s}', lcache=True):
+    ''' run trials for a member (with its NP as the maximum number of CPUs) in a separate folder (default:
+        the run folder with suffix '_autotune') and return a record with the best settings; the member
+        itself is not modified '''
+    if lcache:
+      record = self.lookup(member)
+      if record is not None: return record
+    folder = folder or os.path.normpath(member.rundir) + '_autotune'
+    if os.path.exists(folder): shutil.rmtree(folder)
+    # prepare a copy of the member with a short run time (indicators and records are not used)
+    base = copy.deepcopy(member)
+    base.rundir = os.path.join(folder,'base')
+    base.lindicators = False; base.history_file = None; base.state_db = None; base.forcing_cache = None
+    base.lrestart = False
+    ec = base.setupRundir(template_folder=template_folder, bin_folder=bin_folder, loverwrite=True, lschedule=False)
+    if ec != 0 or not base.rundirOK: raise IOError("Setup of autotune folder failed:\n  ('{}')".format(base.rundir))
+    base.setupConfig(template_folder=template_folder, runtime_override=self.runtime, lpidx=True)
+    base.runGrok(lerror=True)
+    mesh_hash = meshHash((base.rundir,), base.problem)
+    if lcache and mesh_hash is not None:
+      record = self.readCache().get(self._key(mesh_hash, member.NP))
+      if record is not None:
+        if self.lcleanup: shutil.rmtree(folder)
+        return record
+    # run trials in copies of the prepared folder (in parallel, packed onto the available cores)
+    settings = self.settings or candidateSettings(member.NP)
+    jobs = []
+    for i,setting in enumerate(settings):
+      trial = copy.copy(base); trial.rundir = os.path.join(folder,'trial_{:02d}'.format(i))
+      materializeFolder(base.rundir, trial.rundir, mode='link')
+      jobs.append(Job(i, args=(trial, setting), ncpu=setting.get('NP',member.NP)))
+    trials = CoreScheduler(ncores=self.ncores).run(runTrial, jobs)
+    valid = [trial for trial in trials if trial['throughput']]
+    if len(valid) == 0: raise IOError("All autotune trials failed; inspect trial folders:\n  ('{}')".format(folder))
+    best = max(valid, key=lambda trial: trial['throughput'])
+    record = dict(settings=best['settings'], throughput=best['throughput'], trials=trials, mesh_hash=mesh_hash,
+                  runtime=self.runtime, timestamp=time.time())
+    if mesh_hash is not None: self.writeCache(self._key(mesh_hash, member.NP), record)
+    if self.lcleanup: shutil.rmtree(folder)
+    return record
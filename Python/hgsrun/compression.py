@@ -0,0 +1,173 @@
+'''
+Created on Oct 19, 2026
+
+Parallel compression of HGS binary output: each file is compressed independently (gzip) by a pool
+of threads and the compressed files are collected in an uncompressed tar archive, together with a
+JSON index that records the position of each member in the archive, so that individual files can be
+extracted without decompressing the entire archive. Files can also be compressed in the background
+while HGS is running, as soon as HGS has moved on to the next output time.
+N.B.: the archive can also be unpacked with standard tools ('tar xf binary_fields.tar; gunzip *.gz').
+'''
+
+# external imports
+import os, json, gzip, shutil, tarfile, threading
+from concurrent.futures import ThreadPoolExecutor
+# internal imports
+from hgsrun.misc import RunDirIndex
+
+# default file names
+archive_file = 'binary_fields.tar' # archive with compressed binary output
+index_file = 'binary_fields.json' # index of archive members (offsets for random access)
+bin_pattern = '*.[0-9][0-9][0-9][0-9]' # numbered binary output files
+
+
+# function to compress a single file
+def compressFile(src, dst, level=6, chunk_size=1<<20):
+  ''' compress a file with gzip (written to a temporary file first); returns the size and modification
+      time of the source file at the time it was compressed; N.B.: zlib releases the GIL '''
+  stat = os.stat(src)
+  with open(src, 'rb') as sf, open(dst+'.part', 'wb') as df:
+    with gzip.GzipFile(filename=os.path.basename(src), mode='wb', fileobj=df, compresslevel=level, mtime=int(stat.st_mtime)) as gf:
+      shutil.copyfileobj(sf, gf, chunk_size)
+  os.replace(dst+'.part', dst)
+  return (stat.st_size, stat.st_mtime_ns)
+
+
+## the compressor
+class Compressor(object):
+  '''
+    A class that compresses files in a folder with a thread pool and collects them in an archive with an
+    index; files can be submitted while HGS is running (e.g. by the watch thread) and are compressed
+    into a temporary folder; the archive is written and the original files are removed in 'finish'.
+  '''
+  folder = None # folder with files to compress (run folder)
+  level = 6 # compression level
+  archive = archive_file # name of the archive
+  index = index_file # name of the index file
+  tmp_folder = '.compress' # temporary folder for compressed files (in folder)
+
+  def __init__(self, folder, nthreads=None, level=6, archive=None, index=None):
+    ''' initialize compressor with a thread pool (default: number of available CPUs) '''
+    self.folder = folder
+    self.level = level
+    if archive is not None: self.archive = archive
+    if index is not None: self.index = index
+    self._executor = ThreadPoolExecutor(max_workers=nthreads or os.cpu_count())
+    self._futures = dict() # compression jobs (name -> future)
+    self._lock = threading.Lock()
+    self._stop = threading.Event(); self._thread = None
+    self._index = RunDirIndex(folder, lscan=False) # folder index (refreshed by the watch thread)
+
+  def _compress(self, name):
+    src = os.path.join(self.folder, name); dst = os.path.join(self.folder, self.tmp_folder, name+'.gz')
+    return compressFile(src, dst, level=self.level)
+
+  def submit(self, names):
+    ''' submit files for compression (files that were already submitted are ignored) '''
+    os.makedirs(os.path.join(self.folder, self.tmp_folder), exist_ok=True)
+    with self._lock:
+      for name in names:
+        if name not in self._futures: self._futures[name] = self._executor.submit(self._compress, name)
+
+  def _watch(self, pattern, interval, nidx):
+    ''' compress numbered output files, once a file of the same type with a higher index exists '''
+    while not self._stop.wait(interval):
+      groups = dict() # file types and output indices
+      self._index.refresh() # only scans the folder, if new files were created
+      for name in self._index.glob(pattern):
+        groups.setdefault(name[:-nidx], []).append(name)
+      # N.B.: HGS writes output files sequentially, so all but the last file of each type are complete
+      self.submit([name for names in groups.values() for name in sorted(names)[:-1]])
+
+  def startWatch(self, pattern=bin_pattern, interval=60., nidx=4):
+    ''' start a background thread that compresses output files while HGS is running '''
+    self._stop.clear()
+    self._thread = threading.Thread(target=self._watch, args=(pattern, interval, nidx), name='compress', daemon=True)
+    self._thread.start()
+
+  def stopWatch(self):
+    ''' stop the background thread '''
+    self._stop.set()
+    if self._thread is not None: self._thread.join(); self._thread = None
+
+  def finish(self, names, lremove=True):
+    ''' compress all remaining files (and files that changed after compression), write the archive and
+        the index and remove the original files; returns the index (a dictionary) '''
+    self.stopWatch()
+    names = sorted(names)
+    self.submit(names)
+    signatures = {name:self._futures[name].result() for name in names} # raises compression errors
+    # recompress files that were modified after they were compressed
+    stale = [name for name in names if signatures[name] != self._stat(name)]
+    if stale:
+      with self._lock:
+        for name in stale: self._futures[name] = self._executor.submit(self._compress, name)
+      for name in stale: signatures[name] = self._futures[name].result()
+    self._executor.shutdown()
+    # write archive: an uncompressed tar file with compressed members (written to a temporary file first)
+    archive = os.path.join(self.folder, self.archive)
+    index = dict(archive=self.archive, members=dict())
+    with tarfile.open(archive+'.part', 'w', format=tarfile.PAX_FORMAT) as tar:
+      for name in names:
+        gz_file = os.path.join(self.folder, self.tmp_folder, name+'.gz')
+        tarinfo = tar.gettarinfo(gz_file, arcname=name+'.gz')
+        with open(gz_file, 'rb') as gf: tar.addfile(tarinfo, gf)
+        # N.B.: addfile works on a copy of tarinfo; the data are padded to the tar block size
+        offset = tar.offset - -(-tarinfo.size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+        size, mtime_ns = signatures[name]
+        index['members'][name] = dict(offset=offset, csize=tarinfo.size, size=size, mtime=mtime_ns/1e9)
+    os.replace(archive+'.part', archive)
+    with open(os.path.join(self.folder, self.index), 'w') as jf: json.dump(index, jf, indent=1)
+    # clean up
+    if lremove:
+      for name in names: os.remove(os.path.join(self.folder, name))
+    shutil.rmtree(os.path.join(self.folder, self.tmp_folder), ignore_errors=True)
+    return index
+
+  def _stat(self, name):
+    stat = os.stat(os.path.join(self.folder, name))
+    return (stat.st_size, stat.st_mtime_ns)
+
+  def abort(self):
+    ''' stop background compression and remove temporary files (original files are not touched) '''
+    self.stopWatch()
+    self._executor.shutdown(cancel_futures=True)
+    shutil.rmtree(os.path.join(self.folder, self.tmp_folder), ignore_errors=True)
+
+
+# functions for random access to archive members
+def readIndex(folder, index=index_file):
+  ''' return the archive index of a folder (or None, if there is no index) '''
+  filepath = os.path.join(folder, index)
+  if not os.path.exists(filepath): return None
+  with open(filepath, 'r') as jf: return json.load(jf)
+
+def archiveMembers(folder, index=index_file):
+  ''' return a sorted list of the names of the (uncompressed) files in the archive '''
+  archive_index = readIndex(folder, index=index)
+  return [] if archive_index is None else sorted(archive_index['members'].keys())
+
+def _readMember(folder, archive_index, name):
+  member = archive_index['members'][name]
+  with open(os.path.join(folder, archive_index['archive']), 'rb') as af:
+    af.seek(member['offset'])
+    return gzip.decompress(af.read(member['csize']))
+
+def readMember(folder, name, index=index_file):
+  ''' return the (uncompressed) contents of an archive member, without decompressing other members '''
+  archive_index = readIndex(folder, index=index)
+  if archive_index is None or name not in archive_index['members']: raise IOError(name)
+  return _readMember(folder, archive_index, name)
+
+def extractFiles(folder, names, dest=None, index=index_file):
+  ''' extract files from the archive (into 'dest'; default: folder) and restore modification times '''
+  dest = folder if dest is None else dest
+  archive_index = readIndex(folder, index=index)
+  if archive_index is None: raise IOError("No archive index found in folder '{}'".format(folder))
+  for name in names:
+    if name not in archive_index['members']: raise IOError(name)
+    filepath = os.path.join(dest, name)
+    with open(filepath, 'wb') as f: f.write(_readMember(folder, archive_index, name))
+    mtime = archive_index['members'][name]['mtime']
+    os.utime(filepath, (mtime, mtime))
+  return names
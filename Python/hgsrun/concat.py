@@ -0,0 +1,103 @@
+'''
+Created on Oct 19, 2026
+
+Streaming concatenation of HGS output from restarted simulations: time-series files (hydrographs,
+observation wells, water balance and Newton info) from the restart folders and the run folder are
+stitched together at the restart times without loading entire files (the end of each segment is found
+by seeking backwards from the end of the file), and numbered binary output files from the restart
+folders are hardlinked into the run folder with continuous output indices.
+'''
+
+# external imports
+import os, shutil
+from concurrent.futures import ThreadPoolExecutor
+# internal imports
+from hgsrun.misc import recordTime, reverseLines
+
+block_size = 1<<16 # size of blocks for copying
+
+
+# helper functions to find records in time-series files
+def recordsBefore(f, time, lwell=False):
+  ''' return the file offset after the last record with a time less than or equal to 'time' (i.e. the
+      beginning of the first record that follows); the file is read backwards from the end, so that only
+      the records after 'time' are read; incomplete lines at the end of the file are excluded '''
+  cut = None
+  for offset,line in reverseLines(f):
+    if cut is None: cut = offset + len(line) + 1 # end of the last complete line
+    record_time = recordTime(line, lwell=lwell)
+    if record_time is None: continue
+    elif record_time <= time: break
+    cut = offset # beginning of a record after 'time'
+  return 0 if cut is None else cut
+
+def recordsAfter(f, time, lwell=False):
+  ''' return the file offset of the first record with a time greater than 'time' (the header and earlier
+      records are skipped); the file is read forward from the beginning '''
+  f.seek(0); offset = 0
+  for line in f:
+    record_time = recordTime(line, lwell=lwell)
+    if record_time is not None and record_time > time: return offset
+    offset += len(line)
+  return offset
+
+def copyRange(src, dst, start, end, block_size=block_size):
+  ''' copy the bytes between 'start' and 'end' from one open file to another '''
+  src.seek(start); remaining = end - start
+  while remaining > 0:
+    chunk = src.read(min(block_size, remaining))
+    if not chunk: break
+    dst.write(chunk); remaining -= len(chunk)
+
+
+# functions to concatenate output
+def initialTime(grokfile):
+  ''' return the value of the 'initial time' parameter in a Grok configuration file (or None) '''
+  if not os.path.exists(grokfile): return None
+  with open(grokfile, 'r') as f:
+    lines = [line.strip() for line in f if line.strip() and not line.strip().startswith('!')]
+  if 'initial time' not in lines: return None
+  try: return float(lines[lines.index('initial time')+1])
+  except (IndexError, ValueError): return None
+
+def concatTimeseries(segments, restart_times, dst, lwell=False):
+  ''' concatenate segments of a time-series file (earliest first; missing segments are None); segment
+      k contributes the records after restart_times[k-1] up to (and including) restart_times[k]; the
+      header of the first segment is retained; output is written to a temporary file first, so that the
+      last segment can be replaced in place '''
+  tmp_file = dst + '.concat'
+  lheader = True
+  with open(tmp_file, 'wb') as df:
+    for k,segment in enumerate(segments):
+      if segment is None or not os.path.exists(segment): continue
+      with open(segment, 'rb') as sf:
+        start = 0 if lheader else recordsAfter(sf, restart_times[k-1], lwell=lwell)
+        end = recordsBefore(sf, restart_times[k], lwell=lwell) if k < len(restart_times) else \
+              recordsBefore(sf, float('inf'), lwell=lwell)
+        copyRange(sf, df, start, end)
+      lheader = False
+  os.replace(tmp_file, dst)
+  return dst
+
+def linkFiles(pairs):
+  ''' hardlink (or, if not possible, copy) files; existing links to the same file are retained '''
+  for src,dst in pairs:
+    if os.path.exists(dst):
+      if os.path.samefile(src, dst): continue
+      os.remove(dst)
+    try: os.link(src, dst)
+    except OSError: shutil.copy2(src, dst)
+  return len(pairs)
+
+def concatSegments(ts_jobs, rename_pairs=None, link_pairs=None, nthreads=None):
+  ''' concatenate time-series files and assemble binary output in parallel; 'ts_jobs' is a list of
+      argument tuples for concatTimeseries, 'rename_pairs' are (old,new) names of binary output files in
+      the run folder (renamed first, in the given order) and 'link_pairs' are (source,destination) pairs
+      of binary output files from restart folders; returns the list of concatenated files '''
+  # N.B.: files from the last segment have to be renumbered first, because their old names are reused
+  for old,new in rename_pairs or []: os.rename(old, new)
+  with ThreadPoolExecutor(max_workers=nthreads or min(32, (os.cpu_count() or 1)+4)) as executor:
+    futures = [executor.submit(concatTimeseries, *args) for args in ts_jobs]
+    if link_pairs: futures.append(executor.submit(linkFiles, link_pairs))
+    results = [future.result() for future in futures] # raises errors
+  return results[:len(ts_jobs)]
@@ -0,0 +1,108 @@
+'''
+Created on Oct 19, 2026
+
+A node-local cache for climate forcing rasters: the input files that are referenced by the include
+files of ensemble members are copied (or hardlinked) into a cache folder on a local disk (or tmpfs)
+once per node and shared by all members on that node. References are counted with shared file locks
+(fcntl.flock), which are released by the kernel, if a process crashes; the cache is removed, once the
+last member that uses it has finished.
+'''
+
+# external imports
+import os, json, shutil, hashlib, fcntl
+
+# name of the manifest file in the run folder (maps cached files to their sources)
+manifest_file = 'forcing_cache.json'
+
+
+## the forcing cache
+class ForcingCache(object):
+  '''
+    A class that manages a folder with cached forcing files; files are stored in sub-folders based on
+    a hash of their source folder, so that file names are preserved. The file '.lock' serializes
+    population and cleanup, and members that use the cache hold a shared lock on the file '.refs'.
+  '''
+  folder = None # cache folder (node-local)
+  lcleanup = True # remove cached files, when the last reference is released
+
+  def __init__(self, folder, lcleanup=True):
+    ''' initialize cache folder; environment variables are expanded (e.g. '$TMPDIR/hgs_forcing') '''
+    self.folder = os.path.abspath(os.path.expandvars(folder))
+    os.makedirs(self.folder, exist_ok=True)
+    self.lcleanup = lcleanup
+
+  def _lockFile(self, name, operation):
+    ''' open a lock file and apply a lock operation; returns the open file (closing releases the lock) '''
+    lf = open(os.path.join(self.folder,name), 'a')
+    try: fcntl.flock(lf, operation)
+    except:
+      lf.close(); raise
+    return lf
+
+  def cachedPath(self, source):
+    ''' return the path of a source file in the cache '''
+    source = os.path.abspath(source)
+    digest = hashlib.sha1(os.path.dirname(source).encode('utf-8')).hexdigest()[:12]
+    return os.path.join(self.folder, digest, os.path.basename(source))
+
+  def populate(self, sources):
+    ''' copy (or hardlink, if possible) source files into the cache, unless an up-to-date copy exists;
+        returns a dictionary that maps source paths to cached paths '''
+    mapping = dict()
+    with self._lockFile('.lock', fcntl.LOCK_EX): # one process populates, the others wait
+      for source in sources:
+        source = os.path.abspath(source); cached = self.cachedPath(source)
+        mapping[source] = cached
+        src_stat = os.stat(source)
+        if os.path.exists(cached):
+          stat = os.stat(cached)
+          if stat.st_size == src_stat.st_size and int(stat.st_mtime) == int(src_stat.st_mtime): continue
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+        tmp_file = cached + '.tmp'
+        if os.path.exists(tmp_file): os.remove(tmp_file)
+        try: os.link(source, tmp_file) # only works on the same file system
+        except OSError: shutil.copy2(source, tmp_file)
+        os.replace(tmp_file, cached)
+    return mapping
+
+  def acquire(self, sources=None):
+    ''' acquire a reference to the cache (a shared lock) and make sure that the source files are cached;
+        returns the reference, which has to be passed to release '''
+    ref = self._lockFile('.refs', fcntl.LOCK_SH)
+    # N.B.: the reference is acquired first, so that the files can not be removed during population
+    try:
+      if sources: self.populate(sources)
+    except:
+      ref.close(); raise
+    return ref
+
+  def release(self, ref, lcleanup=None):
+    ''' release a reference and remove cached files, if this was the last reference '''
+    ref.close()
+    if self.lcleanup if lcleanup is None else lcleanup: return self.cleanup()
+    return False
+
+  def cleanup(self):
+    ''' remove all cached files, if no references are held; returns True, if the cache was removed '''
+    with self._lockFile('.lock', fcntl.LOCK_EX):
+      try: refs = self._lockFile('.refs', fcntl.LOCK_EX|fcntl.LOCK_NB)
+      except BlockingIOError: return False # still in use
+      try:
+        for entry in os.scandir(self.folder):
+          if entry.is_dir(follow_symlinks=False): shutil.rmtree(entry.path)
+      finally: refs.close()
+    return True
+
+
+# functions to read and write the manifest of a run folder
+def writeManifest(rundir, cache_folder, mapping):
+  ''' record the cache folder and the cached files (and their sources) in the run folder '''
+  with open(os.path.join(rundir,manifest_file), 'w') as mf:
+    json.dump(dict(folder=cache_folder, files={cached:source for source,cached in mapping.items()}), mf, indent=1)
+
+def readManifest(rundir):
+  ''' return the cache folder and the list of source files from the manifest (or None, if there is none) '''
+  filepath = os.path.join(rundir,manifest_file)
+  if not os.path.exists(filepath): return None, None
+  with open(filepath, 'r') as mf: manifest = json.load(mf)
+  return manifest['folder'], sorted(manifest['files'].values())
@@ -0,0 +1,119 @@
+'''
+Created on Oct 19, 2026
+
+A content-addressed cache for Grok output: the key is a hash of the fully expanded Grok configuration and
+the checksums of all files it references (mesh, properties, include files); the files that Grok creates or
+modifies in the run folder are stored in the cache under this key and reflinked (or copied) into other run
+folders with the same key, instead of running Grok again.
+'''
+
+# external imports
+import os, re, json, shutil, hashlib, tempfile
+# internal imports
+from hgsrun.misc import materializeFile, manifest_file
+
+hash_file = '.grok_hash' # file in rundir that records the hash of the last successful Grok run
+cache_manifest = 'manifest.json' # list of files in a cache entry
+# files in the rundir that are never stored in the cache (logs, inputs and indicators)
+ignore_patterns = (r'.*\.grok(\.backup)?$', r'.*\.pfx$', r'log\..*', r'grok\.dbg(\.gz)?$', r'^\.grok_hash$',
+                   r'^{}$'.format(re.escape(manifest_file)), r'^[A-Z_]+$')
+ignore_regex = re.compile('|'.join('(?:{})'.format(pattern) for pattern in ignore_patterns))
+
+_checksums = dict() # memoized file checksums, keyed by (path, size, mtime)
+
+
+def fileChecksum(filepath, blocksize=2**20):
+  ''' compute the SHA1 checksum of a file; results are memoized per (path, size, mtime), so that files
+      referenced by many members are only read once per process '''
+  st = os.stat(filepath)
+  key = (os.path.abspath(filepath), st.st_size, st.st_mtime_ns)
+  if key not in _checksums:
+    sha = hashlib.sha1()
+    with open(filepath, 'rb') as f:
+      for block in iter(lambda: f.read(blocksize), b''): sha.update(block)
+    _checksums[key] = sha.hexdigest()
+  return _checksums[key]
+
+def referencedFiles(lines, folder):
+  ''' return a sorted list of files (relative to 'folder') that are referenced in the lines of a Grok
+      configuration (any token that looks like a path and exists as a file) '''
+  files = set(); checked = set()
+  for line in lines:
+    for token in line.split():
+      # only tokens that look like file names (not numbers or keywords)
+      if token in checked or not ( '.' in token or '/' in token ) or not re.search('[A-Za-z]', token): continue
+      checked.add(token)
+      if os.path.isfile(os.path.join(folder,token)): files.add(token)
+  return sorted(files)
+
+def grokHash(lines, folder):
+  ''' compute the cache key: a hash of the Grok configuration lines and the checksums of all referenced files '''
+  sha = hashlib.sha1()
+  for line in lines: sha.update(line.encode('utf-8')+b'\n')
+  for filename in referencedFiles(lines, folder):
+    sha.update('{}:{}\n'.format(filename, fileChecksum(os.path.join(folder,filename))).encode('utf-8'))
+  return sha.hexdigest()
+
+def snapshotFolder(folder):
+  ''' return a dictionary of regular files in a folder with size and modification time '''
+  snapshot = dict()
+  for entry in os.scandir(folder):
+    if entry.is_file(follow_symlinks=False):
+      st = entry.stat(follow_symlinks=False); snapshot[entry.name] = (st.st_size, st.st_mtime_ns)
+  return snapshot
+
+def changedFiles(before, after):
+  ''' return files that were created or modified between two snapshots (except logs and inputs) '''
+  return sorted(name for name,sig in after.items() if before.get(name) != sig and not ignore_regex.match(name))
+
+
+## cache operations
+def readHash(rundir):
+  ''' return the hash of the last successful Grok run in rundir (or None) '''
+  hashpath = os.path.join(rundir,hash_file)
+  if not os.path.exists(hashpath): return None
+  with open(hashpath, 'r') as hf: return hf.read().strip()
+
+def writeHash(rundir, key):
+  ''' record the hash of a successful Grok run in rundir '''
+  with open(os.path.join(rundir,hash_file), 'w') as hf: hf.write(key)
+
+def storeOutput(cache_folder, key, rundir, files):
+  ''' store Grok output files in the cache; the entry is assembled in a temporary folder (unique for each
+      thread and process) and renamed, so that concurrent members never see an incomplete entry '''
+  entry = os.path.join(cache_folder,key)
+  if os.path.exists(entry): return entry # another member was faster
+  os.makedirs(cache_folder, exist_ok=True)
+  tmp = tempfile.mkdtemp(dir=cache_folder, prefix=key+'.tmp.')
+  for filename in files:
+    shutil.copy2(os.path.join(rundir,filename), os.path.join(tmp,filename))
+  with open(os.path.join(tmp,cache_manifest), 'w') as mf: json.dump(files, mf)
+  try: os.rename(tmp, entry)
+  except OSError: shutil.rmtree(tmp) # entry was created concurrently
+  return entry
+
+def restoreOutput(cache_folder, key, rundir, mode='reflink'):
+  ''' reflink (or copy) cached Grok output into rundir; returns the list of files or None, if not cached;
+      N.B.: with mode='link' (hardlinks), the restored files must be removed with removeOutput, before
+            Grok runs again in rundir, because Grok would otherwise modify the cached files in place '''
+  entry = os.path.join(cache_folder,key)
+  if not os.path.exists(os.path.join(entry,cache_manifest)): return None
+  with open(os.path.join(entry,cache_manifest), 'r') as mf: files = json.load(mf)
+  for filename in files:
+    dst = os.path.join(rundir,filename)
+    if os.path.lexists(dst): os.remove(dst)
+    materializeFile(os.path.join(entry,filename), dst, mode=mode)
+  return files
+
+def removeOutput(cache_folder, rundir):
+  ''' remove the files that were restored from the cache entry of the last Grok run in rundir (before Grok 
+      runs again, so that it does not write through links into the cache); returns the list of files '''
+  key = readHash(rundir)
+  manifest = None if key is None else os.path.join(cache_folder,key,cache_manifest)
+  if manifest is None or not os.path.exists(manifest): return []
+  with open(manifest, 'r') as mf: files = json.load(mf)
+  for filename in files:
+    dst = os.path.join(rundir,filename)
+    if os.path.lexists(dst): os.remove(dst)
+  os.remove(os.path.join(rundir,hash_file))
+  return files
@@ -8,11 +8,23 @@ to actually running HGS.
 '''
 
 # external imports
-import os, shutil, inspect, multiprocessing
+import os, shutil, inspect, multiprocessing, time
+from concurrent.futures import ThreadPoolExecutor
 # internal imports
 from utils.misc import expandArgumentList
 from geodata.misc import ArgumentError
 from hgsrun.hgs_setup import HGS, HGSError, GrokError
+from hgsrun.scheduler import CoreScheduler, Job
+from hgsrun.history import predictRuntimes, longestFirst
+from hgsrun.supervisor import Supervisor
+from hgsrun.state_db import openStateDB
+from hgsrun.work_queue import WorkQueue
+from hgsrun.autotune import Autotuner
+
+# methods that execute HGS and hence require the number of cores configured for the member (NP)
+multicore_methods = ('runHGS','runPipeline')
+# methods that respect dependencies between members (initial conditions are set before configuration)
+dependent_methods = ('runPipeline',)
 
 
 # named exception
@@ -20,21 +32,95 @@ class EnsembleError(Exception):
   ''' Exception indicating an Error with the HGS Ensemble '''
   pass
 
+# member arguments that are folders or files and support keyword substitution
+folder_types = ('rundir','template_folder','input_folder','pet_folder','precip_inc','pet_inc','ic_files','history_file',
+                'grok_cache','state_db','depends_on','forcing_cache')
+# indicator files that determine if a member is skipped (in order of precedence)
+skip_indicators = ('SCHEDULED','IN_PROGRESS','COMPLETED','FAILED','STALLED')
+
+# large member attributes that are not sent to worker processes
+# N.B.: once the configuration has been written to the rundir, the runner methods only use the file on disk
+heavy_attrs = ('_lines',)
+# member attributes that are returned from worker processes and merged into the parent's members
+state_attrs = ('rundirOK','configOK','GrokOK','pidxOK','HGSOK','lrestart','ic_files','restart_folders','_grok_hash',
+               'grok_bin','hgs_bin','batchpfx','NP','lchannel','_sourcefile','_targetfile')
+
+# functions to transfer member state between parent and worker processes
+def memberSpec(member):
+  ''' return a compact specification of a member (class and instance attributes), without the large 
+      attributes that are not required for execution (e.g. the Grok configuration, once it is written) '''
+  lheavy = getattr(member, 'configOK', False) 
+  atts = {att:val for att,val in member.__dict__.items() if not ( lheavy and att in heavy_attrs )}
+  return member.__class__, atts
+
+def mergeState(member, record):
+  ''' update a member with the state returned from a worker process '''
+  member.__dict__.update(record['state'])
+  return member
+
 # a function that executes a class/instance method for use in apply_async
-def apply_method(member, attr, **kwargs): 
-  ''' execute the method 'attr' of instance 'member' with keyword arguments 'kwargs';
-      return a tuple containing member instance (possibly changed) and method results '''
-  return member,getattr(member, attr)(**kwargs) # returns a TUPLE!!!
+def apply_method(spec, attr, cpus=None, **kwargs): 
+  ''' reconstruct a member from its specification and execute the method 'attr' with keyword arguments 
+      'kwargs'; return a small status record with method result/exit code, member state and timing;
+      if cores were assigned by the scheduler ('cpus'), Grok and HGS are pinned to these cores '''
+  klass, atts = spec
+  member = klass.__new__(klass); member.__dict__.update(atts) # no need to call __init__
+  if cpus: member.affinity = dict(member.affinity or dict(), cpus=cpus)
+  wall_time = time.time()
+  ec = getattr(member, attr)(**kwargs)
+  wall_time = time.time() - wall_time
+  state = {att:getattr(member,att) for att in state_attrs if hasattr(member,att)}
+  return dict(rundir=member.rundir, ec=ec, state=state, wall_time=wall_time)
+
+# a function that executes an instance method in a worker thread
+def apply_member(member, attr, **kwargs):
+  ''' execute the method 'attr' of a member in the current process (e.g. in a worker thread); return a 
+      status record like apply_method (the member is updated in place, so no state is returned) '''
+  wall_time = time.time()
+  ec = getattr(member, attr)(**kwargs)
+  wall_time = time.time() - wall_time
+  return dict(rundir=member.rundir, ec=ec, state=dict(), wall_time=wall_time)
+
+# function to determine the state of a member from the state database or indicator files
+def memberState(rundir, db_states=None):
+  ''' return the state of a member: the state database is queried first (db_states is a dictionary from 
+      StateDB.states), then indicator files are probed; returns None, if no state is found '''
+  if db_states:
+    state = db_states.get(os.path.abspath(rundir))
+    if state is not None: return state
+  for indicator in skip_indicators:
+    if os.path.exists(os.path.join(rundir,indicator)): return indicator
+  return None
 
 # callback function to print reports of completed simulations
-def reportBack(result):
+def reportBack(record):
   ''' function that prints the results of a simulations from a multiprocessing batch;
-      N.B.: the callback function is passed a result from apply_method, which is a tuple '''
-  member, ec = result
+      N.B.: the callback function is passed a status record from apply_method (a dictionary) '''
+  rundir, ec = record['rundir'], record['ec']
   if ec == 0: # simulation completed successfully
-    print(("The simulation in folder '{:s}' completed successfully!".format(member.rundir)))
+    print(("The simulation in folder '{:s}' completed successfully!".format(rundir)))
   else: # simulation failed
-    print(("FAILURE: The simulation in folder '{:s}' terminated with exit code {:d}!".format(member.rundir,ec))) 
+    print(("FAILURE: The simulation in folder '{:s}' terminated with exit code {:d}!".format(rundir,ec))) 
+
+# function to expand ensemble arguments (without checking run folders)
+def expandMembers(inner_list=None, outer_list=None, **kwargs):
+  ''' expand keyword arguments based on inner/outer product rules and apply string substitution to all 
+      folder variables (incl. 'rundir'); returns a list of keyword arguments, one for each member '''
+  kwargs_list = expandArgumentList(inner_list=inner_list, outer_list=outer_list, **kwargs)
+  for kwargs in kwargs_list:
+    # isolate folder variables and perform variable substitution
+    for folder_type in folder_types:
+      if folder_type in kwargs:
+        folder = kwargs[folder_type]
+        if isinstance(folder,str):
+          # perform keyword substitution with all available arguments
+          if folder_type == 'ic_files':
+            # we need to preserve '{FILETYPE}' for later 
+            kwargs[folder_type] = folder.format(FILETYPE='{FILETYPE}', **kwargs)
+          else: kwargs[folder_type] = folder.format(**kwargs)
+        elif folder is None: pass
+        else: raise TypeError(folder)
+  return kwargs_list
 
 ## define ensemble wrapper class
 class EnsembleWrapper(object):
@@ -52,33 +138,90 @@ class EnsembleWrapper(object):
     self.klass = klass # the object that the attribute is called on
     self.attr = attr # the attribute name that is called
     
-  def __call__(self, lparallel=False, NP=None, inner_list=None, outer_list=None, callback=None, **kwargs):
+  def __call__(self, lparallel=False, NP=None, inner_list=None, outer_list=None, callback=None, 
+               ncores=None, mem=None, lbackfill=True, llongest=True, lthreads=False, lpin=False, lnuma=True, 
+               **kwargs):
     ''' this method is called instead of a class or instance method; it applies the arguments 
         'kwargs' to each ensemble member; it also supports argument expansion with inner and 
-        outer product (prior to application to ensemble) and parallelization using multiprocessing '''
+        outer product (prior to application to ensemble) and parallelization using multiprocessing;
+        if 'ncores' is specified, members are scheduled as jobs that require the number of cores
+        configured for each member (NP; only for HGS execution) and optionally memory (in MB);
+        if 'llongest' is True, HGS executions are started in order of decreasing predicted run time
+        (based on the run time history of each member; members without prediction are started last);
+        if 'lpin' is True (and 'ncores' is specified), each running member is assigned a disjoint set of 
+        cores (on one NUMA node, if possible and 'lnuma' is True) and Grok and HGS are pinned to them;
+        if 'lthreads' is True, a pool of NP threads is used instead of worker processes (the members
+        are modified in place; suitable for setup and configuration, which are mostly file I/O) '''
     # expand kwargs to ensemble list
     kwargs_list = expandArgumentList(inner_list=inner_list, outer_list=outer_list, **kwargs)
     if len(kwargs_list) == 1: kwargs_list = kwargs_list * len(self.klass.members)
     elif len(kwargs_list) != len(self.klass.members): 
       raise ArgumentError('Length of expanded argument list does not match ensemble size! {} ~= {}'.format(
                           len(kwargs_list),len(self.klass.members)))
+    lmulticore = self.attr in multicore_methods
+    depends = getattr(self.klass, 'depends', None) if self.attr in dependent_methods else None
+    if depends is not None and not any(idx is not None for idx in depends): depends = None
+    # predict run times (longest-predicted-first ordering only matters for parallel execution)
+    if lparallel and lmulticore and llongest: predictions = predictRuntimes(self.klass.members)
+    else: predictions = [None]*len(self.klass.members)
     # loop over ensemble members and execute function
-    if lparallel:
+    if lparallel and ( ncores is not None or depends is not None ):
+      # pack members onto the available cores, based on their resource requirements
+      # N.B.: without core-aware scheduling, the scheduler only limits the number of concurrent members (NP)
+      lcores = ncores is not None
+      if not lcores: ncores = NP or multiprocessing.cpu_count()
+      scheduler = CoreScheduler(ncores=ncores, mem=mem if lcores else None, lbackfill=lbackfill, 
+                                lpin=lpin and lmulticore and lcores, lnuma=lnuma)
+      # N.B.: cores can only be pinned, if the scheduler knows how many cores each member uses
+      jobs = [Job(i, args=(memberSpec(member),self.attr), kwargs=kwargs, ncpu=member.NP if lmulticore and lcores else 1, 
+                  mem=member.memory if lmulticore else None, priority=prediction) 
+              for i,(member,kwargs,prediction) in enumerate(zip(self.klass.members,kwargs_list,predictions))]
+      if depends is not None:
+        # dependent members are started, when their parent completes, with initial conditions from the parent
+        for job,idx in zip(jobs,depends):
+          if idx is not None: job.depends = (idx,); job.prepare = self._prepareDependent
+      records = scheduler.run(apply_method, jobs, callback=callback, NP=NP)
+      # merge state updates into members and extract results
+      for member,record in zip(self.klass.members,records): 
+        if record is None: print(("Skipping simulation in folder '{:s}' (dependency failed).".format(member.rundir)))
+        else: mergeState(member, record)
+      results = [1 if record is None else record['ec'] for record in records]
+    elif lparallel and lthreads:
+      # parallelize method execution using threads (no pickling or forking)
+      if callback is not None and not callable(callback): raise TypeError(callback)
+      order = longestFirst(predictions)
+      with ThreadPoolExecutor(max_workers=NP) as executor:
+        futures = {i:executor.submit(apply_member, self.klass.members[i], self.attr, **kwargs_list[i]) for i in order}
+        if callback is not None:
+          for future in futures.values(): future.add_done_callback(lambda f: f.exception() or callback(f.result()))
+      # N.B.: the executor waits for all threads to finish; errors are raised in original order
+      results = [futures[i].result()['ec'] for i in range(len(self.klass.members))]
+    elif lparallel:
       # parallelize method execution using multiprocessing
       pool = multiprocessing.Pool(processes=NP) # initialize worker pool
       if callback is not None and not callable(callback): raise TypeError(callback)
-      # N.B.: the callback function is passed a result from the apply_method function, 
-      #       which returns a tuple of the form (member, exit_code)
-      # define work loads (function and its arguments) and start tasks      
-      results = [pool.apply_async(apply_method, (member,self.attr), kwargs, callback=callback) 
-                                      for member,kwargs in zip(self.klass.members,kwargs_list)]          
-      # N.B.: Beware Pickling!!!
+      # N.B.: the callback function is passed a status record from the apply_method function, 
+      #       which is a dictionary with exit code, member state and timing
+      # define work loads (function and its arguments) and start tasks (longest first)
+      order = longestFirst(predictions)
+      results = {i:pool.apply_async(apply_method, (memberSpec(self.klass.members[i]),self.attr), kwargs_list[i], 
+                                    callback=callback) for i in order}
+      # N.B.: only the member specification and the status record are pickled
       pool.close(); pool.join() # wait to finish
-      # retrieve and assemble results 
-      results = [result.get() for result in results]
-      # divide members and results (apply_method returns both, in case members were modified)
-      self.klass.members = [result[0] for result in results]
-      results = [result[1] for result in results]
+      # retrieve results (in original order) and merge state updates into members
+      records = [results[i].get() for i in range(len(self.klass.members))]
+      for member,record in zip(self.klass.members,records): mergeState(member, record)
+      results = [record['ec'] for record in records]
+    elif depends is not None:
+      # apply sequentially, parents first (members have at most one parent, so sorting by depth suffices)
+      def depth(i): return 0 if depends[i] is None else depth(depends[i]) + 1
+      results = [None]*len(self.klass.members)
+      for i in sorted(range(len(self.klass.members)), key=depth):
+        member = self.klass.members[i]
+        if depends[i] is not None and not self._prepareDependent(i, [dict(ec=results[depends[i]], state=dict())]):
+          print(("Skipping simulation in folder '{:s}' (dependency failed).".format(member.rundir)))
+          results[i] = 1; continue
+        results[i] = getattr(member,self.attr)(**kwargs_list[i])
     else:
       # get instance methods
       methods = [getattr(member,self.attr) for member in self.klass.members]
@@ -89,6 +232,20 @@ class EnsembleWrapper(object):
                           len(results),len(self.klass.members)))
     return tuple(results)
   
+  def _prepareDependent(self, job, records):
+    ''' set the initial conditions of a dependent member from the last output of its parent; 'job' is a 
+        scheduler Job or a member index; returns False, if the parent failed '''
+    idx = job if isinstance(job, int) else job.idx
+    member = self.klass.members[idx]; parent = self.klass.members[self.klass.depends[idx]]
+    record = records[0]
+    if record is None or record['ec'] != 0: return False
+    mergeState(parent, record)
+    try: member.ic_files = parent.lastOutput()
+    except HGSError as e:
+      print(e); return False
+    if not isinstance(job, int): job.args = (memberSpec(member),self.attr) # update specification
+    return True
+  
 #   def __get__(self, ):
 #     ''' get attribute values of all ensemble members and return as list '''
 #     print('\nGETTER\n')
@@ -118,6 +275,8 @@ class EnsHGS(object):
   loverwrite = False # overwrite existing folders
   lrunfailed = False # rerun failed experiments
   lrestart   = False # restart of an exisitng ensemble
+  work_queue = None # shared queue folder, if members are claimed from a work queue (multiple instances)
+  depends    = None # index of the parent of each member (None for independent members)
   
   def __init__(self, inner_list=None, outer_list=None, **kwargs):
     ''' initialize an ensemble of HGS simulations based on HGS arguments and project descriptors;
@@ -130,23 +289,19 @@ class EnsHGS(object):
     self.lindicator = kwargs.get('lindicator',self.lindicator)
     self.lrunfailed = kwargs.get('lrunfailed',self.lrunfailed)
     self.lrestart   = kwargs.get('lrestart',self.lrestart)
-    # expand argument list (plain, nothing special)
-    kwargs_list = expandArgumentList(inner_list=inner_list, outer_list=outer_list, **kwargs)
+    self.work_queue = kwargs.pop('work_queue',self.work_queue)
+    # N.B.: with a work queue, scheduled and running members are not skipped, since other instances may 
+    #       have crashed; the queue leases determine, which instance actually runs a member
+    # expand argument list and substitute folder variables
+    kwargs_list = expandMembers(inner_list=inner_list, outer_list=outer_list, **kwargs)
+    # query member states from database (one query, instead of probing indicator files in each rundir)
+    state_db = kwargs.get('state_db')
+    db_states = openStateDB(state_db).states() if state_db and self.lindicator else None
     # loop over ensemble members
     self.members = []; self.rundirs = []; self.hgsargs = [] # ensemble lists
+    parents = []; all_hgsargs = dict() # for dependencies between members
+    hgsargs_list = inspect.getfullargspec(HGS.__init__).args # returns args, varargs, kwargs, defaults
     for kwargs in kwargs_list:
-      # isolate folder variables and perform variable substitution
-      for folder_type in ('rundir','template_folder','input_folder','pet_folder','precip_inc','pet_inc','ic_files'):
-          if folder_type in kwargs:
-              folder = kwargs[folder_type]
-              if isinstance(folder,str):
-                # perform keyword substitution with all available arguments
-                if folder_type is 'ic_files':
-                    # we need to preserve '{FILETYPE}' for later 
-                    kwargs[folder_type] = folder.format(FILETYPE='{FILETYPE}', **kwargs)
-                else: kwargs[folder_type] = folder.format(**kwargs)
-              elif folder is None: pass
-              else: raise TypeError(folder)
       # check rundir
       rundir = kwargs['rundir']
       kwargs['restart'] = False # this keyword argument should be controlled by the Ensemble handler
@@ -154,26 +309,32 @@ class EnsHGS(object):
         raise ArgumentError("Multiple occurence of run directory:\n '{}'".format(rundir))
       # figure out skipping      
       if os.path.exists(rundir):
+        state = memberState(rundir, db_states) if self.lindicator else None
         if self.loverwrite:
           if self.lreport: print(("Overwriting existing experiment folder '{:s}'.".format(rundir)))
           lskip = False
-        elif self.lindicator and os.path.exists('{}/SCHEDULED'.format(rundir)):
+        elif state in ('SCHEDULED','IN_PROGRESS') and self.work_queue:
+          if self.lreport: print(("Queueing experiment folder '{:s}' ({:s}).".format(rundir,state.lower())))
+          lskip = False
+        elif state == 'SCHEDULED':
           if self.lreport: print(("Skipping experiment folder '{:s}' (scheduled).".format(rundir)))
           lskip = True
-        elif self.lindicator and os.path.exists('{}/IN_PROGRESS'.format(rundir)):
+        elif state == 'IN_PROGRESS':
           if self.lrestart:
             shutil.move(os.path.join(rundir,'IN_PROGRESS'),os.path.join(rundir,'RESTARTED'))
+            if state_db: openStateDB(state_db).setState(rundir, 'RESTARTED')
             if self.lreport: print(("Restarting experiment in folder '{:s}' (was in progress).".format(rundir)))
             lskip = False
             kwargs['restart'] = True
           else:
             if self.lreport: print(("Skipping experiment folder '{:s}' (in progress).".format(rundir)))
             lskip = True
-        elif self.lindicator and os.path.exists('{}/COMPLETED'.format(rundir)):
+        elif state == 'COMPLETED':
           if self.lreport: print(("Skipping experiment folder '{:s}' (completed).".format(rundir)))
           lskip = True
-        elif self.lindicator and os.path.exists('{}/FAILED'.format(rundir)):
+        elif state in ('FAILED','STALLED'):
           # this should be the last option, so as to prevent overwriting data
+          # N.B.: stalled simulations were terminated by the watchdog and are treated like failures
           if self.lrunfailed:            
             if self.lreport: print(("Overwriting failed experiment folder '{:s}'.".format(rundir)))
             lskip = False # rundir will be deleted
@@ -186,18 +347,37 @@ class EnsHGS(object):
       else:
         if self.lreport: print(("Creating new experiment folder '{:s}'.".format(rundir)))
         lskip = False
+      # isolate HGS constructor arguments
+      hgsargs = {arg:kwargs[arg] for arg in hgsargs_list if arg in kwargs} 
+      all_hgsargs[rundir] = hgsargs
       if not lskip:
         self.rundirs.append(rundir)
-        # isolate HGS constructor arguments
-        hgsargs = inspect.getargspec(HGS.__init__).args # returns args, varargs, kwargs, defaults
-        hgsargs = {arg:kwargs[arg] for arg in hgsargs if arg in kwargs} 
         self.hgsargs.append(hgsargs)
+        parents.append(kwargs.get('depends_on'))
         # initialize HGS instance      
         hgs = HGS(**hgsargs)
         self.members.append(hgs)
     # final check
     if len(self.members) == 0: 
       raise EnsembleError("No experiments to run (empty list).")
+    # resolve dependencies (e.g. production runs that start from the end of a spin-up run)
+    self.depends = [None]*len(self.members)
+    for i,(member,parent) in enumerate(zip(self.members,parents)):
+      if parent is None: continue
+      elif parent in self.rundirs: self.depends[i] = self.rundirs.index(parent)
+      elif memberState(parent, db_states) == 'COMPLETED':
+        # parent completed previously, so initial conditions are already available
+        # N.B.: parents outside of the ensemble are assumed to use the same settings as the member
+        parent_args = all_hgsargs.get(parent, dict(self.hgsargs[i], rundir=parent))
+        member.ic_files = HGS(**parent_args).lastOutput()
+        if self.lreport: print(("Initial conditions for '{:s}' from completed experiment:\n '{:s}'".format(member.rundir,member.ic_files)))
+      else: 
+        raise EnsembleError("Experiment '{:s}' depends on an experiment that is neither part of the ensemble nor completed:\n '{:s}'".format(member.rundir,parent))
+    for i in range(len(self.depends)):
+      j = self.depends[i]; chain = [i]
+      while j is not None:
+        if j in chain: raise EnsembleError("Cyclic dependency between experiments:\n {}".format([self.rundirs[k] for k in chain]))
+        chain.append(j); j = self.depends[j]
     
   @property
   def size(self):
@@ -236,27 +416,30 @@ class EnsHGS(object):
     else: raise EnsembleError("Inconsistent attribute type '{}'".format(attr))
         
   def setupExperiments(self, inner_list=None, outer_list=None, lgrok=False, lparallel=True, NP=None, 
-                       runtime_override=None, **allargs):
-    ''' set up run dirs as execute Grok for each member; check setup and report results '''
+                       runtime_override=None, lthreads=True, **allargs):
+    ''' set up run dirs as execute Grok for each member; check setup and report results; by default, 
+        setup runs in threads, since it is mostly file I/O (Grok runs as a subprocess) '''
     ec = 0 # cumulative exit code (sum of all members)
     # create run folders and copy data
-    kwargs = {arg:allargs[arg] for arg in inspect.getargspec(HGS.setupRundir).args if arg in allargs}
-    ecs = self.setupRundir(inner_list=inner_list, outer_list=outer_list, lparallel=lparallel, NP=NP, **kwargs)
+    kwargs = {arg:allargs[arg] for arg in inspect.getfullargspec(HGS.setupRundir).args if arg in allargs}
+    ecs = self.setupRundir(inner_list=inner_list, outer_list=outer_list, lparallel=lparallel, NP=NP, 
+                           lthreads=lthreads, **kwargs)
     if any(ecs) or not all(self.rundirOK): 
       raise GrokError("Run folder setup failed in {0} cases:\n{1}".format(sum(ecs),self.rundirs[ecs]))
     ec += sum(ecs)
     # write configuration
-    kwargs = {arg:allargs[arg] for arg in inspect.getargspec(HGS.setupConfig).args if arg in allargs}
+    kwargs = {arg:allargs[arg] for arg in inspect.getfullargspec(HGS.setupConfig).args if arg in allargs}
     ecs = self.setupConfig(inner_list=inner_list, outer_list=outer_list, lparallel=lparallel, NP=NP, 
-                           runtime_override=runtime_override, **kwargs)
+                           lthreads=lthreads, runtime_override=runtime_override, **kwargs)
     if any(ecs) or not all(self.configOK): 
       raise GrokError("Grok configuration failed in {0} cases:\n{1}".format(sum(ecs),
                                                                             [rd for rd,e in zip(self.rundirs,ecs) if e > 0]))
     ec += sum(ecs)
     # run Grok
     if lgrok: 
-      kwargs = {arg:allargs[arg] for arg in inspect.getargspec(HGS.runGrok).args if arg in allargs}
-      ecs = self.runGrok(inner_list=inner_list, outer_list=outer_list, lparallel=lparallel, NP=NP, **kwargs)
+      kwargs = {arg:allargs[arg] for arg in inspect.getfullargspec(HGS.runGrok).args if arg in allargs}
+      ecs = self.runGrok(inner_list=inner_list, outer_list=outer_list, lparallel=lparallel, NP=NP, 
+                         lthreads=lthreads, **kwargs)
       if any(ecs) or not all(self.GrokOK): 
         rundirs = [rundir for rundir,OK in zip(self.rundirs,self.HGSOK) if not OK]
         raise GrokError("Grok execution failed in {0} cases:\n{1}".format(sum(ecs),rundirs))
@@ -264,17 +447,60 @@ class EnsHGS(object):
     # return sum of all exit codes
     return ec
     
-  def runSimulations(self, inner_list=None, outer_list=None, lsetup=True, lgrok=False, 
-                     lparallel=True, NP=None, runtime_override=None, callback=reportBack, **allargs):
+  def hasDependencies(self):
+    ''' check if any members depend on other members '''
+    return self.depends is not None and any(idx is not None for idx in self.depends)
+
+  def autotune(self, runtime=3600., settings=None, cache_folder=None, ncores=None, template_folder=None,
+               bin_folder='{HGSDIR:s}', lcache=True, lcleanup=True):
+    ''' determine the best parallel settings (parallelindx.dat) with short trial runs of one member for each
+        template folder and number of CPUs, and apply them to all members of the group (see hgsrun.autotune);
+        results are cached per mesh (default cache folder: the Grok cache or the parent of the first run
+        folder); returns a dictionary with the autotune records of all groups '''
+    if cache_folder is None:
+      cache_folder = self.members[0].grok_cache or os.path.dirname(os.path.abspath(self.rundirs[0]))
+    tuner = Autotuner(cache_folder=cache_folder, runtime=runtime, settings=settings, ncores=ncores,
+                      lcleanup=lcleanup)
+    # group members by template folder and number of CPUs (members of a group use the same mesh)
+    groups = dict()
+    for member in self.members:
+      groups.setdefault((template_folder or member.template_folder, member.NP), []).append(member)
+    records = dict()
+    for key,members in groups.items():
+      record = tuner.tune(members[0], template_folder=template_folder, bin_folder=bin_folder, lcache=lcache)
+      best = record['settings']
+      for member in members:
+        member.NP = best.get('NP',member.NP)
+        member.pidx_settings = {k:v for k,v in best.items() if k != 'NP'}
+        member.pidxOK = False # rewrite parallelindx.dat with the new settings
+      records[key] = record
+      if self.lreport:
+        print("Autotuned parallel settings for {} members ('{}'): {}".format(len(members),key[0],best))
+    return records
+
+  def runSimulations(self, inner_list=None, outer_list=None, lsetup=True, lgrok=False, lpipeline=False,
+                     lparallel=True, NP=None, ncores=None, mem=None, lbackfill=True, runtime_override=None, 
+                     lasync=False, lpin=False, lnuma=True, callback=reportBack, **allargs):
     ''' execute HGS for each ensemble member and report results; setup rundirs and execute Grok,
-        if necessary; note that Grok will be executed in runHGS, just prior to HGS '''
+        if necessary; note that Grok will be executed in runHGS, just prior to HGS; in pipeline mode
+        each member advances through setup, Grok and HGS independently, without waiting for other members;
+        in async mode Grok and HGS are supervised by a single process (see runAsync); with 'lpin', Grok and
+        HGS are pinned to a disjoint set of cores for each member (requires 'ncores') '''
     if not self.lreport: callback = None # suppress output
+    if self.hasDependencies() and not lpipeline:
+      # N.B.: initial conditions of dependent members can only be set, after their parent completed
+      if not lsetup: raise EnsembleError("Dependencies between experiments require setup in pipeline mode.")
+      lpipeline = True
+    if lpipeline and lsetup: 
+      return self.runPipelines(inner_list=inner_list, outer_list=outer_list, lparallel=lparallel, NP=NP, 
+                               ncores=ncores, mem=mem, lbackfill=lbackfill, runtime_override=runtime_override, 
+                               lpin=lpin, lnuma=lnuma, callback=callback, **allargs)
     ec = 0 # cumulative exit code (sum of all members)
     # check and run setup and configuration
     if lsetup:
-      arglist = set(inspect.getargspec(HGS.setupRundir).args)
-      arglist.union(inspect.getargspec(HGS.setupConfig).args)
-      if lgrok: arglist.union(inspect.getargspec(HGS.runGrok).args)
+      arglist = set(inspect.getfullargspec(HGS.setupRundir).args)
+      arglist.union(inspect.getfullargspec(HGS.setupConfig).args)
+      if lgrok: arglist.union(inspect.getfullargspec(HGS.runGrok).args)
       kwargs = {arg:allargs[arg] for arg in arglist if arg in allargs}
       ec = self.setupExperiments(inner_list=inner_list, outer_list=outer_list, lgrok=lgrok, lparallel=lparallel, NP=NP, 
                                  runtime_override=runtime_override, **kwargs)
@@ -282,9 +508,15 @@ class EnsHGS(object):
         rundirs = [rundir for rundir,OK in zip(self.rundirs,self.configOK) if not OK]
         raise GrokError("Experiment setup failed in {0} cases:\n{1}".format(ec,rundirs))
     # run HGS
-    kwargs = {arg:allargs[arg] for arg in inspect.getargspec(HGS.runHGS).args if arg in allargs}
-    ecs = self.runHGS(inner_list=inner_list, outer_list=outer_list, lparallel=lparallel, NP=NP, callback=callback, 
-                      skip_config=True, **kwargs) # setup already ran (or was skipped intentionally)
+    kwargs = {arg:allargs[arg] for arg in inspect.getfullargspec(HGS.runHGS).args if arg in allargs}
+    if lasync:
+      ecs = self.runAsync(inner_list=inner_list, outer_list=outer_list, ncores=ncores, callback=callback, 
+                          lpin=lpin, lnuma=lnuma, skip_config=True, **kwargs) 
+    else:
+      ecs = self.runHGS(inner_list=inner_list, outer_list=outer_list, lparallel=lparallel, NP=NP, callback=callback, 
+                        ncores=ncores, mem=mem, lbackfill=lbackfill, lpin=lpin, lnuma=lnuma, skip_config=True, 
+                        **kwargs) 
+    # N.B.: setup already ran (or was skipped intentionally)
     if any(ecs) or not all(self.HGSOK): 
       rundirs = [rundir for rundir,OK in zip(self.rundirs,self.HGSOK) if not OK]
       raise HGSError("HGS execution failed in {0} cases:\n{1}".format(sum(ecs),rundirs))
@@ -292,3 +524,97 @@ class EnsHGS(object):
     # return sum of all exit codes
     return ec
     
+  
+  def runPipelines(self, inner_list=None, outer_list=None, lparallel=True, NP=None, ncores=None, mem=None, 
+                   lbackfill=True, runtime_override=None, lpin=False, lnuma=True, callback=reportBack, **allargs):
+    ''' set up and execute all ensemble members in one batch, so that each member advances through setup, 
+        configuration, Grok, HGS, and post-processing independently (no barriers between phases) '''
+    if not self.lreport: callback = None # suppress output
+    kwargs = {arg:allargs[arg] for arg in inspect.getfullargspec(HGS.runPipeline).args if arg in allargs}
+    ecs = self.runPipeline(inner_list=inner_list, outer_list=outer_list, lparallel=lparallel, NP=NP, 
+                           ncores=ncores, mem=mem, lbackfill=lbackfill, callback=callback, lpin=lpin, lnuma=lnuma, 
+                           runtime_override=runtime_override, **kwargs)
+    if any(ecs) or not all(self.HGSOK): 
+      rundirs = [rundir for rundir,OK in zip(self.rundirs,self.HGSOK) if not OK]
+      raise HGSError("HGS pipeline execution failed in {0} cases:\n{1}".format(sum(ecs),rundirs))
+    # return sum of all exit codes
+    return sum(ecs)
+    
+  
+  def runQueue(self, queue_folder=None, NP=None, lparallel=True, lease_time=600., runtime_override=None, 
+               llongest=True, callback=reportBack, **allargs):
+    ''' claim members from a work queue on a shared file system and run them in pipeline mode, using NP 
+        worker threads; several instances (e.g. on different nodes) can process the same ensemble and each 
+        member is executed by only one instance; leases of crashed instances expire after 'lease_time' 
+        seconds and instances keep polling, until all members are done, so that members of crashed
+        instances are claimed again; returns the sum of exit codes of members executed by this instance '''
+    if not self.lreport: callback = None # suppress output
+    queue_folder = self.work_queue if queue_folder is None else queue_folder
+    if queue_folder is None: raise ArgumentError("Need to specify a work queue folder.")
+    kwargs = {arg:allargs[arg] for arg in inspect.getfullargspec(HGS.runPipeline).args if arg in allargs}
+    if runtime_override is not None: kwargs['runtime_override'] = runtime_override
+    kwargs['lerror'] = False # report failures through exit codes
+    queue = WorkQueue(queue_folder, lease_time=lease_time)
+    # claim long simulations first
+    order = longestFirst(predictRuntimes(self.members)) if llongest else list(range(len(self.members)))
+    keys = [self.members[i].rundir for i in order]
+    index = {key:i for key,i in zip(keys,order)}
+    ecs = dict() # exit codes of members executed by this instance
+    depends = self.depends or [None]*len(self.members)
+    parents = {key:(None if depends[i] is None else self.members[depends[i]].rundir) for key,i in index.items()}
+    def available():
+      ''' return members without pending parents and a flag indicating if members are not done yet 
+          (waiting for parents or claimed by other workers or instances, which may crash) '''
+      waiting = False; keys_ready = []
+      for key in keys:
+        if queue.isDone(key): continue
+        waiting = True
+        parent = parents[key]
+        if parent is None or queue.isDone(parent): keys_ready.append(key)
+      return keys_ready, waiting
+    def worker():
+      while True:
+        keys_ready, waiting = available()
+        key = queue.claimNext(keys_ready)
+        if key is None and waiting: 
+          time.sleep(min(10.,lease_time/10.)); continue # running elsewhere (stale leases are broken in claim)
+        elif key is None: return # all members are done
+        member = self.members[index[key]]
+        if parents[key] is not None and ( queue.doneRecord(parents[key]) or dict() ).get('ec') != 0:
+          print(("Skipping experiment '{:s}' (dependency failed).".format(key)))
+          queue.release(key, ldone=True, ec=1); ecs[key] = 1; continue
+        try: 
+          # set initial conditions from parent (possibly completed by another instance)
+          if parents[key] is not None: member.ic_files = self.members[depends[index[key]]].lastOutput()
+          record = apply_member(member, 'runPipeline', **kwargs)
+        except Exception as e:
+          print(("Error in member '{:s}': {}".format(key,e)))
+          record = dict(rundir=member.rundir, ec=1, state=dict(), wall_time=None)
+        ec = record['ec'] if isinstance(record['ec'], int) else 1
+        queue.release(key, ldone=True, ec=ec, wall_time=record['wall_time'])
+        ecs[key] = ec
+        if callback: callback(record)
+    NP = ( NP or multiprocessing.cpu_count() ) if lparallel else 1
+    try:
+      with ThreadPoolExecutor(max_workers=NP) as executor:
+        futures = [executor.submit(worker) for _ in range(NP)]
+        for future in futures: future.result()
+    finally: queue.close() # release leases (e.g. on KeyboardInterrupt)
+    if self.lreport:
+      print(("Executed {:d} of {:d} experiments in this instance ({:d} pending elsewhere).".format(
+             len(ecs), len(keys), len(queue.pending(keys)))))
+    return sum(ecs.values())
+  
+  def runAsync(self, inner_list=None, outer_list=None, ncores=None, lterminate=False, error_patterns=None, 
+               lpin=False, lnuma=True, callback=reportBack, **kwargs):
+    ''' run Grok and HGS for all members from this process, using an asyncio supervisor (no worker
+        processes); simulations are packed onto 'ncores' cores, based on the NP setting of each member
+        (and pinned to disjoint sets of cores, if 'lpin' is True); logs are streamed and scanned for errors 
+        while the simulations are running '''
+    if not self.lreport: callback = None # suppress output
+    kwargs_list = expandArgumentList(inner_list=inner_list, outer_list=outer_list, **kwargs)
+    if len(kwargs_list) == 1: kwargs_list = kwargs_list * len(self.members)
+    supervisor = Supervisor(ncores=ncores, error_patterns=error_patterns, lterminate=lterminate, 
+                            lpin=lpin, lnuma=lnuma)
+    ecs = supervisor.run(self.members, kwargs_list=kwargs_list, callback=callback)
+    return tuple(ecs)
@@ -11,13 +11,24 @@ that also handles folder setup (based on template) and execution of HGS.
 import numpy as np
 import os, shutil
 import subprocess # launching external programs
-import bisect
+import bisect, time
 # internal imports
 from hgsrun.input_list import generateInputFilelist, resolveInterval, rewriteInputFilelist, getIncFolderFile
 from hgsrun.misc import lWin, symlink_ms, GrokError, HGSError, timeseriesFiles,\
   binaryFiles, well_files, hydro_files, water_file, newton_file, out_files,\
-  head_files, restart_file, grok_file
-from hgsrun.misc import parseGrokFile, clearFolder, numberedPattern
+  head_files, restart_file, grok_file, coords_pm_file, grok_exit, hgs_exit
+from hgsrun.misc import loadGrokFile, clearFolder, numberedPattern, RunDirIndex, newtonSummary, materializeFolder,\
+  writeManifest, breakLink, lastRecord
+from hgsrun.history import RunHistory
+from hgsrun.watchdog import Watchdog
+from hgsrun import grok_cache
+from hgsrun.state_db import openStateDB
+from hgsrun.staging import Stager, StagingError
+from hgsrun.concat import concatSegments, initialTime
+from hgsrun.compression import Compressor, archiveMembers, extractFiles, bin_pattern
+from hgsrun.forcing_cache import ForcingCache, readManifest, manifest_file as forcing_manifest
+from hgsrun.forcing_cache import writeManifest as writeForcingManifest
+from hgsrun.affinity import launchCommand
 from geodata.misc import ArgumentError
 from utils.misc import tail
 
@@ -50,6 +61,7 @@ class Grok(object):
   hydro_file = hydro_files # hydrographs
   well_file = well_files # observation wells
   lchannel = None # whether or not we are using 1D channels  
+  affinity = None # CPU affinity and priority of Grok/HGS processes ('cpus', 'nice', 'ionice'; see hgsrun.affinity)
   rundir = None # folder where the experiment is set up and executed
   project = None # a project designator used for file names
   problem = None # the HGS problem name (defaults to project)
@@ -59,6 +71,7 @@ class Grok(object):
   input_prefix = None # prefix for input files
   input_folder = '../climate_forcing' # default folder for input data
   pet_folder = None # an alternative folder for PET input (usually for climatology)
+  forcing_cache = None # node-local folder for cached climate forcing (None: read from input folder)
   precip_inc = None # a pre-written include file for liquid water forcing (skip auto-generation)
   pet_inc = None  # a pre-written include file for PET forcing to be used (skip auto-generation)
   precip_scale = None # scaling factor for precip/rain input rasters
@@ -67,7 +80,7 @@ class Grok(object):
   starttime = 0 # model time at initialization
   runtime = None # run time for the simulations (in seconds)
   length = None # run time in multiples of the interval length
-  _lines = None # list of lines in file
+  _lines = None # list of lines in file (indexed, see GrokLines)
   _sourcefile = None # file that the configuration was read from
   _targetfile = None # file that the configuration is written to
   
@@ -113,9 +126,8 @@ class Grok(object):
     if not os.path.isfile(filename): 
         raise IOError("Grok configuration file not found: '{}'".format(filename))
     self._sourcefile = filename # use  different file as template
-    # read source file (and recurse into includes)
-    self._lines = [] # initialize empty list (will be extended in-place)
-    parseGrokFile(filename, self._lines)
+    # read source file (and recurse into includes); templates are only parsed once
+    self._lines = loadGrokFile(filename)
     # check if we are dealing with channels
     self.lchannel = 'channel' in self._lines    
     # return exit code
@@ -130,7 +142,7 @@ class Grok(object):
     if os.path.isfile(filename): shutil.move(filename, '{:s}.backup'.format(filename))
     # write configuration to file
     with open(filename, 'w') as tgt: # with-environment should take care of closing the file
-        tgt.write('\n'.join(self._lines)+'\n')
+        tgt.writelines(line+'\n' for line in self._lines) # serialize in one pass
         # N.B.: this is necessary, because our list does not have newlines and Python does not add them...
     # return exit code
     return 0 if os.path.isfile(filename) else 1
@@ -147,9 +159,9 @@ class Grok(object):
       # vector-valued parameter
       values = [formatter(val) for val in value] # apply formatter to list items
       start = self._lines.index(param, start) # find begin of vector statement
-      end = self._lines.index('end', start) # 'end' marks the end of a vector statement
-      # insert list of vector entries into file, line by line
-      self._lines = self._lines[:start+1] + values + self._lines[end:]
+      end = self._lines.blockEnd(start) # 'end' marks the end of a vector statement
+      # replace vector entries in place
+      self._lines[start+1:end] = values
       # N.B.: the Grok class is not able to detect nested lists/vector-valued parameters; it is only possible to 
       #       manipulate inner-most lists, because the insertion is terminated at the first 'end'
     else:
@@ -225,34 +237,34 @@ class Grok(object):
         the occurence is returned. '''
     # lall indicates wether all occurences or just the first one should be commented out
     if after is not None: start = self._lines.index(after, start) # search offset for primary paramerter
-    # find entry
-    try: 
-      i = self._lines.index(param, start)
-    except ValueError:
-      if lerror: raise
+    # find entries
+    if lall: occurences = self._lines.findAll(param, start)
+    else: 
+      i = self._lines.find(param, start)
+      occurences = [] if i is None else [i]
+    if not occurences:
+      if lerror: raise ValueError("'{}' is not in list".format(param))
       else: return None
-    # comment out command
-    self._lines[i] = '! '+self._lines[i]
-    i += 1 # increment index
-    # comment out values; different handling for scalars and lists
-    if llist is False:
-      self._lines[i] = '! '+self._lines[i] # just one value
-    else:
-      lterm = False # indicate if list is complete
-      while i < len(self._lines) and not lterm:
-        self._lines[i] = '! '+self._lines[i] # comment line by line
-        value = self._lines[i] # lines should be stripped (but still case-sensitive!)
-        if value == 'end': lterm = True # proper termination of list
-        i += 1 # increment to next line
-    # find more occurences recursively
-    if lall: 
-        ii = self.remParam(param, llist=llist, after=None, start=i, lerror=False, lall=True)
-        if ii is None: 
-            i = [i] # terminate recursion - return current occurence as last in the list
-        else:
-            i = [i] + ii # prepend this current occurence to list from recursion
-    # return index position 
-    return i
+    indices = []; i = start
+    for pos in occurences:
+      if pos < i: continue # part of the values of the previous occurence
+      i = pos
+      # comment out command
+      self._lines[i] = '! '+self._lines[i]
+      i += 1 # increment index
+      # comment out values; different handling for scalars and lists
+      if llist is False:
+        self._lines[i] = '! '+self._lines[i] # just one value
+      else:
+        lterm = False # indicate if list is complete
+        while i < len(self._lines) and not lterm:
+          value = self._lines[i] # lines should be stripped (but still case-sensitive!)
+          self._lines[i] = '! '+value # comment line by line
+          if value == 'end': lterm = True # proper termination of list
+          i += 1 # increment to next line
+      indices.append(i)
+    # return index position(s)
+    return indices if lall else indices[0]
   
   def remParams(self, *params, **kwargs):
     ''' comment out a list of parameters (and their values) '''
@@ -261,7 +273,7 @@ class Grok(object):
       
   def changeICs(self, ic_pattern=None):
     ''' change the initial condition files in Grok using either .hen/restart or head/output files'''
-    os.chdir(self.rundir)
+    rundir = self.rundir # IC files are relative to rundir
     # check which type of restart file we are dealing with
     if not isinstance(ic_pattern,str): 
         raise TypeError(ic_pattern)
@@ -273,15 +285,15 @@ class Grok(object):
         raise ArgumentError('Filetype expansion is not supported for .hen files:',ic_pattern)
     elif lhenf:
         ic_file_hen = ic_pattern # for consistency
-        if not os.path.exists(ic_file_hen): IOError(ic_file_hen)
+        if not os.path.exists(os.path.join(rundir,ic_file_hen)): IOError(ic_file_hen)
     elif lheadf:
         ic_file_pm = ic_pattern.format(FILETYPE=self.pm_tag)
-        if not os.path.exists(ic_file_pm): IOError(ic_file_pm)
+        if not os.path.exists(os.path.join(rundir,ic_file_pm)): IOError(ic_file_pm)
         ic_file_olf = ic_pattern.format(FILETYPE=self.olf_tag)
-        if not os.path.exists(ic_file_olf): IOError(ic_file_olf)
+        if not os.path.exists(os.path.join(rundir,ic_file_olf)): IOError(ic_file_olf)
         if self.lchannel:
             ic_file_chan = ic_pattern.format(FILETYPE=self.chan_tag)
-            if not os.path.exists(ic_file_chan): IOError(ic_file_chan) 
+            if not os.path.exists(os.path.join(rundir,ic_file_chan)): IOError(ic_file_chan) 
     else: raise ArgumentError('Restart filetype not recognized: {}'.format(ic_pattern))
     # see if we are using .hen restart files
     hen_file,i = self.getParam('restart file for heads', dtype=str, llist=False, lindex=True, lerror=False)
@@ -446,6 +458,7 @@ class Grok(object):
     elif not isinstance(input_vars, dict): raise TypeError(input_vars)
     # iterate over variables and generate corresponding input lists
     ec = 0 # cumulative exit code
+    inc_files = [] # include files in the run folder
     for varname,val in input_vars.items():
       grokname,vartype,wrfvar = val
       if self.getParam('name', after=vartype, llist=False).lower() != grokname:
@@ -459,9 +472,11 @@ class Grok(object):
         lec = rewriteInputFilelist(inc_file=inc_file, inc_folder=inc_folder, rundir=self.rundir, lvalidate=lvalidate)              
         # set include file in Grok file
         self.setParam('time raster table', 'include {}'.format(inc_file), after=vartype)
+        inc_files.append(inc_file)
       else:
         filename = '{}.inc'.format(varname)
         self.setParam('time raster table', 'include {}'.format(filename), after=vartype)      
+        inc_files.append(filename)
         # special handling for quasi-transient forcing based on variable
         if self.input_mode == 'quasi-transient':
             input_mode = 'periodic' if varname == 'pet' else 'transient' 
@@ -498,49 +513,103 @@ class Grok(object):
       elif varname == 'pet' and pet_scale is not None:
           self.setParam('scaling factor', str(pet_scale), after='potential evapotranspiration')
       ec += 0 if lec else 1          
+    # redirect input files to the node-local forcing cache
+    if self.forcing_cache and ec == 0: self.cacheForcing(inc_files, lvalidate=lvalidate)
+    elif os.path.exists(os.path.join(self.rundir,forcing_manifest)): os.remove(os.path.join(self.rundir,forcing_manifest))
     # return exit code
     return ec
   
-  def runGrok(self, executable=None, logfile=None, batchpfx=None, lerror=True, lcompress=False, ldryrun=False):
-    ''' run the Grok executable in the run directory '''
-    pwd = os.getcwd() # save present workign directory to return later
-    os.chdir(self.rundir) # go into run Grok/HGS folder
-    if not logfile: logfile = self.grok_log
+  def cacheForcing(self, inc_files, cache_folder=None, lvalidate=True):
+    ''' copy the input files that are referenced in the include files into the node-local forcing cache
+        and rewrite the include files, so that they point to the cached files; the cached files are 
+        recorded in a manifest, so that they can be restored at run time (e.g. after cleanup) '''
+    cache = ForcingCache(self.forcing_cache if cache_folder is None else cache_folder)
+    sources = set()
+    for inc_file in inc_files:
+      with open(os.path.join(self.rundir,inc_file)) as f:
+        for line in f:
+          if line.strip(): 
+            filepath = line.split()[1]
+            sources.add(filepath if os.path.isabs(filepath) else os.path.abspath(os.path.join(self.rundir,filepath)))
+    # populate cache (without keeping a reference; members acquire references, when they run)
+    mapping = cache.populate(sorted(sources))
+    for inc_file in inc_files:
+      rewriteInputFilelist(inc_file=inc_file, inc_folder='.', rundir=self.rundir, lvalidate=lvalidate, 
+                           path_map=mapping.get)
+    writeForcingManifest(self.rundir, cache.folder, mapping)
+    return mapping
+  
+  def acquireForcing(self):
+    ''' acquire a reference to the forcing cache and restore missing files (e.g. on a different node);
+        returns the cache and the reference (or None, if the member does not use a forcing cache) '''
+    cache_folder, sources = readManifest(self.rundir)
+    if cache_folder is None: return None
+    cache = ForcingCache(cache_folder)
+    return cache, cache.acquire(sources)
+  
+  def releaseForcing(self, reference):
+    ''' release a reference to the forcing cache (the cache is removed, if no other member uses it) '''
+    if reference is not None: 
+      cache, ref = reference
+      cache.release(ref)
+  
+  def prepareGrok(self, executable=None, batchpfx=None):
+    ''' check the Grok executable and write the batch.pfx file; return the command to launch Grok 
+        (child classes may return None, if Grok does not have to be executed) '''
     self.grok_bin = executable if executable is not None else self.grok_bin
     self.batchpfx = batchpfx if batchpfx is not None else self.batchpfx
-    if not os.path.lexists(self.grok_bin): 
+    grok_bin = os.path.join(self.rundir,self.grok_bin) # relative to rundir
+    if not os.path.lexists(grok_bin): 
       raise IOError("Grok executable '{}' not found.\n".format(self.grok_bin))
     # create batch.pfx file with problem name for batch processing
-    with open(self.batchpfx, 'w+') as bp: bp.write(self.problem) # just one line...
-    # run executable while logging output
-    with open(logfile, 'w+') as lf: # output and error log
-      if ldryrun:
-        lf.write('Dry-run --- no execution')
-        lec = True # pretend everything works
-      else:
-        # run Grok
-        subprocess.call([os.path.abspath(self.grok_bin)], stdout=lf, stderr=lf)
-        # parse log file for errors
-        lec = ( tail(lf, n=3)[0].strip() == '---- Normal exit ----' )
-        # i.e. -3, third line from the end (different from HGS)
+    batchpfx = os.path.join(self.rundir,self.batchpfx)
+    breakLink(batchpfx) # don't modify the template
+    with open(batchpfx, 'w+') as bp: bp.write(self.problem) # just one line...
+    command = [os.path.abspath(grok_bin)]
+    return command
+  
+  def finishGrok(self, logfile=None, lec=True, lerror=True, lcompress=False):
+    ''' post-process Grok output (compress debug output) and raise an error, if Grok failed '''
+    if not logfile: logfile = self.grok_log
     # compress grok debug output
     if lcompress and lec:
-      with open(logfile, 'a') as lf: # output and error log
+      grok_dbg = os.path.join(self.rundir,self.grok_dbg)
+      with open(os.path.join(self.rundir,logfile), 'a') as lf: # output and error log
         try:
-          if os.path.exists(self.grok_dbg):
+          if os.path.exists(grok_dbg):
             # compress using gzip (single file; no shell expansion necessary)
-            subprocess.call(['gzip','-f',self.grok_dbg], stdout=lf, stderr=lf)
-            if os.path.exists(self.grok_dbg+'.gz'): 
+            subprocess.call(['gzip','-f',self.grok_dbg], cwd=self.rundir, stdout=lf, stderr=lf)
+            if os.path.exists(grok_dbg+'.gz'): 
               lf.write('\nCompressed Grok debug output ({}.gz).\n'.format(self.grok_dbg))
             else: raise IOError # just trigger exception (see below)
           else:
             lf.write('\nNo Grok debug output found ({}).\n'.format(self.grok_dbg))
         except:
           lf.write('\nGrok debug output compression failed ({}).\n'.format(self.grok_dbg))
-    os.chdir(pwd) # return to previous working directory
     if lerror and not lec: 
       raise GrokError("Grok failed; inspect log-file: {}\n  ('{}')\n".format(logfile,self.rundir))
     return 0 if lec else 1
+  
+  def runGrok(self, executable=None, logfile=None, batchpfx=None, lerror=True, lcompress=False, ldryrun=False):
+    ''' run the Grok executable in the run directory '''
+    command = self.prepareGrok(executable=executable, batchpfx=batchpfx)
+    if not logfile: logfile = self.grok_log
+    # run executable while logging output
+    with open(os.path.join(self.rundir,logfile), 'w+') as lf: # output and error log
+      if command is None:
+        lf.write('Grok output is up-to-date or was restored from cache --- no execution')
+        lec = True; lcompress = False # no new debug output
+      elif ldryrun:
+        lf.write('Dry-run --- no execution')
+        lec = True # pretend everything works
+      else:
+        # run Grok
+        command = launchCommand(command, self.affinity)
+        subprocess.call(command, cwd=self.rundir, stdout=lf, stderr=lf)
+        # parse log file for errors
+        lec = ( tail(lf, n=3)[0].strip() == grok_exit )
+        # i.e. -3, third line from the end (different from HGS)
+    return self.finishGrok(logfile=logfile, lec=lec, lerror=lerror, lcompress=lcompress)
             
       
 class HGS(Grok):
@@ -559,16 +628,33 @@ class HGS(Grok):
   pidx_file = 'parallelindx.dat' # file with parallel execution settings 
   lindicators = True # use indicator files (default: True)
   lrestart  = False # whether or not this is a restart run (to complete an interrupted run)
+  restart_folders = None # folders with output from previous (re-)starts (see rewriteRestart)
+  pidx_settings = None # default parallel settings for parallelindx.dat (e.g. from autotuning)
   ic_files  = None # pattern for initial condition files (path can be expanded)
+  memory    = None # memory required by HGS (in MB; used for scheduling)
+  history_file = None # file to record run times (used to predict run times of ensemble members)
+  grok_cache = None # folder for content-addressed Grok output cache (None: no caching)
+  state_db  = None # SQLite database that records member states (None: only indicator files)
+  _grok_hash = None # hash of current Grok configuration and referenced files
+  _grok_snapshot = None # files in rundir before Grok was launched
+  materialize = 'copy' # how template files are replicated in the rundir: 'copy', 'link' (hardlink) or 'reflink'
+  _rundir_index = None # index of the run folder that is shared by all collectors (see rundirIndex)
   
   def __init__(self, rundir=None, project=None, problem=None, runtime=None, length=None, output_interval='default',
                input_mode=None, input_interval=None, input_vars='PET', input_prefix=None, pet_folder=None, 
                precip_inc=None, pet_inc=None, precip_scale=None, pet_scale=None, 
                input_folder='../climate_forcing', template_folder=None, linked_folders=None, NP=1, lindicator=True,
-               grok_bin='grok.exe', hgs_bin='phgs.exe', lrestart=False, ic_files=None):
+               grok_bin='grok.exe', hgs_bin='phgs.exe', lrestart=False, ic_files=None, memory=None,
+               history_file=None, grok_cache=None, state_db=None, forcing_cache=None, affinity=None):
     ''' initialize HGS instance with a few more parameters: number of processors... also ic_files, which is
         the file pattern for initial condition files; it must contain '{FILETYPE}' and will be expanded by 
-        the ensemble class EnsHGS.'''
+        the ensemble class EnsHGS; memory is the memory requirement in MB (only used for scheduling);
+        run times are recorded in history_file, if given (used to order ensemble members); Grok output
+        is stored in and restored from grok_cache, if given (a folder shared by ensemble members); state
+        transitions are recorded in the database state_db, if given (in addition to indicator files);
+        climate forcing is read from a node-local copy in forcing_cache, if given; affinity is a dictionary
+        with the niceness ('nice') and I/O priority ('ionice') of Grok and HGS (cores are assigned by the
+        ensemble scheduler).'''
     # call parent constructor (Grok)
     super(HGS,self).__init__(rundir=rundir, project=project, problem=problem, runtime=runtime, 
                              output_interval=output_interval, input_vars=input_vars, input_prefix=input_prefix,
@@ -586,15 +672,25 @@ class HGS(Grok):
     self.linked_folders = linked_folders
     # N.B.: these folders just contain static data and do not need to be replicated
     self.NP = NP # number of processors
+    self.memory = memory # memory requirement (MB)
+    self.history_file = os.path.abspath(history_file) if history_file else None # run time history
+    self.grok_cache = os.path.abspath(grok_cache) if grok_cache else None # Grok output cache
+    self.state_db = os.path.abspath(state_db) if state_db else None # state database
+    self.forcing_cache = forcing_cache # N.B.: node-local paths (e.g. '$TMPDIR') are expanded on the node
+    self.affinity = dict(affinity) if affinity else None # process priority (and cores)
     self.lindicators = lindicator # use indicator files
     self.lrestart = lrestart # complete an interrupted run
+    self.config_args = dict() # arguments of the last setupConfig call (reused by prepareHGS)
     if ic_files:
         if not ( '{FILETYPE}' in ic_files or ic_files.endswith('.hen') ):
             raise HGSError('IC file name/pattern must contain \'{{FILETYPE}}\' or be a \'.hen\' file:\n {}'.format(ic_files))
         self.ic_files = ic_files # initial condition file pattern (path will be expanded)
     
-  def setupRundir(self, template_folder=None, bin_folder='{HGSDIR:s}', loverwrite=None, lschedule=True):
-    ''' copy entire run folder from a template folder and link executables '''
+  def setupRundir(self, template_folder=None, bin_folder='{HGSDIR:s}', loverwrite=None, lschedule=True,
+                  materialize=None, nthreads=8):
+    ''' copy entire run folder from a template folder and link executables; with materialize='link' or
+        'reflink', template files are hardlinked or cloned (copy-on-write), except for files that are 
+        rewritten (these are copied); a manifest records how each file was materialized '''
     template_folder = self.template_folder if template_folder is None else template_folder
     if template_folder is None: raise ValueError("Need to specify a template path.")
     if not os.path.exists(template_folder): raise IOError(template_folder)
@@ -610,8 +706,15 @@ class HGS(Grok):
       clearFolder(self.rundir, lWin=lWin, lmkdir=False)
       # N.B.: rmtree is dangerous, because if follows symbolic links and deletes contents of target directories!
     # copy folder tree
-    if not os.path.isdir(self.rundir): shutil.copytree(template_folder, self.rundir, symlinks=True,
-                                                       ignore=shutil.ignore_patterns('*.grok*',*self.linked_folders))
+    materialize = self.materialize if materialize is None else materialize
+    if not os.path.isdir(self.rundir): 
+      ignore = shutil.ignore_patterns('*.grok*',*self.linked_folders)
+      if materialize == 'copy': 
+        shutil.copytree(template_folder, self.rundir, symlinks=True, ignore=ignore)
+      else:
+        # link or clone files from template (using a thread pool) and record method for each file
+        manifest = materializeFolder(template_folder, self.rundir, mode=materialize, ignore=ignore, nthreads=nthreads)
+        writeManifest(self.rundir, manifest, mode=materialize, template=os.path.abspath(template_folder))
     # place link to template
     template_link = os.path.join(self.rundir,'template')
     if os.path.exists(template_link): os.rmdir(template_link) if lWin else os.remove(template_link)
@@ -651,20 +754,16 @@ class HGS(Grok):
     # set rundir status
     self.rundirOK = os.path.isdir(self.rundir)
     if self.lindicators and lschedule: 
-      if self.rundirOK: open('{}/SCHEDULED'.format(self.rundir),'a').close()
-      else: open('{}/ERROR'.format(self.rundir),'a').close()
+      self.setIndicator('SCHEDULED' if self.rundirOK else 'ERROR')
     return 0 if self.rundirOK else 1
     
   def rewriteRestart(self, backup_folder='restart_', lerror=True, nidx=4, ldryrun=False):
     ''' rewrite grok file for a restart based on existing output files '''
-    os.chdir(self.rundir) # move into directory and work with relative path
-    # extract end time from time series to find restart time   
-    with open(self.newton_file, 'r') as nf:
-        lines = nf.readlines()
-    #TODO: this could be moved into a function to query begin and end times
-    #      in time-series files and check consistency between files
-    last_time = float(lines[-1].split()[0])
-    out_times = self.getParam('output times', dtype='float', llist=True)
+    rundir = self.rundir # all file names are relative to rundir
+    # extract end time from time series to find restart time (only the end of the file is read)
+    last_record = lastRecord(os.path.join(rundir,self.newton_file))
+    last_time = last_record[0] if last_record else -np.inf # no complete time steps
+    out_times = self.getParam('output times', dtype=float, llist=True)
     restart_index = bisect.bisect(out_times, last_time)
     times_done = out_times[:restart_index]
     if len(times_done)==0:        
@@ -678,44 +777,101 @@ class HGS(Grok):
     self.setParam('output times', times_todo, formatter='{:e}', )
     self.setParam('initial time', restart_time, formatter='{:e}', )
     # find last head files
-    filetypes = [self.pm_files,self.olf_files]
-    if self.lchannel: filetypes += [self.chan_files]
-    indices = [] # last indices out head output files
-    for filetype in filetypes: 
-      # nidx: number of digits at the end
-      name_pattern = filetype.format(IDX=0)[:-nidx] # cut off last four digits
-      file_indices = numberedPattern(name_pattern, nidx=nidx, folder=None)
-      indices.append(max(file_indices))
+    index = self.rundirIndex(nidx=nidx) # scan run folder only once
+    indices = [max(file_indices) for file_indices in self.headIndices(index=index, nidx=nidx)] # last indices
     if min(indices) < max(indices): # should all be the same
         raise IOError("Available head output files (PM,OLF,Chan) are not numbered consistently -- cannot restart!")    
     # now we know that we are actually restarting, so set RESTART indicator
-    open('RESTARTED','a').close()
+    open(os.path.join(rundir,'RESTARTED'),'a').close()
     # assemble name for restart file pattern
     tmp = self.out_files.format(PROBLEM=self.problem, FILETYPE='{FILETYPE}', IDX='{IDX:04d}')
     # N.B.: the double-format is necessary, because IDX is enclosed in double-braces (see Grok.__init__)      
     restart_pattern = tmp.format(IDX=indices[0], FILETYPE='{FILETYPE}')
     # determine new restart backup folder to store time-dependent output
     # N.B.: to prevent data loss, a new folder with a 4-digit running number is created
-    folder_idxs = numberedPattern(backup_folder, nidx=nidx, folder=None)
+    folder_idxs = numberedPattern(backup_folder, nidx=nidx, index=index)
     idx = ( max(folder_idxs) if len(folder_idxs) > 0 else 0 ) + 1 # IS USED!
     self.restart_folders = [ backup_folder + '{:04d}'.format(idx) for idx in folder_idxs + [idx] ]
     restart_folder = self.restart_folders[-1] # last element
     if not ldryrun: # for testing we don't actually want to move files...
-        os.mkdir(restart_folder)
+        os.mkdir(os.path.join(rundir,restart_folder)); index.add(restart_folder, isdir=True)
         # backup grok files
-        shutil.copy2(self.grok_file.format(PROBLEM=self.problem), restart_folder)
+        shutil.copy2(os.path.join(rundir,self.grok_file.format(PROBLEM=self.problem)), os.path.join(rundir,restart_folder))
         # move time-series and binary files
-        ts_list = timeseriesFiles(prefix=self.problem, folder=None, ldict=False, llogs=True, lcheck=True)
-        binary_list = binaryFiles(prefix=self.problem, folder=None, nidx=nidx, ldict=False)
+        ts_list = timeseriesFiles(prefix=self.problem, ldict=False, llogs=True, lcheck=True, index=index)
+        binary_list = binaryFiles(prefix=self.problem, nidx=nidx, ldict=False, index=index)
         for backup_file in ts_list + binary_list:
-            shutil.move(backup_file,restart_folder) # relative path
+            shutil.move(os.path.join(rundir,backup_file),os.path.join(rundir,restart_folder))
+            index.discard(backup_file)
         # add backup folder to restart file pattern (will be checked when restart files are updated)
         restart_pattern = os.path.join(restart_folder,restart_pattern)
     # return name of restart file
     return restart_pattern
     
+  def rundirIndex(self, nidx=4, lforce=False):
+    ''' return the index of the run folder; the index is shared and only refreshed, if the folder changed '''
+    index = self._rundir_index
+    if index is None or index.folder != self.rundir or index.prefix != self.problem or index.nidx != nidx:
+      index = self._rundir_index = RunDirIndex(self.rundir, prefix=self.problem, nidx=nidx)
+    else: index.refresh(lforce=lforce)
+    return index
+    
+  def headIndices(self, index=None, nidx=4, lchannel=None):
+    ''' return lists of output indices of head files (PM, OLF and, if present, channel) '''
+    filetypes = [self.pm_files,self.olf_files]
+    if self.lchannel if lchannel is None else lchannel: filetypes += [self.chan_files]
+    if index is None: index = self.rundirIndex(nidx=nidx)
+    # N.B.: the name pattern is the file name without the index (nidx digits at the end)
+    return [numberedPattern(filetype.format(IDX=0)[:-nidx], nidx=nidx, index=index) for filetype in filetypes]
+  
+  def lastOutput(self, nidx=4, lextract=True):
+    ''' return the initial condition file pattern for the last complete set of head output files (e.g. 
+        for ic_files of a dependent simulation; the path is absolute); if the output has been compressed, 
+        the head files are extracted from the archive '''
+    rundir = self.rundir
+    index = self.rundirIndex(nidx=nidx)
+    tar_file = 'binary_fields.tgz' # legacy archive (before indexed compression, see finishHGS)
+    lchannel = self.lchannel
+    def lastIndex():
+      ''' last index that is available for all head file types '''
+      indices = [set(file_indices) for file_indices in self.headIndices(index=index, nidx=nidx, lchannel=lchannel)]
+      common = set.intersection(*indices)
+      return max(common) if common else None
+    if lchannel is None: # determine from output files
+      lchannel = len(self.headIndices(index=index, nidx=nidx, lchannel=True)[-1]) > 0
+    idx = lastIndex(); lextracted = False; lindexed = False
+    members = archiveMembers(rundir) if idx is None and lextract else []
+    if members:
+      # add members of the indexed archive (random access, only the head files are decompressed)
+      index = index.copy() # N.B.: archive members are not in the folder, so the shared index is not modified
+      for name in members: index.add(name)
+      if self.lchannel is None: lchannel = len(self.headIndices(index=index, nidx=nidx, lchannel=True)[-1]) > 0
+      idx = lastIndex(); lextracted = lindexed = idx is not None
+    elif idx is None and lextract and os.path.isfile(os.path.join(rundir,tar_file)):
+      # add archive members to index and extract the last head files
+      tar = subprocess.run(['tar','tzf',tar_file], cwd=rundir, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+      if tar.returncode == 0:
+        index = index.copy() # see above
+        for name in tar.stdout.decode().split(): index.add(name)
+        if self.lchannel is None: lchannel = len(self.headIndices(index=index, nidx=nidx, lchannel=True)[-1]) > 0
+        idx = lastIndex(); lextracted = idx is not None
+    if idx is None: 
+      raise HGSError("No head output files found for initial conditions:\n  ('{}')".format(rundir))
+    tmp = self.out_files.format(PROBLEM=self.problem, FILETYPE='{FILETYPE}', IDX='{IDX:04d}')
+    ic_pattern = tmp.format(IDX=idx, FILETYPE='{FILETYPE}') # see rewriteRestart
+    if lextracted:
+      filetypes = [self.pm_tag,self.olf_tag] + ( [self.chan_tag] if lchannel else [] )
+      if lindexed: extractFiles(rundir, [ic_pattern.format(FILETYPE=ft) for ft in filetypes])
+      else:
+        ec = subprocess.call(['tar','xzf',tar_file] + [ic_pattern.format(FILETYPE=ft) for ft in filetypes], cwd=rundir)
+        if ec != 0: raise HGSError("Extraction of head files from '{}' failed:\n  ('{}')".format(tar_file,rundir))
+    return os.path.join(os.path.abspath(rundir), ic_pattern)
+    
   def setupConfig(self, template_folder=None, linput=True, lpidx=True, runtime_override=None, ldryrun=False):
-    ''' load config file from template and write configuration to rundir '''
+    ''' load config file from template and write configuration to rundir; the arguments are stored, so that
+        prepareHGS (e.g. a resubmit) writes the same configuration again '''
+    self.config_args = dict(template_folder=template_folder, linput=linput, lpidx=lpidx, 
+                            runtime_override=runtime_override)
     if template_folder is None:
       template_folder = self.rundir if self.template_folder is None else self.template_folder
     ec = 0 # cumulative exit code
@@ -744,21 +900,53 @@ class HGS(Grok):
     
   def runGrok(self, executable=None, logfile='log.grok', lerror=False, lconfig=True, linput=True, ldryrun=False, lcompress=True):
     ''' run the Grok executable in the run directory and set flag indicating success '''
-    if lconfig: self.writeConfig()
-    ec = super(HGS,self).runGrok(executable=executable, logfile=logfile, lerror=lerror, ldryrun=ldryrun, lcompress=lcompress)
-    self.GrokOK = True if ec == 0 else False # set Grok flag
-    return ec
+    if lconfig and self._lines is not None: self.writeConfig()
+    # N.B.: in worker processes the configuration is not transferred, once it has been written
+    return super(HGS,self).runGrok(executable=executable, logfile=logfile, lerror=lerror, ldryrun=ldryrun, lcompress=lcompress)
   
-  def writeParallelIndex(self, NP=None, dom_parts=None, solver=None, input_coloring=False, 
+  def prepareGrok(self, executable=None, batchpfx=None):
+    ''' check the Grok executable and write the batch.pfx file; if the Grok cache is used, check if Grok 
+        output is up-to-date or can be restored from the cache (returns None), otherwise return the command '''
+    command = super(HGS,self).prepareGrok(executable=executable, batchpfx=batchpfx)
+    self._grok_hash = self._grok_snapshot = None
+    if self.grok_cache:
+      if self._lines is not None: lines = self._lines
+      else: # configuration is on disk (e.g. in worker processes)
+        with open(os.path.join(self.rundir,self.grok_file), 'r') as gf: lines = [line.strip() for line in gf]
+      self._grok_hash = grok_cache.grokHash(lines, self.rundir)
+      # rerun of unchanged member: skip Grok entirely
+      if grok_cache.readHash(self.rundir) == self._grok_hash: return None
+      # link output from cache, if available
+      if grok_cache.restoreOutput(self.grok_cache, self._grok_hash, self.rundir) is not None:
+        grok_cache.writeHash(self.rundir, self._grok_hash)
+        return None
+      # remove output of a previous run that was restored from the cache (it may be linked to the cache)
+      grok_cache.removeOutput(self.grok_cache, self.rundir)
+      self._grok_snapshot = grok_cache.snapshotFolder(self.rundir) # to detect Grok output
+    return command
+  
+  def finishGrok(self, logfile='log.grok', lec=True, lerror=False, lcompress=True):
+    ''' post-process Grok output (store in cache) and set flag indicating success '''
+    self.GrokOK = bool(lec) # set Grok flag (before an error is raised)
+    if lec and self._grok_snapshot is not None:
+      # store new or modified files in the cache
+      files = grok_cache.changedFiles(self._grok_snapshot, grok_cache.snapshotFolder(self.rundir))
+      grok_cache.storeOutput(self.grok_cache, self._grok_hash, self.rundir, files)
+      grok_cache.writeHash(self.rundir, self._grok_hash)
+      self._grok_snapshot = None
+    return super(HGS,self).finishGrok(logfile=logfile, lec=lec, lerror=lerror, lcompress=lcompress)
+  
+  def writeParallelIndex(self, NP=None, dom_parts=None, solver=None, input_coloring=None, 
                          run_time=-1., restart=1, parallelindex=None):
-    ''' write the parallelindex.dat input file for HGS execution (executed by runHGS) '''
-    pwd = os.getcwd() # save present workign directory to return later
-    os.chdir(self.rundir) # go into run Grok/HGS folder
+    ''' write the parallelindex.dat input file for HGS execution (executed by runHGS); default settings
+        are taken from pidx_settings, if available (see hgsrun.autotune) '''
     # fix up arguments
     self.pidx_file = parallelindex if parallelindex is not None else self.pidx_file
+    settings = self.pidx_settings or dict()
     if NP is None: NP = self.NP
-    if dom_parts is None: dom_parts = NP
-    if solver is None: solver = 1 if NP == 1 else 2
+    if dom_parts is None: dom_parts = settings.get('dom_parts', NP)
+    if solver is None: solver = settings.get('solver', 1 if NP == 1 else 2)
+    if input_coloring is None: input_coloring = settings.get('input_coloring', False)
     input_coloring = 'T' if input_coloring else 'F'
     # the other two are just numbers (float and int)
     # insert arguments
@@ -769,26 +957,27 @@ class HGS(Grok):
     contents += '__Wrting_Output_Time\n  {:g}\n'.format(run_time)
     contents += '__Simulation_Restart\n  {:d}\n'.format(restart)
     # write file
-    with open(self.pidx_file, 'w+') as pi: pi.writelines(contents)
-    if os.path.isfile(self.pidx_file): self.pidxOK = True # make sure file was written
+    pidx_file = os.path.join(self.rundir,self.pidx_file) # relative to rundir
+    breakLink(pidx_file) # don't modify the template
+    with open(pidx_file, 'w+') as pi: pi.writelines(contents)
+    if os.path.isfile(pidx_file): self.pidxOK = True # make sure file was written
     else: raise IOError(self.pidx_file)
-    os.chdir(pwd) # return to previous working directory
     return 0 if self.pidxOK else 1
     
-  def runHGS(self, executable=None, logfile=None, lerror=True, lcompress=True,
-             skip_config=False, skip_grok=False, skip_pidx=False, ldryrun=False):
-    ''' check if all inputs are in place and run the HGS executable in the run directory '''
-    pwd = os.getcwd() # save present workign directory to return later    
-    os.chdir(self.rundir) # go into run Grok/HGS folder
-    if not logfile: logfile = self.hgs_log
+  def prepareHGS(self, executable=None, lerror=True, lcompress=True,
+                 skip_config=False, skip_grok=False, skip_pidx=False, ldryrun=False):
+    ''' check if all inputs are in place (run configuration and Grok, if necessary) and set the indicator
+        to 'in progress'; return the command to launch HGS and the cumulative exit code '''
+    rundir = self.rundir # all file names are relative to rundir
     self.hgs_bin = executable if executable is not None else self.hgs_bin
-    if not os.path.isfile(self.hgs_bin): 
+    hgs_bin = os.path.join(rundir,self.hgs_bin)
+    if not os.path.isfile(hgs_bin): 
       raise IOError("HGS executable '{}' not found.".format(self.hgs_bin))
     ## check prerequisites and run, if necessary
     # Grok configuration
     cec = 0
     if not skip_config and not self.configOK:
-      ec = self.setupConfig(ldryrun=ldryrun) # will run with defaults, assuming template is already defined
+      ec = self.setupConfig(ldryrun=ldryrun, **self.config_args) # same as last time, or defaults (template is defined)
       if ec != 0:
           if lerror: raise GrokError('Grok configuration did not complete properly.')
           else: print('ERROR: Grok configuration did not complete properly.')
@@ -803,30 +992,32 @@ class HGS(Grok):
     # parallelindex configuration
     if not skip_pidx and not self.pidxOK:
       self.writeParallelIndex() # write parallel index with default settings
-      if not os.path.isfile(self.pidx_file): 
+      if not os.path.isfile(os.path.join(rundir,self.pidx_file)): 
         raise HGSError('Parallel index file was not written properly.')  
     # set indicator file to 'in progress'
     if self.lindicators: 
-      shutil.move('SCHEDULED','IN_PROGRESS') # already in rundir  
-    ## run executable while logging output
-    with open(logfile, 'w+') as lf: # output and error log
-      if ldryrun:
-        lf.write('\nDry-run --- no execution\n')
-        lec = True # pretend everything works
-      else:
-        # run HGS as subprocess
-        subprocess.call([os.path.abspath(self.hgs_bin)], stdout=lf, stderr=lf)
-        # parse log file for errors
-        lec = ( tail(lf, n=2)[0].strip() == '---- NORMAL EXIT ----' )
-        # i.e. -2, second line from the end (and different capitalization from Grok!)
+      self.setIndicator('IN_PROGRESS', old='SCHEDULED') # the time stamp marks the start of the simulation
+    command = [os.path.abspath(hgs_bin)]
+    return command, cec
+  
+  def finishHGS(self, logfile=None, lec=True, cec=0, wall_time=None, lerror=True, lcompress=True, ldryrun=False,
+                fail_indicator='FAILED', compressor=None):
+    ''' post-process HGS output (record run time, concatenate restarts, compress binary output), set
+        the indicator file (fail_indicator, if HGS failed) and raise an error, if HGS failed; return the 
+        cumulative exit code; a compressor may already have compressed some files during the run '''
+    rundir = self.rundir # all file names are relative to rundir
+    if not logfile: logfile = self.hgs_log
     cec += 0 if lec else 1
+    # record run time in history file
+    if self.history_file and not ldryrun and wall_time is not None: 
+      self.recordHistory(wall_time=wall_time, lsuccess=lec)
     # concatenate output from restarts (if necesary)
     if self.lrestart:
       try:
         self.concatOutput()
-        shutil.move('RESTARTED','CONCATENATED')
+        shutil.move(os.path.join(rundir,'RESTARTED'),os.path.join(rundir,'CONCATENATED'))
       except:
-        with open(logfile, 'a') as lf: # output and error log
+        with open(os.path.join(rundir,logfile), 'a') as lf: # output and error log
           lf.write('\nConcatenation of output from previous (re-)starts failed; please assemble complete ' + 
                    'output from restart folders manually:\n\n')
           for folder in self.restart_folders: lf.write(folder+'\n')
@@ -836,43 +1027,212 @@ class HGS(Grok):
         if lerror: raise # raise previous error
     # compress binary 3D output fields
     if lcompress and lec:
-      with open(logfile, 'a') as lf: # output and error log
+      with open(os.path.join(rundir,logfile), 'a') as lf: # output and error log
         try:  
-          # compress, using tar; appending to HGS log
-          tar_file = 'binary_fields.tgz'; bin_regex = '*.[0-9][0-9][0-9][0-9]'
-          ec = subprocess.call('tar czf {} {}'.format(tar_file,bin_regex), shell=True, stdout=lf, stderr=lf)
-          if ec == 0 and os.path.isfile(tar_file):
-            lf.write('\nBinary 3D output has been compressed: \'{:s}\'\n'.format(tar_file))
-            # if tarring was, remove the binary fields 
-            ec = subprocess.call('rm {}'.format(bin_regex), shell=True, stdout=lf, stderr=lf)
-            if ec == 0: lf.write('All binary 3D output files (\'{:s}\') have been removed.\n'.format(bin_regex))
-            else: lf.write('Cleanup of binary 3D output files (\'{:s}\') failed.\n'.format(bin_regex))
-          else:
-            lf.write('\nBinary output compression failed; tar exit code: {}\n'.format(ec))
-          cec += ec
-        except:
-          lf.write('\nBinary output compression failed for unknown reasons; is \'tar\' availalbe?.\n'.format(ec))
+          # compress each file independently (in parallel) and collect them in an indexed archive
+          bin_files = self.rundirIndex().glob(bin_pattern) # list files once (no shell expansion)
+          if compressor is None: compressor = Compressor(rundir)
+          compressor.finish(bin_files, lremove=True)
+          lf.write('\nBinary 3D output has been compressed: \'{:s}\' (index: \'{:s}\')\n'.format(compressor.archive,compressor.index))
+          lf.write('All binary 3D output files (\'{:s}\') have been removed.\n'.format(bin_pattern))
+        except Exception as e:
+          lf.write('\nBinary output compression failed: {}\n'.format(e)); cec += 1
+          if compressor is not None: compressor.abort()
           if lerror: raise # raise previous error
-    os.chdir(pwd) # return to previous working directory
+    elif compressor is not None: compressor.abort() # remove compressed files
     self.HGSOK = lec # set Grok flag
     # set indicator file to indicate result
     if self.lindicators:
-      if lec: shutil.move('{}/IN_PROGRESS'.format(self.rundir),'{}/COMPLETED'.format(self.rundir))  
-      else: shutil.move('{}/IN_PROGRESS'.format(self.rundir),'{}/FAILED'.format(self.rundir))
+      self.setIndicator('COMPLETED' if lec else fail_indicator, old='IN_PROGRESS', ec=cec, wall_time=wall_time)
     # after indicators are set, we can raise an error  
     if lerror and not lec: 
       raise HGSError("HGS failed; inspect log-file: {}\n  ('{}')".format(logfile,self.rundir))
     # return a regular (POSIX) exit code
     return cec
   
-  def concatOutput(self):
+  def prepareResubmit(self, lerror=True, lcompress=True, skip_grok=False, ldryrun=False):
+    ''' prepare the restart of a terminated simulation from its last restart output (rewriteRestart is
+        called during configuration) and run Grok again, unless skipped; return command and exit code '''
+    if self.lindicators: self.setIndicator('SCHEDULED', old='IN_PROGRESS')
+    self.lrestart = True; self.configOK = False; self.GrokOK = False
+    return self.prepareHGS(lerror=lerror, lcompress=lcompress, skip_grok=skip_grok, ldryrun=ldryrun)
+  
+  def executeHGS(self, command, logfile=None, watchdog=None, ldryrun=False, folder=None):
+    ''' run the HGS executable and log output; if a watchdog is given, the process is polled and terminated,
+        if the simulation stalls; return success flag, wall time and the reason for termination (or None);
+        HGS is executed in 'folder', if given (e.g. a staged copy of the run folder) '''
+    if not logfile: logfile = self.hgs_log
+    folder = self.rundir if folder is None else folder
+    wall_time = None; reason = None
+    with open(os.path.join(folder,logfile), 'w+') as lf: # output and error log
+      if ldryrun:
+        lf.write('\nDry-run --- no execution\n')
+        lec = True # pretend everything works
+      else:
+        # run HGS as subprocess
+        wall_time = time.time()
+        command = launchCommand(command, self.affinity) # pin to cores and set priority
+        if watchdog is None:
+          subprocess.call(command, cwd=folder, stdout=lf, stderr=lf)
+        else:
+          proc = subprocess.Popen(command, cwd=folder, stdout=lf, stderr=lf)
+          reason = watchdog.superviseProcess(proc, os.path.join(folder,self.newton_file))
+        wall_time = time.time() - wall_time
+        # parse log file for errors
+        lec = ( tail(lf, n=2)[0].strip() == hgs_exit )
+        # i.e. -2, second line from the end (and different capitalization from Grok!)
+        if reason is not None:
+          lf.write('\nHGS was terminated by the watchdog: {}\n'.format(reason))
+          lec = False
+    return lec, wall_time, reason
+    
+  def stagingOptions(self, staging):
+    ''' return keyword arguments for a Stager: checkpoints are head files, which are required for restarts,
+        and the Newton info file is a journal (it determines the restart time) '''
+    if isinstance(staging, str): staging = dict(scratch=staging)
+    head_pattern = self.out_files.format(PROBLEM=self.problem, FILETYPE='head_*', IDX='[0-9]'*4)
+    return dict(dict(checkpoints=(head_pattern,), journals=(self.newton_file,)), **staging)
+  
+  def stageHGS(self, command, staging, logfile=None, watchdog=None, lerror=True, ldryrun=False):
+    ''' execute HGS in a copy of the run folder on node-local scratch space; output is copied back to the
+        run folder asynchronously and verified at the end (see hgsrun.staging.Stager) '''
+    if ldryrun: return self.executeHGS(command, logfile=logfile, watchdog=watchdog, ldryrun=ldryrun)
+    stager = Stager(self.rundir, **self.stagingOptions(staging))
+    stager.stageIn()
+    try:
+      lec, wall_time, reason = self.executeHGS([stager.translate(command[0])]+command[1:], logfile=logfile, 
+                                               watchdog=watchdog, folder=stager.stage_dir)
+    finally: 
+      try: stager.stageOut(lerror=True) # also after errors, so that output is not lost
+      except StagingError as e:
+        if lerror: raise HGSError(str(e))
+        print(e); lec = False
+    return lec, wall_time, reason
+    
+  def runHGS(self, executable=None, logfile=None, lerror=True, lcompress=True,
+             skip_config=False, skip_grok=False, skip_pidx=False, ldryrun=False, watchdog=None, staging=None):
+    ''' check if all inputs are in place and run the HGS executable in the run directory; if a watchdog
+        is given, stalled simulations are terminated and optionally restarted; if a staging folder on 
+        node-local scratch space is given (or a dictionary with Stager options), HGS runs in a staged 
+        copy of the run folder and output is copied back while HGS is running; if lcompress is 'async', 
+        binary output files are compressed in the background, as soon as HGS has moved on '''
+    if isinstance(watchdog, dict): watchdog = Watchdog(**watchdog)
+    command, cec = self.prepareHGS(executable=executable, lerror=lerror, lcompress=lcompress, skip_config=skip_config, 
+                                   skip_grok=skip_grok, skip_pidx=skip_pidx, ldryrun=ldryrun)
+    ## run executable while logging output
+    def execute(command):
+      if staging: return self.stageHGS(command, staging, logfile=logfile, watchdog=watchdog, lerror=lerror, ldryrun=ldryrun)
+      else: return self.executeHGS(command, logfile=logfile, watchdog=watchdog, ldryrun=ldryrun)
+    forcing = None if ldryrun else self.acquireForcing() # hold a reference to the forcing cache
+    compressor = None
+    if lcompress == 'async' and not ldryrun:
+      compressor = Compressor(self.rundir); compressor.startWatch(pattern=bin_pattern)
+    try:
+      lec, wall_time, reason = execute(command)
+      nrestart = 0
+      while reason is not None and watchdog.lresubmit(nrestart):
+        # resubmit stalled simulation from last restart output
+        time.sleep(watchdog.backoffTime(nrestart)); nrestart += 1
+        command, ec = self.prepareResubmit(lerror=lerror, lcompress=lcompress, skip_grok=skip_grok, ldryrun=ldryrun)
+        cec += ec
+        lec, wall_time, reason = execute(command)
+    except:
+      if compressor is not None: compressor.abort()
+      raise
+    finally: self.releaseForcing(forcing)
+    fail_indicator = watchdog.indicator if reason is not None else 'FAILED'
+    return self.finishHGS(logfile=logfile, lec=lec, cec=cec, wall_time=wall_time, lerror=lerror, 
+                          lcompress=lcompress, ldryrun=ldryrun, fail_indicator=fail_indicator, 
+                          compressor=compressor)
+  
+  def runPipeline(self, template_folder=None, bin_folder='{HGSDIR:s}', loverwrite=None, lschedule=True,
+                  linput=True, lpidx=True, runtime_override=None, skip_grok=False, executable=None, 
+                  logfile=None, lerror=True, lcompress=True, ldryrun=False, watchdog=None, materialize=None,
+                  staging=None):
+    ''' advance this member through all stages independently: run folder setup, Grok configuration, 
+        Grok and HGS execution, and post-processing (concatenation and compression, in runHGS) '''
+    # set up run folder
+    ec = self.setupRundir(template_folder=template_folder, bin_folder=bin_folder, loverwrite=loverwrite, 
+                          lschedule=lschedule, materialize=materialize)
+    if ec != 0 or not self.rundirOK:
+      if lerror: raise HGSError("Run folder setup failed:\n  ('{}')".format(self.rundir))
+      return ec
+    # write Grok configuration and input lists
+    ec = self.setupConfig(template_folder=template_folder, linput=linput, lpidx=lpidx, 
+                          runtime_override=runtime_override, ldryrun=ldryrun)
+    if ec != 0 or not self.configOK:
+      if lerror: raise GrokError("Grok configuration failed:\n  ('{}')".format(self.rundir))
+      return ec
+    # run Grok and HGS (and post-processing); configuration was written above
+    return self.runHGS(executable=executable, logfile=logfile, lerror=lerror, lcompress=lcompress,
+                       skip_config=True, skip_grok=skip_grok, ldryrun=ldryrun, watchdog=watchdog, staging=staging)
+  
+  def setIndicator(self, indicator, old=None, ec=None, wall_time=None):
+    ''' set the indicator file for the member state (replacing the old indicator, if given) and record
+        the state transition in the state database, if configured '''
+    new_file = os.path.join(self.rundir,indicator)
+    if old is not None: shutil.move(os.path.join(self.rundir,old), new_file)
+    else: open(new_file,'a').close()
+    os.utime(new_file, None) # the time stamp marks the transition (used for monitoring)
+    if self.state_db: openStateDB(self.state_db).setState(self.rundir, indicator, ec=ec, wall_time=wall_time)
+  
+  def meshSize(self):
+    ''' return a proxy for the mesh size (size of the node coordinate file in bytes); the rundir is
+        checked first, then the template folder; returns None if the mesh has not been generated '''
+    coords_file = coords_pm_file.format(PROBLEM=self.problem)
+    for folder in (self.rundir, self.template_folder):
+      if folder and os.path.isfile(os.path.join(folder,coords_file)):
+        return os.path.getsize(os.path.join(folder,coords_file))
+    return None
+  
+  def recordHistory(self, wall_time, lsuccess=True):
+    ''' record wall time, simulated time and Newton iterations of the last run in the history file '''
+    newton_file = os.path.join(self.rundir,self.newton_file)
+    summary = newtonSummary(newton_file) if os.path.isfile(newton_file) else dict()
+    sim_time = summary.get('sim_time') or ( self.runtime - ( self.starttime or 0 ) if self.runtime else None )
+    history = RunHistory(self.history_file, lload=False) # only append
+    return history.record(rundir=os.path.abspath(self.rundir), project=self.project, problem=self.problem, 
+                          NP=self.NP, runtime=self.runtime, wall_time=wall_time, sim_time=sim_time,
+                          nsteps=summary.get('nsteps'), niter=summary.get('niter'), 
+                          mesh_size=self.meshSize(), success=bool(lsuccess))
+  
+  def concatOutput(self, backup_folder='restart_', nidx=4, nthreads=None):
     ''' a function to concatenate HGS timeseries files after a restart; the following file types are 
-        concatenated: hydrograph's, observation_well_flow's, water_balance, and newton_info '''
-    # hydrograph's and observation_wll_flow's require globbing expressions to find all relevant files
-    # hydrograph's, water_balance, and newton_info essentially follow the same pattern,
-    # but observation_well_flow's require somewhat different method
-    # in all cases search from end backwards and drop everything after the last/initial time step
-    # finally, we also need to renumber 
-    raise NotImplementedError("Concatenation and assembly of binary and time-series output from " + 
-                              "restarted simulations is not yet implemented; please perform manually " +
-                              "or rerun the ensemble run command with the appropriate assembly option.")
+        concatenated: hydrograph's, observation_well_flow's, water_balance, and newton_info; the segments 
+        in the restart folders are cut at the restart times (the initial time of the following segment) 
+        and streamed into the run folder; binary output files are renumbered continuously, i.e. files in 
+        the run folder are renamed and files from restart folders are hardlinked into the run folder '''
+    rundir = self.rundir
+    if self.restart_folders: folders = list(self.restart_folders)
+    else: # determine restart folders from run folder (e.g. after a crash)
+      folders = [backup_folder + '{:04d}'.format(idx) for idx in numberedPattern(backup_folder, nidx=nidx, folder=rundir)]
+    if len(folders) == 0: raise HGSError("No restart folders found:\n  ('{}')".format(rundir))
+    segments = [os.path.join(rundir,folder) for folder in folders] + [rundir]
+    # N.B.: the Grok file of each segment is backed up in its restart folder (see rewriteRestart)
+    restart_times = [initialTime(os.path.join(segment,self.grok_file)) for segment in segments[1:]]
+    if None in restart_times:
+      raise HGSError("Unable to determine restart time from Grok file in '{}'.".format(segments[restart_times.index(None)+1]))
+    indices = [RunDirIndex(segment, prefix=self.problem, nidx=nidx) for segment in segments]
+    # time-series files: all files that exist in any segment (the last segment is replaced in place)
+    ts_names = set()
+    for index in indices: ts_names.update(index.timeseriesFiles(ldict=False, llogs=False, lcheck=False))
+    well_names = set(name for index in indices for name in index.timeseriesFiles(ldict=True, llogs=False, lcheck=False)['wells'])
+    ts_jobs = []
+    for name in sorted(ts_names):
+      ts_segments = [os.path.join(segment,name) if name in index.entries else None for segment,index in zip(segments,indices)]
+      if any(ts_segments): ts_jobs.append((ts_segments, restart_times, os.path.join(rundir,name), name in well_names))
+    # binary files: only output before the restart time is used from restart folders (up to the last head file)
+    offset = 0; link_pairs = []
+    for segment,index in zip(segments[:-1],indices[:-1]):
+      nout = min(max(file_indices) if file_indices else 0 for file_indices in self.headIndices(index=index, nidx=nidx))
+      for name in index.binaryFiles(ldict=False):
+        idx = int(name[-nidx:])
+        if idx <= nout: 
+          link_pairs.append((os.path.join(segment,name), os.path.join(rundir,'{:s}{:0{:d}d}'.format(name[:-nidx],idx+offset,nidx))))
+      offset += nout
+    rename_pairs = []
+    if offset > 0: # rename in reverse order, so that no files are overwritten
+      for name in sorted(indices[-1].binaryFiles(ldict=False), key=lambda name: -int(name[-nidx:])):
+        idx = int(name[-nidx:])
+        rename_pairs.append((os.path.join(rundir,name), os.path.join(rundir,'{:s}{:0{:d}d}'.format(name[:-nidx],idx+offset,nidx))))
+    return concatSegments(ts_jobs, rename_pairs=rename_pairs, link_pairs=link_pairs, nthreads=nthreads)
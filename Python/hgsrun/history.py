@@ -0,0 +1,109 @@
+'''
+Created on Oct 19, 2026
+
+A module to record the run times of HGS simulations in a per-project history file and to predict
+the run time of ensemble members, so that the longest members can be started first.
+'''
+
+# external imports
+import os, json, time
+import numpy as np
+
+
+## run time history
+class RunHistory(object):
+  '''
+    A class that manages a history file of simulation run times; each line in the file is a JSON
+    record with wall time, simulated time, mesh size and Newton iterations of a completed run.
+    Records are only ever appended, so that several concurrent simulations can share the file.
+  '''
+  filename = None # path of the history file
+  records = None # list of records (dictionaries) loaded from file
+  _coef = None # regression coefficients (fitted on demand)
+
+  def __init__(self, filename, lload=True):
+    ''' initialize with history file and load existing records '''
+    self.filename = filename
+    self.records = []
+    if lload: self.load()
+
+  def load(self):
+    ''' read all records from the history file (skipping incomplete lines) '''
+    self.records = []; self._coef = None
+    if os.path.exists(self.filename):
+      with open(self.filename, 'r') as hf:
+        for line in hf:
+          try: self.records.append(json.loads(line))
+          except ValueError: pass # e.g. partially written record
+    return len(self.records)
+
+  def record(self, **record):
+    ''' append a record to the history file; the record should contain at least 'rundir', 'wall_time'
+        and 'sim_time' (in seconds) '''
+    record.setdefault('timestamp', time.time())
+    line = json.dumps(record, sort_keys=True) + '\n'
+    # N.B.: short appends are atomic on POSIX file systems, so no locking is required
+    with open(self.filename, 'a') as hf: hf.write(line)
+    self.records.append(record); self._coef = None
+    return record
+
+  def _valid(self):
+    ''' return records that can be used for prediction (successful runs only) '''
+    return [r for r in self.records if r.get('success', True) and r.get('wall_time',0) > 0 
+            and r.get('sim_time',0) > 0]
+
+  def fit(self):
+    ''' fit a simple log-linear regression of wall time on simulated time (and mesh size, if available):
+          log(wall_time) = c0 + c1*log(sim_time) [+ c2*log(mesh_size)] '''
+    records = self._valid()
+    lmesh = all(r.get('mesh_size') for r in records)
+    nfeat = 3 if lmesh else 2
+    if len(records) < nfeat:
+      # not enough records for regression: assume constant throughput (median over all records)
+      if len(records) == 0: self._coef = None
+      else: self._coef = (np.log(np.median([r['wall_time']/r['sim_time'] for r in records])), 1.)
+      return self._coef
+    X = [[1., np.log(r['sim_time'])] + ([np.log(r['mesh_size'])] if lmesh else []) for r in records]
+    y = [np.log(r['wall_time']) for r in records]
+    self._coef = tuple(np.linalg.lstsq(np.asarray(X), np.asarray(y), rcond=None)[0])
+    return self._coef
+
+  def predict(self, rundir=None, sim_time=None, mesh_size=None):
+    ''' predict the wall time of a simulation: if the same run folder was run before, scale the most
+        recent throughput of that run to the requested simulated time; otherwise use the regression
+        over all records; returns None if no prediction is possible '''
+    if not sim_time: return None
+    if rundir: rundir = os.path.abspath(rundir) # run folders are recorded as absolute paths
+    records = [r for r in self._valid() if rundir and r.get('rundir') == rundir]
+    if records:
+      last = max(records, key=lambda r: r.get('timestamp',0))
+      return last['wall_time'] * sim_time / last['sim_time']
+    if self._coef is None: self.fit()
+    if self._coef is None: return None
+    coef = self._coef
+    logt = coef[0] + coef[1]*np.log(sim_time)
+    if len(coef) > 2:
+      if not mesh_size: return None # regression requires mesh size
+      logt += coef[2]*np.log(mesh_size)
+    return float(np.exp(logt))
+
+
+# function to predict the run times of a list of ensemble members
+def predictRuntimes(members):
+  ''' predict the run time of each member, based on the history file of each member (history files are
+      only read once); returns a list of predicted wall times (None, if no prediction is possible) '''
+  histories = dict(); predictions = []
+  for member in members:
+    history_file = getattr(member, 'history_file', None)
+    if not history_file:
+      predictions.append(None); continue
+    if history_file not in histories: histories[history_file] = RunHistory(history_file)
+    sim_time = member.runtime - ( member.starttime or 0 ) if member.runtime else None
+    predictions.append(histories[history_file].predict(rundir=member.rundir, sim_time=sim_time,
+                                                       mesh_size=member.meshSize()))
+  return predictions
+
+# function to determine the order in which members should be started
+def longestFirst(predictions):
+  ''' return member indices ordered by decreasing predicted run time (unknown run times last, stable) '''
+  return sorted(range(len(predictions)), key=lambda i: -predictions[i] if predictions[i] is not None else 0.)
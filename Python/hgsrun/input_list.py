@@ -194,41 +194,40 @@ def generateInputFilelist(filename=None, folder=None, input_folder=None, input_p
   return os.path.isfile(filename)
     
 # function to read an include file and update the file path' relative to the rundir
-def rewriteInputFilelist(inc_file=None, inc_folder=None, rundir=None, lvalidate=True):
+def rewriteInputFilelist(inc_file=None, inc_folder=None, rundir=None, lvalidate=True, path_map=None):
     ''' read an include file from a remote directory, change file path to relative to rundir,
-        validate the file list, and write to a new file '''
-    # change directory to rundir
-    old_dir = os.getcwd()
-    os.chdir(rundir)
-    # open inc file/folder from here
-    with open(os.path.join(inc_folder,inc_file)) as old_inc:
-        with open(inc_file, 'w') as new_inc:            
-            # parse file list, validate and write into new file in rundir
-            for line in old_inc.readlines():
-                line = line.split()
-                time_stamp = float(line[0]); filepath = line[1]
-                # change relative directory
-                if os.path.isabs(filepath): abs_path = filepath
-                else: abs_path = os.path.abspath( os.path.join(inc_folder,filepath) )
-                new_path = os.path.relpath(abs_path, rundir) # turn into directory relative to rundir
-                # validate
-                if lvalidate and not os.path.exists(new_path):
-                    raise IOError("The input file '{:s}' does not exist.\n (run folder: '{:s}')".format(new_path,rundir))
-                # write to new file
-                new_line = list_format.format(T=time_stamp,F=new_path)
-                #print(new_line)
-                new_inc.write(new_line)    
+        validate the file list, and write to a new file; if a path_map (a function) is given, it 
+        is applied to the absolute path of each input file and the result is written as an absolute 
+        path (e.g. to redirect input to a forcing cache) '''
+    # inc_folder is relative to rundir (paths are resolved explicitly, without changing directories)
+    src_folder = os.path.join(rundir,inc_folder)
+    with open(os.path.join(src_folder,inc_file)) as old_inc:
+        lines = old_inc.readlines() # read first, since the include file may be rewritten in place
+    with open(os.path.join(rundir,inc_file), 'w') as new_inc:            
+        # parse file list, validate and write into new file in rundir
+        for line in lines:
+            line = line.split()
+            time_stamp = float(line[0]); filepath = line[1]
+            # change relative directory
+            if os.path.isabs(filepath): abs_path = filepath
+            else: abs_path = os.path.abspath( os.path.join(src_folder,filepath) )
+            if path_map is None: new_path = os.path.relpath(abs_path, rundir) # turn into directory relative to rundir
+            else: new_path = path_map(abs_path)
+            # validate
+            if lvalidate and not os.path.exists(os.path.join(rundir,new_path)):
+                raise IOError("The input file '{:s}' does not exist.\n (run folder: '{:s}')".format(new_path,rundir))
+            # write to new file
+            new_line = list_format.format(T=time_stamp,F=new_path)
+            #print(new_line)
+            new_inc.write(new_line)    
     # return file status
-    lec = os.path.isfile(inc_file) 
-    os.chdir(old_dir)
+    lec = os.path.isfile(os.path.join(rundir,inc_file)) 
     return lec 
     
 # helper function to figure out path of inc-file
 def getIncFolderFile(inc_path=None, rundir=None, default_name=None, lvalidate=True):
-    ''' a function to complete and validate an include file path '''
-    old_dir = os.getcwd()
-    os.chdir(rundir)
-    if os.path.isdir(inc_path):
+    ''' a function to complete and validate an include file path (relative to rundir) '''
+    if os.path.isdir(os.path.join(rundir,inc_path)):
         inc_folder = inc_path
         inc_file = default_name
     else:
@@ -238,10 +237,9 @@ def getIncFolderFile(inc_path=None, rundir=None, default_name=None, lvalidate=Tr
             raise IOError("The include folder '{}' was not found.\n (rundir: '{}')".format(inc_folder,rundir))
     # check
     inc_path = os.path.join(inc_folder,inc_file)
-    if lvalidate and not os.path.exists(inc_path):
+    if lvalidate and not os.path.exists(os.path.join(rundir,inc_path)):
         raise IOError("The include file '{}' was not found.\n (rundir: '{}')".format(inc_path,rundir))
     # return
-    os.chdir(old_dir)
     return inc_folder, inc_file 
     
     
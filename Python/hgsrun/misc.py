@@ -7,7 +7,9 @@ mainly functions that parse configuration and output files.
 @author: Andre R. Erler, GPL v3
 '''
 
-import os, subprocess, glob
+import os, re, subprocess, glob, shutil, fnmatch, json, threading
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
 
 # filename patterns
 grok_file = '{PROBLEM:s}.grok' # the Grok configuration file; default includes problem name
@@ -21,6 +23,11 @@ newton_file = '{PROBLEM:s}o.newton_info.dat' # newton info time series file
 water_file = '{PROBLEM:s}o.water_balance.dat' # water balance time series file
 hydro_files = '{PROBLEM:s}o.hydrograph.{TAG}.dat' # hydrograph time series file
 well_files = '{PROBLEM:s}o.observation_well_flow.{TAG}.dat' # observation well time series file 
+# exit banners in log files (N.B.: different capitalization!)
+grok_exit = '---- Normal exit ----' # Grok completed successfully
+hgs_exit = '---- NORMAL EXIT ----' # HGS completed successfully
+# Grok output (mesh)
+coords_pm_file = '{PROBLEM:s}o.coordinates_pm' # porous media node coordinates (proxy for mesh size)
 
 
 ## general utility 
@@ -79,110 +86,382 @@ def clearFolder(folder, lWin=lWin, lmkdir=True):
     if lmkdir: os.mkdir(folder)
 
 
+## run folder materialization
+
+# files that are rewritten by HGSrun, Grok or HGS and always have to be copied (not linked)
+rewritten_files = ('*.grok*','*.pfx','parallelindx.dat','*.inc','*o.*','*.dbg','*.lst','array_sizes.*','log.*')
+manifest_file = 'rundir_manifest.json' # records how each file in a run folder was materialized
+FICLONE = 0x40049409 # ioctl request to clone a file (reflink) on Linux (Btrfs, XFS)
+
+def reflinkFile(src, dst):
+    ''' create a copy-on-write clone of a file (reflink); raises OSError, if not supported '''
+    import fcntl # not available on Windows
+    with open(src, 'rb') as sf, open(dst, 'wb') as df:
+        fcntl.ioctl(df.fileno(), FICLONE, sf.fileno())
+    shutil.copystat(src, dst)
+
+def materializeFile(src, dst, mode='link'):
+    ''' materialize a single file as hardlink, reflink or copy (fall back to copy, if the preferred method 
+        is not supported); returns the method that was used '''
+    if mode == 'link':
+        try: 
+            os.link(src, dst); return 'link'
+        except OSError: pass # e.g. different file systems
+    elif mode == 'reflink':
+        try: 
+            reflinkFile(src, dst); return 'reflink'
+        except (OSError, ImportError): 
+            if os.path.exists(dst): os.remove(dst)
+    elif mode != 'copy': raise ValueError(mode)
+    shutil.copy2(src, dst)
+    return 'copy'
+
+def materializeFolder(src, dst, mode='link', ignore=None, copy_patterns=rewritten_files, nthreads=8):
+    ''' replicate a folder tree like shutil.copytree(src, dst, symlinks=True, ignore=ignore), but with files
+        hardlinked or reflinked (mode='link' or 'reflink'); files that match copy_patterns are always 
+        copied, because they will be rewritten; returns a manifest (dictionary: relative path -> method) '''
+    manifest = dict(); jobs = []
+    with ThreadPoolExecutor(max_workers=nthreads) as executor:
+        for root, dirs, files in os.walk(src):
+            rel = os.path.relpath(root, src)
+            names = dirs + files
+            ignored = ignore(root, names) if ignore else set()
+            dirs[:] = [d for d in dirs if d not in ignored and not os.path.islink(os.path.join(root,d))]
+            os.makedirs(os.path.join(dst,rel), exist_ok=True)
+            for name in names:
+                if name in ignored: continue
+                srcpath = os.path.join(root,name); dstpath = os.path.join(dst,rel,name)
+                relpath = os.path.normpath(os.path.join(rel,name))
+                if os.path.islink(srcpath):
+                    os.symlink(os.readlink(srcpath), dstpath); manifest[relpath] = 'symlink'
+                elif os.path.isfile(srcpath):
+                    lcopy = any(fnmatch.fnmatch(name, pattern) for pattern in copy_patterns)
+                    jobs.append((relpath, executor.submit(materializeFile, srcpath, dstpath, 
+                                                          mode='copy' if lcopy else mode)))
+        for relpath,job in jobs: manifest[relpath] = job.result() # also raises errors
+    return manifest
+
+def writeManifest(folder, manifest, **atts):
+    ''' write a manifest of materialized files (and additional attributes) to a folder '''
+    with open(os.path.join(folder,manifest_file), 'w') as mf:
+        json.dump(dict(files=manifest, **atts), mf, indent=1, sort_keys=True)
+
+def breakLink(filepath):
+    ''' replace a hardlinked file with a private copy, so that it can be modified without changing the template 
+        (this is not necessary for reflinks, which are copied on write by the file system) '''
+    if os.path.isfile(filepath) and not os.path.islink(filepath) and os.stat(filepath).st_nlink > 1:
+        tmpfile = filepath + '.tmp'
+        shutil.copy2(filepath, tmpfile)
+        os.replace(tmpfile, filepath)
+        return True
+    return False
+
+
 ## file collectors
 
+# index of the files in a run folder
+class RunDirIndex(object):
+    '''
+      An index of the entries in a run folder, based on a single os.scandir pass; entries are classified
+      with the file patterns defined above (head files, other binary output, hydrographs, observation
+      wells, special time-series files and logs) and the index can be refreshed incrementally: the folder
+      is only scanned again, if its modification time changed, and only new entries are classified.
+      Collectors that share an index avoid repeated globbing (metadata operations) of the run folder.
+      N.B.: changes are detected with the st_mtime_ns of the folder; on filesystems with coarse directory
+            time stamps (e.g. one or two seconds) a change shortly after a scan can be missed, so entries
+            that the caller creates or removes should be recorded with add/discard (or use lforce).
+    '''
+    folder  = None # the run folder
+    prefix  = None # problem name (required for classification)
+    nidx    = 4 # number of digits in numbered output files
+    entries = None # dictionary of entry names and a flag indicating directories
+    mtime   = None # modification time of the folder at the last scan
+    _categories = None # memoized classification of entries
+
+    def __init__(self, folder=None, prefix=None, nidx=4, lscan=True):
+        ''' initialize index for a folder (default: working directory) and scan it '''
+        self.folder = folder or '.'
+        self.prefix = prefix
+        self.nidx = nidx
+        self.entries = dict(); self._categories = dict()
+        if prefix is not None:
+            # compile patterns for classification
+            idx = '[0-9]'*nidx
+            self._binary = re.compile(fnmatch.translate(out_files.format(PROBLEM=prefix, FILETYPE='*', IDX=idx)))
+            self._heads = [('head_{}'.format(tag), out_files.format(PROBLEM=prefix, FILETYPE=pattern, IDX=''))
+                           for tag,pattern in head_files.items()]
+            self._hydro = re.compile(fnmatch.translate(hydro_files.format(PROBLEM=prefix, TAG='*')))
+            self._wells = re.compile(fnmatch.translate(well_files.format(PROBLEM=prefix, TAG='*')))
+            self._special = [name.format(PROBLEM=prefix) for name in (newton_file, water_file)]
+        if lscan: self.refresh()
+
+    def refresh(self, lforce=False):
+        ''' scan the folder again, if it was modified since the last scan; returns True, if it was scanned '''
+        mtime = os.stat(self.folder).st_mtime_ns
+        if not lforce and mtime == self.mtime: return False
+        entries = dict()
+        with os.scandir(self.folder) as it:
+            for entry in it: 
+                if not entry.name.startswith('.'): entries[entry.name] = entry.is_dir() # like glob
+        for name in set(self._categories) - set(entries): del self._categories[name] # removed entries
+        self.entries = entries; self.mtime = mtime
+        return True
+
+    def copy(self):
+        ''' return an independent copy of the index (e.g. to add entries that are not in the folder) '''
+        index = RunDirIndex(self.folder, prefix=self.prefix, nidx=self.nidx, lscan=False)
+        index.entries = dict(self.entries); index._categories = dict(self._categories); index.mtime = self.mtime
+        return index
+
+    def add(self, name, isdir=False):
+        ''' record a new entry (created by the caller), without scanning the folder '''
+        self.entries[name] = isdir
+
+    def discard(self, name):
+        ''' remove an entry (removed or moved by the caller), without scanning the folder '''
+        self.entries.pop(name, None); self._categories.pop(name, None)
+
+    def glob(self, pattern):
+        ''' return a sorted list of entry names that match a shell pattern (names are relative to folder) '''
+        if '/' in pattern or os.sep in pattern: return sorted(glob.glob(pattern, root_dir=self.folder)) # sub-folders
+        regex = re.compile(fnmatch.translate(pattern))
+        return sorted(name for name in self.entries if regex.match(name))
+
+    def numbers(self, name_pattern, nidx=None):
+        ''' find numeric values of occurences of a numbered file pattern (indices at the end) '''
+        nidx = nidx or self.nidx
+        return [int(name[-nidx:]) for name in self.glob(name_pattern + '[0-9]'*nidx)]
+
+    def category(self, name):
+        ''' classify an entry (memoized); returns None for unknown entries and folders '''
+        if name in self._categories: return self._categories[name]
+        if self.prefix is None: raise ValueError("The problem name (prefix) is required for classification.")
+        category = None
+        if self.entries.get(name): pass # folder
+        elif self._binary.match(name):
+            category = 'others'
+            for head_tag,head_file in self._heads:
+                if name.startswith(head_file): category = head_tag; break
+        elif name in self._special: category = 'special'
+        elif self._hydro.match(name): category = 'hydrographs'
+        elif self._wells.match(name): category = 'wells'
+        elif name in log_files: category = 'logs'
+        self._categories[name] = category
+        return category
+
+    def classified(self, category):
+        ''' return a sorted list of all entries in a category '''
+        return sorted(name for name in self.entries if self.category(name) == category)
+
+    def binaryFiles(self, ldict=True, ignore_list=None):
+        ''' collect all time-dependent binary output files (see binaryFiles) '''
+        if ignore_list is None: ignore_list = ignore_files
+        ignore_list = [ignore.format(PROBLEM=self.prefix) for ignore in ignore_list]
+        binary_files = {head_tag:[] for head_tag,_ in self._heads}
+        binary_files['others'] = [] # collect the rest here 
+        for name in sorted(self.entries):
+            category = self.category(name)
+            if category == 'others':
+                if name not in ignore_list: binary_files['others'].append(name)
+            elif category in binary_files: binary_files[category].append(name)
+        # N.B.: typically binary_files will contain the following lists: head_pm, head_olf, head_chan, others 
+        if ldict: return binary_files
+        else: return [name for files in binary_files.values() for name in files]
+
+    def timeseriesFiles(self, ldict=True, llogs=True, lcheck=True):
+        ''' collect all time-series output files (see timeseriesFiles) '''
+        ts_dict = dict()
+        # log files
+        if llogs:
+            if lcheck: 
+                for log_file in log_files:
+                    if log_file not in self.entries: raise IOError(log_file)
+            ts_dict['logs'] = list(log_files)
+        # special files
+        if lcheck: 
+            for special_file in self._special:
+                if special_file not in self.entries: raise IOError(special_file)
+        ts_dict['special'] = list(self._special)
+        # hydrographs and observation wells
+        ts_dict['hydrographs'] = self.classified('hydrographs')
+        ts_dict['wells'] = self.classified('wells')
+        # reorganize
+        if not ldict:
+            flat_list = []
+            for files in list(ts_dict.values()): flat_list.extend(files)
+            return flat_list
+        else:
+            return ts_dict
+
+
 # function to find numeric values of occurences of a numbered file pattern
-def numberedPattern(name_pattern, nidx, folder=None):
+def numberedPattern(name_pattern, nidx, folder=None, index=None):
     ''' function to find numeric values of occurences of a numbered file pattern;
-        works only with indices at the end '''
-    if folder: 
-        pwd = os.getcwd()
-        os.chdir(folder)
-    pattern = name_pattern + '[0-9]'*nidx 
-    filenames = glob.glob(pattern)
-    numbers = [ int(filename[-nidx:]) for filename in filenames ]
-    if folder: 
-        os.chdir(pwd)
-    return numbers
+        works only with indices at the end; an existing RunDirIndex can be passed instead of a folder '''
+    if index is None: index = RunDirIndex(folder)
+    return index.numbers(name_pattern, nidx=nidx)
 
 
 # function to collect all time-dependent binary output files
 ignore_files = ['{PROBLEM:s}o.ElemK_pm.0001'] # files to ignore when backing up
-def binaryFiles(prefix, folder=None, nidx=4, ldict=True, ignore_list=None):
-    ''' function to collect all time-dependent binary output files '''
-    if ignore_list is None: ignore_list = ignore_files
-    if folder: 
-        pwd = os.getcwd()
-        os.chdir(folder)
-    # find binary file pattern
-    pattern = out_files.format(PROBLEM=prefix, FILETYPE='*', IDX='[0-9]'*nidx )
-    filenames = glob.glob(pattern)
-    if folder: 
-        os.chdir(pwd)
-    # reorganize files
-    ignore_list = [ignore.format(PROBLEM=prefix) for ignore in ignore_list]
-    if ldict:
-        # split head files and store in dictionary
-        binary_files = dict(); head_dict= dict()
-        for tag,pattern in list(head_files.items()):
-            head_tag = 'head_{}'.format(tag)
-            binary_files[head_tag] = []
-            head_dict[head_tag] = out_files.format(PROBLEM=prefix,FILETYPE=pattern,IDX='')
-        binary_files['others'] = [] # collect the rest here 
-        # typically binary_files will contain the following lists: head_pm, head_olf, head_chan, others 
-        for filename in filenames:
-            lmatch = False
-            for head_tag,head_file in list(head_dict.items()):
-                if filename.startswith(head_file): 
-                  binary_files[head_tag].append(filename); lmatch = True; break
-            if not lmatch and not filename in ignore_list: 
-                binary_files['others'].append(filename)
-    else:
-        # only remove unwanted files
-        binary_files = [filename for filename in filenames if not filename in ignore_list]
-    return binary_files
+def binaryFiles(prefix, folder=None, nidx=4, ldict=True, ignore_list=None, index=None):
+    ''' function to collect all time-dependent binary output files (file names are relative to folder); 
+        an existing RunDirIndex can be passed instead of a folder '''
+    if index is None: index = RunDirIndex(folder, prefix=prefix, nidx=nidx)
+    return index.binaryFiles(ldict=ldict, ignore_list=ignore_list)
 #TOTO: remove hard-coding of file patterns and add wrapper as class method to Grok
 
 # function to collect all time-series output files
-def timeseriesFiles(prefix, folder=None, ldict=True, llogs=True, lcheck=True):
-    ''' function to collect all time-series output files '''
-    if folder: 
-        pwd = os.getcwd()
-        os.chdir(folder)
-    ts_dict = dict()
-    # log files
-    if llogs:
-        log_files = ['log.grok','log.hgs_run']
-        if lcheck: 
-            for log_file in log_files:
-                if not os.path.exists(log_file): 
-                    raise IOError(log_file)
-        ts_dict['logs'] = log_files        
-    # special files
-    special_files = [ name.format(PROBLEM=prefix) for name in [newton_file, water_file,] ]
-    if lcheck: 
-        for special_file in special_files:
-            if not os.path.exists(special_file): 
-                raise IOError(special_file)
-    ts_dict['special'] = special_files
-    # hydrographs
-    pattern = hydro_files.format(PROBLEM=prefix, TAG='*')
-    ts_dict['hydrographs']= glob.glob(pattern)
-    # observation wells
-    pattern = well_files.format(PROBLEM=prefix, TAG='*') 
-    ts_dict['wells']= glob.glob(pattern)
-    if folder: 
-        os.chdir(pwd)
-    # reorganize
-    if not ldict:
-        flat_list = []
-        for files in list(ts_dict.values()): flat_list.extend(files)
-        return flat_list
-    else:
-        return ts_dict
-#TOTO: remove hard-coding of file patterns and add wrapper as class method to Grok
-
+log_files = ('log.grok','log.hgs_run') # log files that are backed up with time-series files
+def timeseriesFiles(prefix, folder=None, ldict=True, llogs=True, lcheck=True, index=None):
+    ''' function to collect all time-series output files (file names are relative to folder);
+        an existing RunDirIndex can be passed instead of a folder '''
+    if index is None: index = RunDirIndex(folder, prefix=prefix)
+    return index.timeseriesFiles(ldict=ldict, llogs=llogs, lcheck=lcheck)
 
+    
 ## file parsere
 
 # helper function to recursively parse a Grok file with includes
-def parseGrokFile(filepath, line_list):
+## in-memory representation of Grok configurations
+
+class GrokLines(list):
+    '''
+      A list of (stripped) lines of a Grok configuration with an index that maps each line (keyword or
+      value) to the sorted list of its positions; lookups with index/find are binary searches instead of
+      linear scans. Replacing single lines or slices of the same length and appending lines updates the
+      index incrementally; any other modification (e.g. splicing a list of values of different length)
+      invalidates the index, which is rebuilt in one pass on the next lookup. Copies share the index until one of them is modified.
+    '''
+    _index = None # dictionary: line -> sorted list of positions (None: has to be rebuilt)
+    _shared = False # index is shared with a copy (copy-on-write)
+
+    def __reduce__(self):
+        ''' pickle only the lines (the index is rebuilt on demand) '''
+        return (self.__class__, (list(self),))
+
+    def _getIndex(self):
+        ''' return the index and rebuild it, if necessary '''
+        if self._index is None:
+            index = dict()
+            for i,line in enumerate(self): index.setdefault(line, []).append(i)
+            self._index = index
+        return self._index
+
+    def find(self, line, start=0, stop=None):
+        ''' return the position of the first occurence of a line at or after start (or None) '''
+        positions = self._getIndex().get(line)
+        if positions:
+            if start < 0: start = max(0, len(self)+start)
+            j = bisect_left(positions, start)
+            if j < len(positions):
+                i = positions[j]
+                if stop is None or i < ( stop if stop >= 0 else len(self)+stop ): return i
+        return None
+
+    def findAll(self, line, start=0):
+        ''' return a list of all positions of a line at or after start '''
+        positions = self._getIndex().get(line, [])
+        return positions[bisect_left(positions, start):]
+
+    def index(self, line, start=0, stop=None):
+        ''' same as list.index, but uses the index '''
+        i = self.find(line, start=start, stop=stop)
+        if i is None: raise ValueError("'{}' is not in list".format(line))
+        return i
+
+    def blockEnd(self, start):
+        ''' return the position of the 'end' statement that terminates the block starting at start '''
+        return self.index('end', start)
+
+    def __contains__(self, line):
+        try: return line in self._getIndex()
+        except TypeError: return False # unhashable - can't be a line
+
+    def count(self, line):
+        try: return len(self._getIndex().get(line, []))
+        except TypeError: return 0
+
+    def _ownIndex(self):
+        ''' make a private copy of a shared index before it is modified '''
+        if self._shared:
+            if self._index is not None: 
+                self._index = {line:list(positions) for line,positions in self._index.items()}
+            self._shared = False
+
+    def __setitem__(self, i, line):
+        ''' replace lines; single lines and slices of the same length (e.g. a list of output times that is
+            rewritten in place) are updated in the index, other slices invalidate it '''
+        if self._index is None:
+            super(GrokLines,self).__setitem__(i, line)
+        elif isinstance(i, slice):
+            positions = range(*i.indices(len(self))); lines = list(line)
+            if len(lines) == len(positions):
+                self._ownIndex()
+                for j,line in zip(positions,lines): self._replace(j, line)
+            else:
+                super(GrokLines,self).__setitem__(i, lines)
+                self._index = None; self._shared = False
+        else:
+            self._ownIndex()
+            self._replace(i + len(self) if i < 0 else i, line)
+
+    def _replace(self, i, line):
+        ''' replace a single line and update the index (the index must not be shared) '''
+        old = self[i]
+        super(GrokLines,self).__setitem__(i, line)
+        positions = self._index[old]; del positions[bisect_left(positions, i)]
+        if not positions: del self._index[old]
+        positions = self._index.setdefault(line, [])
+        positions.insert(bisect_left(positions, i), i)
+
+    def append(self, line):
+        super(GrokLines,self).append(line)
+        if self._index is not None: 
+            self._ownIndex()
+            self._index.setdefault(line, []).append(len(self)-1)
+
+    def extend(self, lines):
+        for line in lines: self.append(line)
+
+    def __iadd__(self, lines):
+        self.extend(lines)
+        return self
+
+    def copy(self):
+        ''' return a copy that shares the index (until either of them is modified) '''
+        lines = self.__class__(self)
+        if self._index is not None:
+            lines._index = self._index; lines._shared = self._shared = True
+        return lines
+
+    # all other modifications invalidate the index
+    def _invalidate(method):
+        def wrapper(self, *args, **kwargs):
+            self._index = None; self._shared = False
+            return method(self, *args, **kwargs)
+        wrapper.__name__ = method.__name__; wrapper.__doc__ = method.__doc__
+        return wrapper
+    __delitem__ = _invalidate(list.__delitem__)
+    __imul__ = _invalidate(list.__imul__)
+    insert = _invalidate(list.insert)
+    pop = _invalidate(list.pop)
+    remove = _invalidate(list.remove)
+    clear = _invalidate(list.clear)
+    sort = _invalidate(list.sort)
+    reverse = _invalidate(list.reverse)
+    del _invalidate
+
+
+def parseGrokFile(filepath, line_list, includes=None):
     ''' recursively parse files which include other files, starting with 'filepath', 
-        and append their lines to 'line_list' '''
-    # change working directory locally to resolve relative path'
-    pwd = os.getcwd() # need to go back later!
-    os.chdir(os.path.dirname(filepath))
-    with open(os.path.basename(filepath), 'r') as f:
+        and append their lines to 'line_list'; the paths of all parsed files are 
+        appended to 'includes', if a list is passed '''
+    # N.B.: include paths are relative to the folder of the including file; they are resolved explicitly,
+    #       without changing the working directory, so that configurations can be parsed in threads
+    folder = os.path.dirname(filepath)
+    if includes is not None: includes.append(os.path.abspath(filepath))
+    with open(filepath, 'r') as f:
         lines = f.readlines() # load lines all at once (for performance)
     # loop over lines, clean them and find includes
     for line in lines:
@@ -194,18 +473,179 @@ def parseGrokFile(filepath, line_list):
             if line.startswith('include') and not ( line.endswith('precip.inc') or line.endswith('pet.inc') ):
                 # N.B.: apparently HGS/Grok is case-sensitive... 
                 # figure out new file path
-                incpath = line[7:].strip()
+                incpath = os.path.join(folder, line[7:].strip())
                 if not os.path.lexists(incpath):
-                    raise IOError("Unable to open include file '{}'.".format(incpath))
+                    raise IOError("Unable to open include file '{}'.".format(line[7:].strip()))
                 # initiate recursion
-                parseGrokFile(incpath, line_list)
+                parseGrokFile(incpath, line_list, includes=includes)
             else:
                 # append line to line_list
                 line_list.append(line)
                 # N.B.: only convert non-path statements to lower
     # now we are done - we don't return anything, since line_list was modified in place
-    os.chdir(pwd) # this is important: return to previous working directory!!!
 
+# cache of parsed Grok templates: path -> (modification times of all parsed files, lines)
+_template_cache = dict()
+_template_lock = threading.Lock()
+
+def _fileMtimes(filepaths):
+    ''' return a tuple of modification times (None for missing files) '''
+    mtimes = []
+    for filepath in filepaths:
+        try: mtimes.append(os.stat(filepath).st_mtime_ns)
+        except OSError: mtimes.append(None)
+    return tuple(mtimes)
+
+def loadGrokFile(filepath, lcache=True):
+    ''' parse a Grok file (and its includes) into a GrokLines list; the parsed lines are cached per path 
+        and reused as long as none of the parsed files has been modified, so that a template is only 
+        parsed once for an entire ensemble; each call returns a copy that can be edited independently '''
+    filepath = os.path.abspath(filepath)
+    if lcache:
+        with _template_lock: entry = _template_cache.get(filepath)
+        if entry is not None:
+            includes, mtimes, lines = entry
+            if _fileMtimes(includes) == mtimes: return lines.copy()
+    includes = []; lines = GrokLines()
+    parseGrokFile(filepath, lines, includes=includes)
+    if lcache:
+        lines._getIndex() # build index once, so that copies can share it
+        with _template_lock: _template_cache[filepath] = (includes, _fileMtimes(includes), lines)
+        lines = lines.copy()
+    return lines
+
+
+## time-series file parsers
+
+# helper function to extract variable names from the header of a time-series file
+def parseVariables(line):
+    ''' parse the 'VARIABLES = ...' line of a time-series file header and return a list of cleaned-up, 
+        lower-case variable names (spaces and dashes are replaced by underscores, parentheses are removed) '''
+    if not 'variables' in line.lower(): raise IOError("Not a valid variable declaration: '{}'".format(line))
+    variables = [v for v in line[line.find('=')+1:].strip().split(',') if len(v) > 0]
+    variables = [v.strip().strip('"').strip().lower() for v in variables]
+    for c,r in {' ':'_','-':'_','(':'',')':''}.items():
+        variables = [v.replace(c,r) for v in variables]
+    return variables
+
+# function to summarize the Newton iteration log of a simulation
+def newtonSummary(filepath):
+    ''' read a newton_info file and return a dictionary with simulated time, number of time steps and
+        total number of Newton and solver iterations '''
+    with open(filepath, 'r') as f:
+        lines = f.readlines()
+    variables = parseVariables(lines[1])
+    icol = {var:i for i,var in enumerate(variables)}
+    records = [line.split() for line in lines[3:] if line.strip()]
+    # N.B.: the first three lines are the header (title, variables, and zone)
+    summary = dict(nsteps=len(records), sim_time=0., niter=0, nsolver=0)
+    if len(records) > 0:
+        t0 = float(records[0][0]); t1 = float(records[-1][0])
+        if 'time_step' in icol: t0 -= float(records[0][icol['time_step']]) # beginning of first step
+        summary['sim_time'] = t1 - t0
+        summary['end_time'] = t1
+        if 'number_of_iterations' in icol:
+            summary['niter'] = sum(int(float(r[icol['number_of_iterations']])) for r in records)
+        if 'number_of_solver_iterations' in icol:
+            summary['nsolver'] = sum(int(float(r[icol['number_of_solver_iterations']])) for r in records)
+    return summary
+
+
+## reverse-seek helpers for time-series files
+# N.B.: these helpers only read the header and/or the last few blocks of a file, so that the first and 
+#       last records of large time-series files can be queried without reading the entire file
+
+# helper function to identify the first line of a record
+def recordTime(line, lwell=False):
+    ''' return the time of the record that begins with 'line' (bytes) or None, if the line does not begin a
+        record; records of observation well files are zones ('ZONE T="...", SOLUTIONTIME=...'), which are
+        followed by one line per node, and records of all other files are single lines '''
+    if lwell:
+        lower = line.lower()
+        if not lower.lstrip().startswith(b'zone') or b'solutiontime' not in lower: return None
+        value = lower[lower.index(b'solutiontime'):].split(b'=',1)[-1].split(b',')[0]
+    else:
+        values = line.split(None,1)
+        if len(values) == 0: return None
+        value = values[0]
+    try: return float(value)
+    except ValueError: return None # header line
+
+# helper function to parse a record line
+def parseRecord(line, lwell=False):
+    ''' return the values of a record line as a list of floats (for observation wells only the time) or 
+        None, if the line is not a (complete) record '''
+    if lwell:
+        time = recordTime(line, lwell=True)
+        return None if time is None else [time]
+    try: values = [float(value) for value in line.split()]
+    except ValueError: return None # header or garbled line
+    return values or None
+
+# iterate over the lines of a file backwards
+def reverseLines(f, end=None, block_size=1<<16):
+    ''' iterate backwards over the complete lines (terminated by a newline) of a binary file, beginning at
+        offset 'end' (default: end of file); yields the offset and the contents (bytes) of each line '''
+    if end is None: end = f.seek(0, os.SEEK_END)
+    pos = end; tail = b''; lcomplete = False # a newline was found, i.e. the following lines are complete
+    while pos > 0:
+        size = min(block_size, pos); pos -= size
+        f.seek(pos); chunk = f.read(size) + tail
+        lines = chunk.split(b'\n')
+        tail = lines[0] # the first line may continue in the previous block
+        offset = pos + len(chunk)
+        for line in reversed(lines[1:]):
+            offset -= len(line)
+            if lcomplete: yield offset, line
+            lcomplete = True; offset -= 1 # newline
+    if lcomplete: yield 0, tail # first line of the file
+
+# function to read the first record of a time-series file
+def firstRecord(filepath, lwell=False, loffset=False):
+    ''' return the first record of a time-series file (a list of floats; see parseRecord) or None, if the 
+        file has no complete records; only the header and the first record are read; if 'loffset' is True, 
+        the file offset of the record is also returned '''
+    offset = 0
+    with open(filepath, 'rb') as f:
+        for line in f:
+            if not line.endswith(b'\n'): break # incomplete line
+            record = parseRecord(line, lwell=lwell)
+            if record is not None: return (record, offset) if loffset else record
+            offset += len(line)
+    return (None, offset) if loffset else None
+
+# function to read the last record of a time-series file
+def lastRecord(filepath, lwell=False, nrec=1, loffset=False):
+    ''' return the last complete record of a time-series file (a list of floats; see parseRecord) or None, 
+        if the file has no complete records; the file is read backwards from the end, so that only the last
+        block(s) of the file are read; if 'nrec' > 1, the last 'nrec' records are returned as a list (in 
+        order); if 'loffset' is True, the file offset of the (first returned) record is also returned;
+        N.B.: a zone of an observation well file is only complete, if it is followed by another zone, or if
+              it has as many node lines as the preceding zone (i.e. files with a single zone have no 
+              complete records), since the node lines of the last zone may still be being written '''
+    records = []; record_offset = None
+    nlines = 0 # number of node lines that follow the current line (up to the next zone)
+    last_zone = None # last zone of a well file and its number of node lines (False, once it was checked)
+    with open(filepath, 'rb') as f:
+        for offset,line in reverseLines(f):
+            record = parseRecord(line, lwell=lwell)
+            if record is None: 
+                if line.strip(): nlines += 1
+                continue
+            if lwell and last_zone is None:
+                last_zone = (record, offset, nlines); nlines = 0
+                continue # the last zone is checked against the preceding zone
+            elif lwell and last_zone:
+                if 0 < last_zone[2] == nlines: # same number of nodes as the preceding zone
+                    records.append(last_zone[0]); record_offset = last_zone[1]
+                    if len(records) == nrec: break
+                last_zone = False
+            nlines = 0
+            records.append(record); record_offset = offset
+            if len(records) == nrec: break
+    if nrec == 1: records = records[0] if records else None
+    else: records.reverse()
+    return (records, record_offset) if loffset else records
 
 if __name__ == '__main__':
 
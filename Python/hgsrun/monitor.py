@@ -0,0 +1,252 @@
+'''
+Created on Oct 19, 2026
+
+A module to monitor the progress of running HGS simulations: the Newton iteration log and the water
+balance of each member are read incrementally (only new records are parsed), and throughput, average
+time step, Newton iterations per step and the estimated time to completion are computed.
+'''
+
+# external imports
+import os, json, time
+from collections import deque
+# internal imports
+from hgsrun.misc import grok_file, newton_file, water_file, parseVariables, firstRecord, lastRecord
+from hgsrun.state_db import openStateDB
+
+# indicator files in order of precedence
+indicators = ('FAILED','STALLED','COMPLETED','CONCATENATED','IN_PROGRESS','RESTARTED','SCHEDULED')
+
+
+## incremental reader for HGS time-series files
+class TimeseriesTail(object):
+  '''
+    A class that reads new records from a growing HGS time-series file (Tecplot format); the file
+    offset is retained between updates, so that only new, complete lines are parsed. Only summary
+    statistics and a window of recent records are retained in memory. In tail mode, the first update
+    skips to the last records (see seekTail), so that large files are not read in their entirety.
+  '''
+  filename  = None # path of the time-series file
+  offset    = 0 # file position after the last complete line
+  variables = None # list of variable names (from the header)
+  nrec      = 0 # number of records read so far
+  first     = None # first record
+  last      = None # most recent record
+  window    = None # recent records (deque)
+  ltail     = False # skip to the last records on the first update
+
+  def __init__(self, filename, nwindow=100, ltail=False):
+    ''' initialize with file name and number of recent records to retain '''
+    self.filename = filename
+    self.window = deque(maxlen=nwindow)
+    self.ltail = ltail
+
+  def seekTail(self):
+    ''' skip to the beginning of the last records that fit into the window; only the header, the first 
+        record and the end of the file are read; the number of skipped records is estimated from the file 
+        size, since HGS writes records with a fixed width; returns the number of skipped records '''
+    first, first_offset = firstRecord(self.filename, loffset=True)
+    if first is None: return 0
+    last, offset = lastRecord(self.filename, nrec=self.window.maxlen, loffset=True)
+    if offset <= first_offset: return 0 # nothing to skip
+    with open(self.filename, 'rb') as f:
+      for line in f.read(first_offset).decode('utf-8', errors='replace').splitlines():
+        if line.strip().lower().startswith('variables'): self.variables = parseVariables(line)
+      record_size = len(f.readline()) # size of the first record
+    self.first = first; self.offset = offset
+    self.nrec = int(round( (offset - first_offset) / record_size ))
+    return self.nrec
+
+  def reset(self):
+    ''' forget everything, e.g. if the file was truncated or replaced '''
+    self.offset = 0; self.variables = None; self.nrec = 0
+    self.first = None; self.last = None; self.window.clear()
+
+  def update(self):
+    ''' read new records from the file and return the number of new records '''
+    if not os.path.exists(self.filename): return 0
+    if os.path.getsize(self.filename) < self.offset: self.reset() # file was truncated (restart)
+    if self.offset == 0 and self.ltail: self.seekTail()
+    with open(self.filename, 'rb') as f:
+      f.seek(self.offset)
+      chunk = f.read()
+    end = chunk.rfind(b'\n') + 1 # only process complete lines
+    if end == 0: return 0
+    self.offset += end
+    nnew = 0
+    for line in chunk[:end].decode('utf-8', errors='replace').splitlines():
+      line = line.strip()
+      if not line: continue
+      elif line.lower().startswith('variables'): self.variables = parseVariables(line)
+      elif line.lower().startswith(('title','zone')): continue
+      else:
+        try: record = [float(value) for value in line.split()]
+        except ValueError: continue # unknown header or incomplete line
+        if self.first is None: self.first = record
+        self.last = record; self.window.append(record)
+        self.nrec += 1; nnew += 1
+    return nnew
+
+  def column(self, name):
+    ''' return the index of a variable (or None, if the variable is not present) '''
+    if self.variables is None or name not in self.variables: return None
+    return self.variables.index(name)
+
+  def windowMean(self, name):
+    ''' return the mean of a variable over the recent records '''
+    i = self.column(name)
+    if i is None or len(self.window) == 0: return None
+    return sum(record[i] for record in self.window) / len(self.window)
+
+
+# function to determine the end of the simulation from the Grok configuration
+def outputEndTime(grokfile):
+  ''' return the last value of the 'output times' block in a Grok configuration file (or None) '''
+  if not os.path.exists(grokfile): return None
+  with open(grokfile, 'r') as f:
+    lines = [line.strip() for line in f if line.strip() and not line.strip().startswith('!')]
+  if 'output times' not in lines: return None
+  i = lines.index('output times') + 1
+  end_time = None
+  while i < len(lines) and lines[i].lower() != 'end':
+    try: end_time = float(lines[i].split()[-1])
+    except ValueError: break
+    i += 1
+  return end_time
+
+
+## monitor for individual members
+class MemberMonitor(object):
+  '''
+    A class that monitors the progress of a single simulation, based on its Newton iteration log and
+    water balance; the monitor can be updated repeatedly and only reads new records.
+  '''
+  rundir = None # run folder of the simulation
+  problem = None # HGS problem name
+  newton = None # incremental reader for newton_info file
+  water = None # incremental reader for water_balance file
+  end_time = None # end of simulation (last output time)
+  samples = None # recent (wall time, simulated time) samples
+
+  state_db = None # state database (StateDB instance; optional)
+
+  def __init__(self, rundir, problem=None, nwindow=100, state_db=None):
+    ''' initialize with run folder; the problem name is read from batch.pfx, if not specified; if a
+        state database is given, the state is queried from the database, instead of indicator files '''
+    self.rundir = rundir
+    self.state_db = state_db
+    if problem is None:
+      pfx_file = os.path.join(rundir,'batch.pfx')
+      if os.path.exists(pfx_file):
+        with open(pfx_file, 'r') as pfx: problem = pfx.read().strip()
+    self.problem = problem
+    if problem:
+      # N.B.: only the header and the last records are read initially (the number of steps is estimated)
+      self.newton = TimeseriesTail(os.path.join(rundir,newton_file.format(PROBLEM=problem)), nwindow=nwindow, ltail=True)
+      self.water = TimeseriesTail(os.path.join(rundir,water_file.format(PROBLEM=problem)), nwindow=1, ltail=True)
+    self.samples = deque(maxlen=nwindow)
+
+  def indicator(self):
+    ''' return the state of the simulation, based on the state database or indicator files '''
+    if self.state_db is not None:
+      state = self.state_db.getState(self.rundir)
+      if state is not None: return state
+    for indicator in indicators:
+      if os.path.exists(os.path.join(self.rundir,indicator)): return indicator
+    return None
+
+  def update(self):
+    ''' read new records and return a dictionary with the current status of the simulation '''
+    status = dict(rundir=self.rundir, problem=self.problem, state=self.indicator(), sim_time=None,
+                  nsteps=0, dt=None, iters=None, throughput=None, end_time=None, progress=None, eta=None,
+                  wb_error=None, updated=None)
+    if self.newton is None: return status
+    self.newton.update(); self.water.update()
+    if self.end_time is None:
+      self.end_time = outputEndTime(os.path.join(self.rundir,grok_file.format(PROBLEM=self.problem)))
+    status['end_time'] = self.end_time
+    newton = self.newton
+    if newton.nrec == 0: return status
+    # simulated time and time step statistics
+    idt = newton.column('time_step')
+    sim_time = newton.last[0]; sim_start = newton.first[0] - ( newton.first[idt] if idt is not None else 0. )
+    status['sim_time'] = sim_time; status['nsteps'] = newton.nrec
+    status['dt'] = newton.windowMean('time_step')
+    status['iters'] = newton.windowMean('number_of_iterations')
+    # throughput: simulated seconds per wall-clock second
+    wall_time = os.path.getmtime(newton.filename) # time of the last record
+    status['updated'] = wall_time
+    if not self.samples or self.samples[-1] != (wall_time,sim_time): self.samples.append((wall_time,sim_time))
+    if len(self.samples) > 1 and self.samples[-1][0] > self.samples[0][0]:
+      # recent throughput, based on repeated updates
+      (w0,t0),(w1,t1) = self.samples[0],self.samples[-1]
+      status['throughput'] = (t1 - t0) / (w1 - w0)
+    else:
+      # average throughput since the start of the run (the indicator is set when HGS is launched)
+      start_file = os.path.join(self.rundir,'IN_PROGRESS')
+      if os.path.exists(start_file) and wall_time > os.path.getmtime(start_file):
+        status['throughput'] = (sim_time - sim_start) / (wall_time - os.path.getmtime(start_file))
+    # progress and estimated time to completion
+    if self.end_time:
+      status['progress'] = min(1., max(0., (sim_time - sim_start) / (self.end_time - sim_start))) \
+                           if self.end_time > sim_start else 1.
+      if status['throughput']: status['eta'] = max(0., (self.end_time - sim_time) / status['throughput'])
+    # water balance error (most recent record)
+    water = self.water
+    if water.nrec > 0 and water.variables:
+      errors = [i for i,var in enumerate(water.variables) if 'error' in var]
+      if errors: status['wb_error'] = water.last[errors[-1]]
+    return status
+
+
+## monitor for an entire ensemble
+class EnsembleMonitor(object):
+  '''
+    A class that monitors all members of an ensemble (defined by their run folders).
+  '''
+  monitors = None # list of member monitors
+
+  def __init__(self, rundirs, problems=None, nwindow=100, state_db=None):
+    ''' initialize member monitors for all run folders (optionally with a state database file) '''
+    if problems is None: problems = [None]*len(rundirs)
+    if state_db is not None: state_db = openStateDB(state_db)
+    self.monitors = [MemberMonitor(rundir, problem=problem, nwindow=nwindow, state_db=state_db)
+                     for rundir,problem in zip(rundirs,problems)]
+
+  def update(self):
+    ''' update all members and return a list of status dictionaries '''
+    return [monitor.update() for monitor in self.monitors]
+
+  def snapshot(self, filename=None, statuses=None):
+    ''' return a machine-readable JSON snapshot of the ensemble status (updated, if no statuses are
+        passed) and write it to a file, if specified '''
+    if statuses is None: statuses = self.update()
+    snapshot = json.dumps(dict(timestamp=time.time(), members=statuses), indent=2, sort_keys=True)
+    if filename:
+      # write to a temporary file and rename, so that readers never see an incomplete snapshot
+      with open(filename+'.tmp', 'w') as f: f.write(snapshot)
+      os.rename(filename+'.tmp', filename)
+    return snapshot
+
+
+# helper functions to format the status table
+def formatDuration(seconds):
+  ''' format a duration in seconds as a short string with appropriate units '''
+  if seconds is None: return '-'
+  for unit,size in (('d',86400.),('h',3600.),('m',60.)):
+    if seconds >= size: return '{:.1f}{:s}'.format(seconds/size, unit)
+  return '{:.0f}s'.format(seconds)
+
+def formatStatus(statuses):
+  ''' format a list of status dictionaries as a table (one line per member) '''
+  header = '{:<40s} {:>12s} {:>7s} {:>9s} {:>8s} {:>7s} {:>10s} {:>8s}'.format(
+           'Run Folder','State','Steps','Progress','dt','Iters','Sim/Wall','ETA')
+  lines = [header, '-'*len(header)]
+  for status in statuses:
+    rundir = status['rundir'] if len(status['rundir']) <= 40 else '...'+status['rundir'][-37:]
+    progress = '{:.0f}%'.format(100*status['progress']) if status['progress'] is not None else '-'
+    lines.append('{:<40s} {:>12s} {:>7d} {:>9s} {:>8s} {:>7s} {:>10s} {:>8s}'.format(
+                 rundir, status['state'] or '-', status['nsteps'], progress, formatDuration(status['dt']),
+                 '{:.1f}'.format(status['iters']) if status['iters'] is not None else '-',
+                 '{:.1f}'.format(status['throughput']) if status['throughput'] is not None else '-',
+                 formatDuration(status['eta'])))
+  return '\n'.join(lines)
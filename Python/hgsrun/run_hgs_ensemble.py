@@ -19,7 +19,8 @@ import sys, os, yaml
 from argparse import ArgumentParser
 from argparse import RawDescriptionHelpFormatter
 # hgsrun imports
-from hgsrun.hgs_ensemble import EnsHGS
+from hgsrun.hgs_ensemble import EnsHGS, expandMembers
+from hgsrun.monitor import EnsembleMonitor, formatStatus
 
 # meta data
 __all__ = []
@@ -94,11 +95,52 @@ def main(argv=None): # IGNORE:C0111
     parser.add_argument("--grok-first", dest="grok", action='store_true', 
                         help="run Grok for all folders during setup [default: %(default)s]")
     parser.add_argument("--skip-grok", dest="skipgrok", action='store_true', help="do not run Grok at all [default: %(default)s]")
+    parser.add_argument("--materialize", dest="materialize", default=None, choices=('copy','link','reflink'), 
+                        help="replicate template files by copying, hardlinking or reflinking (copy-on-write) [default: copy]")
+    parser.add_argument("--grok-cache", dest="grok_cache", default=None, type=str, 
+                        help="folder for a content-addressed cache of Grok output, shared by members and reruns [default: %(default)s]")
+    parser.add_argument("--forcing-cache", dest="forcing_cache", nargs='?', const='$TMPDIR/hgs_forcing', default=None, type=str, 
+                        help="node-local folder for a copy of the climate forcing, shared by simulations on the same node " + 
+                             "[default: no cache; without value: $TMPDIR/hgs_forcing]")
+    parser.add_argument("--state-db", dest="state_db", default=None, type=str, 
+                        help="SQLite database (on a local disk) that records member states, in addition to indicator files [default: %(default)s]")
+    parser.add_argument("--pipeline", dest="pipeline", action='store_true', 
+                        help="advance each simulation through setup, Grok and HGS independently (no phase barriers) [default: %(default)s]")
+    parser.add_argument("--work-queue", dest="work_queue", default=None, type=str, 
+                        help="claim simulations from a work queue folder on a shared file system, so that several " + 
+                             "instances can run the same ensemble (implies --pipeline) [default: %(default)s]")
     parser.add_argument("--restart", dest="restart", action='store_true', help="complete an ensemble, restarting simulations 'in progress' [default: %(default)s]")
     parser.add_argument("--dry-run", dest="dryrun", action='store_true', 
                         help="do not actually run simulations [default: %(default)s]")
     parser.add_argument("-np", "-n", "--processes", dest="NP", default=None, type=int, 
                         help="number of concurrent simulations to run [default: number of available CPUs]")
+    parser.add_argument("--cores", dest="ncores", nargs='?', const=0, default=None, type=int, 
+                        help="pack simulations onto this many cores, based on the NP setting of each simulation " + 
+                             "[default: no core-aware scheduling; without value: number of available CPUs]")
+    parser.add_argument("--pin-cores", dest="pin", action='store_true', 
+                        help="pin each simulation to a disjoint set of cores, on one NUMA node if possible " + 
+                             "(requires --cores and the taskset utility) [default: %(default)s]")
+    parser.add_argument("--nice", dest="nice", default=None, type=int, 
+                        help="increase the niceness of Grok and HGS processes [default: %(default)s]")
+    parser.add_argument("--ionice", dest="ionice", default=None, type=str, 
+                        help="I/O scheduling class and level of Grok and HGS processes, as 'CLASS[:LEVEL]' " + 
+                             "(see 'man ionice') [default: %(default)s]")
+    parser.add_argument("--async", dest="lasync", action='store_true', 
+                        help="supervise all simulations from a single process (asyncio), streaming logs [default: %(default)s]")
+    parser.add_argument("--staging", dest="staging", nargs='?', const='$TMPDIR', default=None, type=str, 
+                        help="run simulations in a copy of the run folder on node-local scratch space and copy output " + 
+                             "back while running [default: no staging; without value: $TMPDIR]")
+    parser.add_argument("--compress-async", dest="compress_async", action='store_true', 
+                        help="compress binary output in the background while simulations are running [default: %(default)s]")
+    parser.add_argument("--autotune", dest="autotune", nargs='?', const=3600., default=None, type=float, 
+                        help="determine the best parallel settings with short trial runs of this many simulated " + 
+                             "seconds, before the ensemble is run [default: no autotuning; without value: 3600]")
+    parser.add_argument("--stall-timeout", dest="stall_timeout", default=None, type=float, 
+                        help="terminate simulations without progress for this many minutes [default: no watchdog]")
+    parser.add_argument("--status", dest="status", action='store_true', 
+                        help="print progress, throughput and ETA of all simulations and exit [default: %(default)s]")
+    parser.add_argument("--status-json", dest="status_json", nargs='?', const='-', default=None, type=str, 
+                        help="write a JSON snapshot of the simulation status to a file (or stdout) and exit [default: %(default)s]")
     parser.add_argument("--serial", dest="serial", action='store_true', 
                         help="run batch execution in serial mode [default: %(default)s]")
     parser.add_argument("--runtime", dest="runtime", default=None, type=int, 
@@ -120,9 +162,26 @@ def main(argv=None): # IGNORE:C0111
     lnosim       = args.nosim
     lgrok        = args.grok
     lskipgrok    = args.skipgrok
+    materialize  = args.materialize
+    grok_cache   = args.grok_cache
+    state_db     = args.state_db
+    forcing_cache = args.forcing_cache
+    work_queue   = args.work_queue
+    lpipeline    = ( args.pipeline or work_queue ) and not ( args.nosetup or args.nosim or args.grok )
     lrestart     = args.restart
     ldryrun      = args.dryrun
     NP           = args.NP
+    ncores       = args.ncores
+    lasync       = args.lasync
+    lpin         = args.pin
+    nice         = args.nice
+    ionice       = args.ionice
+    staging      = args.staging
+    lcompress_async = args.compress_async
+    autotune     = args.autotune
+    stall_timeout = args.stall_timeout
+    lstatus      = args.status
+    status_json  = args.status_json
     lserial      = args.serial
     runtime      = args.runtime
     
@@ -152,11 +211,34 @@ def main(argv=None): # IGNORE:C0111
         elif tmpvar: # use environment variable 
             hgs_config[envvar] = tmpvar
     
+    if state_db: hgs_config['state_db'] = state_db
+    
+    # report status of simulations (without modifying anything)
+    if lstatus or status_json:
+        member_list = expandMembers(**hgs_config)
+        monitor = EnsembleMonitor([kwargs['rundir'] for kwargs in member_list], 
+                                  problems=[kwargs.get('problem',kwargs.get('project')) for kwargs in member_list],
+                                  state_db=hgs_config.get('state_db'))
+        statuses = monitor.update()
+        if lstatus: print(formatStatus(statuses))
+        if status_json == '-': print(monitor.snapshot(statuses=statuses))
+        elif status_json: monitor.snapshot(filename=status_json, statuses=statuses)
+        return 0
+    
     # override some settings with command-line arguments
     if lnoindicator: hgs_config['lindicator'] = False
     if loverwrite: hgs_config['loverwrite'] = True
     if lrunfailed: hgs_config['lrunfailed'] = True
     if lrestart: hgs_config['lrestart'] = True
+    if grok_cache: hgs_config['grok_cache'] = grok_cache
+    if forcing_cache: hgs_config['forcing_cache'] = forcing_cache
+    if work_queue: hgs_config['work_queue'] = work_queue
+    if nice is not None or ionice is not None:
+        # process priorities can also be defined in the YAML file (see hgsrun.affinity)
+        affinity = dict(hgs_config.get('affinity') or dict())
+        if nice is not None: affinity['nice'] = nice
+        if ionice is not None: affinity['ionice'] = ionice
+        hgs_config['affinity'] = affinity
     
     # instantiate ensemble
     if not lquiet:
@@ -173,6 +255,9 @@ def main(argv=None): # IGNORE:C0111
         print("Run folder setup is handled via command line arguments; removing batch option 'lsetup'.")
         del  batch_config['lsetup']
     if 'lgrok' in batch_config: del batch_config['lgrok']
+    if batch_config.pop('lpipeline', False) and not ( lnosetup or lnosim or lgrok ): lpipeline = True
+    # N.B.: initial conditions of dependent simulations are set, once their parent completes (pipeline only)
+    if enshgs.hasDependencies() and not ( lnosetup or lnosim or lgrok ): lpipeline = True
     if lskipgrok: batch_config['skip_grok'] = True
     if ldryrun: batch_config['ldryrun'] = True
     if NP is not None: batch_config['NP'] = NP
@@ -180,14 +265,39 @@ def main(argv=None): # IGNORE:C0111
     elif NP is None: pass
     elif NP > 1: batch_config['lparallel'] = True
     if runtime is not None: batch_config['runtime_override'] = runtime
+    if ncores is not None: 
+        batch_config['ncores'] = ncores # 0 means all available CPUs
+        if not lserial: batch_config['lparallel'] = True
+    if lasync: batch_config['lasync'] = True
+    if lpin: batch_config['lpin'] = True
+    if materialize: batch_config['materialize'] = materialize
+    if staging: batch_config['staging'] = staging # staging options can also be defined in the YAML file
+    if lcompress_async: batch_config['lcompress'] = 'async'
+    if stall_timeout is not None: 
+        # watchdog policies can also be defined in the YAML file (see hgsrun.watchdog.Watchdog)
+        batch_config['watchdog'] = dict(batch_config.get('watchdog') or dict(), max_idle=stall_timeout)
+    # autotuning options can also be defined in the YAML file (see EnsHGS.autotune)
+    autotune_config = batch_config.pop('autotune', None)
+    if autotune is not None: 
+        autotune_config = dict(autotune_config if isinstance(autotune_config,dict) else dict(), runtime=autotune)
+    elif autotune_config is True: autotune_config = dict()
+    
+    # tune parallel settings (before setup, so that the configuration is written with the best settings)
+    if autotune_config is not None and not lnosim:
+        if not lquiet:
+          print('\n\n   ---           Autotuning Parallel Settings            ---\n') # two newlines
+        for arg in ('template_folder','bin_folder'):
+            if arg in batch_config and arg not in autotune_config: autotune_config[arg] = batch_config[arg]
+        enshgs.autotune(**autotune_config)
     
     # run setup
-    if lnosetup:
+    if lpipeline:
+        pass # setup is handled by the pipeline for each simulation
+    elif lnosetup:
       
         # mark experiments as scheduled, before we begin batch execution
         if not lnoindicator:
-          for m in enshgs:
-              open('{}/SCHEDULED'.format(m.rundir),'a').close()
+          for m in enshgs: m.setIndicator('SCHEDULED')
               
     else:
         
@@ -216,10 +326,18 @@ def main(argv=None): # IGNORE:C0111
           print('')
         
         # begin actual batch execution
-        ec = enshgs.runSimulations(lsetup=False, **batch_config) # setup handled above
+        if lpipeline and work_queue:
+            ec = enshgs.runQueue(**batch_config)
+        elif lpipeline:
+            ec = enshgs.runSimulations(lsetup=True, lpipeline=True, **batch_config)
+        else:
+            ec = enshgs.runSimulations(lsetup=False, **batch_config) # setup handled above
     
         # check results
-        if not lquiet:
+        if work_queue:
+          # N.B.: other members are run by other instances; only the exit codes of this instance are known
+          if not lquiet: print('\n   ---   Work queue exhausted (exit code {})   ---\n'.format(ec))
+        elif not lquiet:
           print('\n') # two newlines
           if ec == 0 and all(g for g in enshgs.HGSOK):
             print("\n   ***   All HGS Simulations Completed Successfully!!!   ***\n")
@@ -0,0 +1,161 @@
+'''
+Created on Oct 19, 2026
+
+A resource-aware scheduler that executes ensemble members as jobs with a CPU (and optional memory)
+requirement; jobs are packed onto the available cores and the next runnable job is started as soon
+as enough resources are released. Jobs can depend on other jobs; they are started as soon as all jobs
+they depend on have completed. Optionally, disjoint sets of cores are assigned to running jobs (NUMA-aware),
+so that jobs can pin their processes to their cores.
+'''
+
+# external imports
+import os, multiprocessing, queue
+# internal imports
+from hgsrun.affinity import CoreSet
+
+
+# named exception
+class SchedulerError(Exception):
+  ''' Exception indicating an Error in the job scheduler '''
+  pass
+
+
+## a simple job container
+class Job(object):
+  '''
+    A job in the scheduler queue: a function call with positional and keyword arguments and
+    the number of cores and the amount of memory (in MB) it requires while running.
+  '''
+  idx    = None # position of the job in the submission list (used to order results)
+  ncpu   = 1 # number of cores required by the job
+  mem    = 0 # memory required by the job (MB)
+  args   = None # positional arguments for the job function
+  kwargs = None # keyword arguments for the job function
+  priority = 0 # jobs with higher priority are started first (e.g. predicted run time)
+  depends = () # indices of jobs that have to complete before this job can start
+  prepare = None # function that is called with the job and the results of its dependencies before it starts
+  cpus = None # cores assigned to the job while it is running (only if cores are pinned)
+
+  def __init__(self, idx, args=None, kwargs=None, ncpu=1, mem=None, priority=None, depends=None, prepare=None):
+    ''' initialize job with its position in the result list, arguments and resource requirements; 
+        'prepare' can modify the job, based on the results of its dependencies, and return False, if
+        the job should be skipped '''
+    self.idx = idx
+    self.args = () if args is None else tuple(args)
+    self.kwargs = dict() if kwargs is None else kwargs
+    self.ncpu = max(1,int(ncpu)) if ncpu else 1
+    self.mem = mem or 0
+    self.priority = priority or 0
+    self.depends = tuple(depends) if depends else ()
+    self.prepare = prepare
+
+  def __repr__(self):
+    return 'Job({:d}, ncpu={:d}, mem={})'.format(self.idx, self.ncpu, self.mem)
+
+
+## the scheduler
+class CoreScheduler(object):
+  '''
+    A scheduler that runs jobs in a worker pool, while making sure that the sum of the core (and memory)
+    requirements of all running jobs never exceeds the available resources; jobs are started in
+    submission order (first-fit), but with backfilling smaller jobs can overtake larger jobs that
+    are waiting for resources.
+  '''
+  ncores   = None # total number of cores available for jobs
+  mem      = None # total memory available for jobs (MB; None means memory is not managed)
+  lbackfill = True # start smaller jobs while larger jobs are waiting for resources
+  free_cores = None # number of currently idle cores
+  free_mem   = None # currently unallocated memory
+  lpin = False # assign disjoint sets of cores to running jobs
+  lnuma = True # place jobs on a single NUMA node, if possible (only if cores are pinned)
+  coreset = None # free cores (only if cores are pinned; see hgsrun.affinity.CoreSet)
+
+  def __init__(self, ncores=None, mem=None, lbackfill=True, lpin=False, lnuma=True):
+    ''' initialize scheduler with the available resources (default: all cores, unmanaged memory); if 'lpin'
+        is True, the cores assigned to a job are passed to the job function as keyword argument 'cpus' '''
+    if ncores is None or ncores <= 0: ncores = multiprocessing.cpu_count()
+    self.ncores = int(ncores)
+    self.mem = mem
+    self.lbackfill = lbackfill
+    self.lpin = lpin
+    self.lnuma = lnuma
+
+  def _request(self, job):
+    ''' return the effective core requirement (jobs larger than the node have to run alone) '''
+    return min(job.ncpu, self.ncores)
+
+  def fits(self, job):
+    ''' check if a job fits into the currently available resources '''
+    if self._request(job) > self.free_cores: return False
+    if self.mem is not None and job.mem > self.free_mem and self.free_mem < self.mem: return False
+    # N.B.: a job requiring more memory than the node has can only run if nothing else is running
+    return True
+
+  def allocate(self, job):
+    ''' reserve resources for a job '''
+    self.free_cores -= self._request(job)
+    if self.mem is not None: self.free_mem -= job.mem
+    # N.B.: if the scheduler manages more cores than are available, jobs may not be pinned (cpus is None)
+    if self.coreset is not None: job.cpus = self.coreset.allocate(self._request(job))
+
+  def release(self, job):
+    ''' return resources of a completed job '''
+    self.free_cores += self._request(job)
+    if self.mem is not None: self.free_mem += job.mem
+    if self.coreset is not None: self.coreset.release(job.cpus); job.cpus = None
+
+  def run(self, fct, jobs, callback=None, NP=None):
+    ''' execute 'fct' for all jobs and return the results in submission order; the callback is executed
+        in the parent process for each successful job; errors are raised after all jobs have terminated;
+        jobs with failed or skipped dependencies are skipped and their result is None '''
+    if callback is not None and not callable(callback): raise TypeError(callback)
+    jobs = list(jobs)
+    if len(jobs) == 0: return []
+    indices = set(job.idx for job in jobs)
+    for job in jobs:
+      if not indices.issuperset(job.depends): 
+        raise SchedulerError("Job depends on unknown jobs: {} {}".format(job, job.depends))
+    self.free_cores = self.ncores; self.free_mem = self.mem
+    self.coreset = CoreSet(ncores=self.ncores, lnuma=self.lnuma) if self.lpin else None
+    # the pool only limits the number of concurrent jobs; resources are managed here
+    NP = min(self.ncores, len(jobs)) if NP is None else NP
+    pool = multiprocessing.Pool(processes=NP)
+    done = queue.Queue() # completion events are posted here by the pool's result handler
+    # N.B.: sorting is stable, so jobs with equal priority are started in submission order
+    pending = sorted(jobs, key=lambda job: -job.priority); running = dict(); results = dict(); errors = []
+    failed = set() # jobs that raised errors or were skipped
+    try:
+      while pending or running:
+        # start all jobs that fit (in order; with backfill, also jobs further down the queue)
+        lskipped = False
+        for job in list(pending):
+          if failed.intersection(job.depends):
+            results[job.idx] = None; failed.add(job.idx); pending.remove(job); lskipped = True; continue
+          elif not all(idx in results for idx in job.depends): continue # waiting for dependencies
+          if job.prepare is not None:
+            prepare = job.prepare; job.prepare = None # only call once (the job may have to wait for resources)
+            if prepare(job, [results[idx] for idx in job.depends]) is False:
+              results[job.idx] = None; failed.add(job.idx); pending.remove(job); lskipped = True; continue
+          if len(running) < NP and self.fits(job):
+            self.allocate(job)
+            kwargs = job.kwargs if job.cpus is None else dict(job.kwargs, cpus=job.cpus)
+            pool.apply_async(fct, job.args, kwargs,
+                             callback=lambda result, idx=job.idx: done.put((idx,result,None)),
+                             error_callback=lambda error, idx=job.idx: done.put((idx,None,error)))
+            running[job.idx] = job; pending.remove(job)
+          elif not self.lbackfill: break # strictly first-come-first-served
+        if not running and lskipped: continue # dependents of skipped jobs are skipped in the next pass
+        if not running:
+          raise SchedulerError("Unable to schedule jobs with the available resources: {}".format(pending))
+        # wait for the next job to complete and release its resources
+        idx, result, error = done.get()
+        self.release(running.pop(idx))
+        if error is None:
+          results[idx] = result
+          if callback is not None: callback(result)
+        else: errors.append(error); failed.add(idx)
+    finally:
+      pool.close(); pool.join()
+    # raise first error (like AsyncResult.get)
+    if errors: raise errors[0]
+    return [results[job.idx] for job in jobs]
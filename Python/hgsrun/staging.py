@@ -0,0 +1,187 @@
+'''
+Created on Oct 19, 2026
+
+Staging of HGS run folders on node-local scratch space (or tmpfs): the run folder is copied to the
+local disk before HGS is launched, output files are copied back to the persistent run folder in the
+background while HGS is running (checkpoint files first, so that a simulation can be restarted after
+a node failure), and a final synchronization and verification is performed, when HGS terminates.
+'''
+
+# external imports
+import os, shutil, hashlib, threading, tempfile, fnmatch
+
+
+# named exception
+class StagingError(Exception):
+  ''' Exception indicating an Error during stage-in or stage-out '''
+  pass
+
+# files that are never copied back (indicator files are managed in the persistent run folder)
+stage_exclude = ('SCHEDULED','IN_PROGRESS','COMPLETED','FAILED','STALLED','RESTARTED','CONCATENATED','ERROR',
+                 '*.staging')
+
+
+## the stager
+class Stager(object):
+  '''
+    A class that mirrors a run folder on node-local scratch space and copies output back to the
+    persistent run folder asynchronously (using a background thread); files are only copied, once
+    they have not changed between two polls, except for journal files (append-only time-series, like
+    the Newton info file), which are copied whenever they changed. Checkpoint files are copied first.
+    N.B.: relative paths that point outside of the run folder are supported one level up, i.e.
+    '../climate_forcing' works, since the siblings of the run folder are linked into the scratch space.
+  '''
+  rundir = None # persistent run folder
+  scratch = None # root folder for staging (node-local)
+  stage_dir = None # run folder on scratch space
+  interval = 60. # interval between background synchronizations (seconds)
+  checkpoints = () # shell patterns of checkpoint files (copied first)
+  journals = () # shell patterns of append-only files that are copied whenever they changed
+  exclude = stage_exclude # shell patterns of files that are not copied back
+  lcleanup = True # remove the staged folder after successful verification
+  errors = None # errors from background synchronization
+
+  def __init__(self, rundir, scratch=None, interval=60., checkpoints=None, journals=None, exclude=None,
+               lcleanup=True):
+    ''' initialize with persistent run folder and scratch folder (default: $TMPDIR or system default);
+        environment variables in the scratch folder are expanded (e.g. '$SLURM_TMPDIR') '''
+    self.rundir = os.path.abspath(rundir)
+    scratch = scratch or os.getenv('TMPDIR') or tempfile.gettempdir()
+    self.scratch = os.path.abspath(os.path.expandvars(scratch))
+    self.interval = float(interval)
+    if checkpoints is not None: self.checkpoints = tuple(checkpoints)
+    if journals is not None: self.journals = tuple(journals)
+    if exclude is not None: self.exclude = tuple(exclude)
+    self.lcleanup = lcleanup
+    # the staging area is specific to the run folder (a stale copy from a crashed run is replaced)
+    name = os.path.basename(self.rundir)
+    digest = hashlib.sha1(self.rundir.encode('utf-8')).hexdigest()[:12]
+    self._base = os.path.join(self.scratch, 'hgs_staging', '{}.{}'.format(name,digest))
+    self.stage_dir = os.path.join(self._base, name)
+    self._synced = dict() # stat signature of files in the persistent run folder (relative paths)
+    self._seen = dict() # stat signature of files in the staged folder at the last poll
+    self._lock = threading.Lock() # only one synchronization at a time
+    self._stop = threading.Event(); self._thread = None
+    self.errors = []
+
+  @staticmethod
+  def _signature(stat):
+    return (stat.st_size, stat.st_mtime_ns)
+
+  def _match(self, relpath, patterns):
+    name = os.path.basename(relpath)
+    return any(fnmatch.fnmatch(name, pattern) for pattern in patterns)
+
+  def translate(self, path):
+    ''' translate a path in the persistent run folder to the corresponding path in the staged folder '''
+    path = os.path.abspath(os.path.join(self.rundir, path))
+    if os.path.commonpath([path, self.rundir]) != self.rundir: return path # outside of run folder
+    return os.path.join(self.stage_dir, os.path.relpath(path, self.rundir))
+
+  def stageIn(self, lthread=True):
+    ''' copy the run folder to scratch space (symbolic links are preserved, but made absolute) and start
+        background synchronization; returns the staged run folder '''
+    if os.path.lexists(self._base): shutil.rmtree(self._base)
+    os.makedirs(self.stage_dir)
+    # link siblings of the run folder, so that paths relative to the run folder remain valid
+    parent = os.path.dirname(self.rundir)
+    for entry in os.scandir(parent):
+      if entry.path != self.rundir: os.symlink(entry.path, os.path.join(self._base, entry.name))
+    # copy folder tree
+    self._synced = dict()
+    for root, dirnames, filenames in os.walk(self.rundir):
+      relroot = os.path.relpath(root, self.rundir)
+      stage_root = os.path.normpath(os.path.join(self.stage_dir, relroot))
+      for name in list(dirnames) + filenames:
+        src = os.path.join(root, name); dst = os.path.join(stage_root, name)
+        if os.path.islink(src):
+          target = os.readlink(src)
+          if not os.path.isabs(target): target = os.path.normpath(os.path.join(root, target))
+          os.symlink(target, dst)
+          if name in dirnames: dirnames.remove(name) # don't descend into linked folders
+        elif name in dirnames: os.mkdir(dst)
+        else:
+          shutil.copy2(src, dst)
+          self._synced[os.path.normpath(os.path.join(relroot, name))] = self._signature(os.stat(dst))
+    self._seen = dict(self._synced)
+    # start background synchronization
+    if lthread:
+      self._stop.clear()
+      self._thread = threading.Thread(target=self._run, name='stage-out', daemon=True)
+      self._thread.start()
+    return self.stage_dir
+
+  def _run(self):
+    ''' background synchronization loop '''
+    while not self._stop.wait(self.interval):
+      try: self.sync(lfinal=False)
+      except (OSError, shutil.Error) as e: self.errors.append(e) # retry at next poll
+
+  def _scan(self):
+    ''' return signatures of all regular files in the staged folder (relative paths) '''
+    files = dict()
+    for root, dirnames, filenames in os.walk(self.stage_dir):
+      relroot = os.path.relpath(root, self.stage_dir)
+      for name in filenames:
+        path = os.path.join(root, name)
+        if os.path.islink(path): continue
+        relpath = os.path.normpath(os.path.join(relroot, name))
+        if self._match(relpath, self.exclude): continue
+        try: files[relpath] = self._signature(os.stat(path))
+        except FileNotFoundError: pass # removed in the meantime
+    return files
+
+  def _copy(self, relpath):
+    ''' copy a file to the persistent run folder (atomically, using a temporary file) '''
+    src = os.path.join(self.stage_dir, relpath); dst = os.path.join(self.rundir, relpath)
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    shutil.copy2(src, dst+'.staging'); os.replace(dst+'.staging', dst)
+
+  def sync(self, lfinal=False):
+    ''' copy new and modified files to the persistent run folder (checkpoints first, then journals, then
+        other files); unless 'lfinal' is True, only files that did not change since the last poll are
+        copied (except journals); returns the list of copied files '''
+    with self._lock:
+      files = self._scan()
+      changed = [relpath for relpath,signature in files.items() if self._synced.get(relpath) != signature]
+      ljournal = [self._match(relpath, self.journals) for relpath in changed]
+      if not lfinal: # only copy files that were not modified since the last poll
+        changed = [relpath for relpath,lj in zip(changed,ljournal) if lj or self._seen.get(relpath) == files[relpath]]
+      self._seen = files
+      # order: checkpoints first, then journals (they determine the restart time), then everything else
+      def priority(relpath):
+        if self._match(relpath, self.checkpoints): return 0
+        elif self._match(relpath, self.journals): return 1
+        else: return 2
+      copied = []
+      for relpath in sorted(changed, key=priority):
+        signature = self._signature(os.stat(os.path.join(self.stage_dir, relpath)))
+        self._copy(relpath)
+        self._synced[relpath] = signature; copied.append(relpath)
+      return copied
+
+  def verify(self):
+    ''' compare sizes and modification times of all staged files with the persistent copies; returns a
+        list of files that differ or are missing '''
+    problems = []
+    for relpath,(size,mtime_ns) in self._scan().items():
+      try: stat = os.stat(os.path.join(self.rundir, relpath))
+      except FileNotFoundError:
+        problems.append(relpath); continue
+      # N.B.: time stamp resolution of shared file systems may be lower than on local disks
+      if stat.st_size != size or abs(stat.st_mtime_ns - mtime_ns) > 2e9: problems.append(relpath)
+    return problems
+
+  def stageOut(self, lerror=True):
+    ''' stop background synchronization, copy all remaining files and verify the persistent copies; the
+        staged folder is removed, if verification succeeded; returns the list of problems '''
+    self._stop.set()
+    if self._thread is not None: self._thread.join(); self._thread = None
+    self.sync(lfinal=True)
+    problems = self.verify()
+    if problems:
+      if lerror:
+        raise StagingError("Stage-out verification failed for {:d} files (staged copy retained):\n  '{}'\n {}".format(
+                           len(problems), self.stage_dir, problems[:10]))
+    elif self.lcleanup: shutil.rmtree(self._base)
+    return problems
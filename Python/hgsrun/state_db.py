@@ -0,0 +1,130 @@
+'''
+Created on Oct 19, 2026
+
+An optional SQLite database that records the state of ensemble members (status transitions, time
+stamps, exit codes and run times); the database is shared by all members and worker processes and
+uses WAL mode, so that status queries do not have to probe indicator files in every run folder.
+The indicator files are still written as a compatibility mirror.
+'''
+
+# external imports
+import os, time, socket, sqlite3, threading
+
+# member states (same names as the indicator files)
+member_states = ('SCHEDULED','IN_PROGRESS','COMPLETED','FAILED','STALLED','RESTARTED','ERROR')
+
+# database schema
+schema = '''
+CREATE TABLE IF NOT EXISTS members (
+  rundir    TEXT PRIMARY KEY,
+  state     TEXT NOT NULL,
+  updated   REAL NOT NULL,
+  started   REAL,
+  finished  REAL,
+  ec        INTEGER,
+  wall_time REAL,
+  host      TEXT
+);
+CREATE TABLE IF NOT EXISTS transitions (
+  rundir    TEXT NOT NULL,
+  state     TEXT NOT NULL,
+  timestamp REAL NOT NULL,
+  ec        INTEGER,
+  wall_time REAL,
+  host      TEXT
+);
+CREATE INDEX IF NOT EXISTS transitions_rundir ON transitions (rundir);
+'''
+
+
+## the state database
+class StateDB(object):
+  '''
+    A class that records and queries the state of ensemble members in an SQLite database; each thread
+    (and process) uses its own connection. N.B.: the database should be located on a local disk, since
+    SQLite locking is not reliable on network or parallel file systems.
+  '''
+  filename = None # path of the database file
+  timeout = 60. # time to wait for locks held by other processes (seconds)
+  _local = None # thread-local storage for connections
+
+  def __init__(self, filename, timeout=60.):
+    ''' open (and initialize) the database '''
+    self.filename = os.path.abspath(filename)
+    self.timeout = timeout
+    self._local = threading.local()
+    with self.connection() as conn: conn.executescript(schema)
+
+  def connection(self):
+    ''' return the connection of the current thread/process (opened on first use) '''
+    conn = getattr(self._local, 'conn', None)
+    if conn is None or self._local.pid != os.getpid(): # connections can not be shared with forked processes
+      conn = sqlite3.connect(self.filename, timeout=self.timeout)
+      conn.execute('PRAGMA journal_mode=WAL') # readers don't block writers
+      conn.execute('PRAGMA synchronous=NORMAL') # sufficient with WAL
+      self._local.conn = conn; self._local.pid = os.getpid()
+    return conn
+
+  def __getstate__(self):
+    ''' only pickle the file name (connections are opened in the worker) '''
+    return dict(filename=self.filename, timeout=self.timeout)
+
+  def __setstate__(self, state):
+    self.__dict__.update(state); self._local = threading.local()
+
+  def setState(self, rundir, state, ec=None, wall_time=None, timestamp=None):
+    ''' record a state transition of a member (start and finish times are derived from the state) '''
+    if state not in member_states: raise ValueError(state)
+    rundir = os.path.abspath(rundir)
+    timestamp = time.time() if timestamp is None else timestamp
+    host = socket.gethostname()
+    started = timestamp if state == 'IN_PROGRESS' else None
+    finished = timestamp if state in ('COMPLETED','FAILED','STALLED','ERROR') else None
+    with self.connection() as conn: # one transaction
+      conn.execute('INSERT INTO transitions VALUES (?,?,?,?,?,?)', (rundir, state, timestamp, ec, wall_time, host))
+      conn.execute('''INSERT INTO members VALUES (?,?,?,?,?,?,?,?) ON CONFLICT(rundir) DO UPDATE SET
+                      state=excluded.state, updated=excluded.updated, host=excluded.host,
+                      started=CASE WHEN excluded.state IN ('SCHEDULED','IN_PROGRESS') THEN excluded.started ELSE started END,
+                      finished=excluded.finished, ec=excluded.ec, wall_time=excluded.wall_time''',
+                   (rundir, state, timestamp, started, finished, ec, wall_time, host))
+
+  def getState(self, rundir):
+    ''' return the current state of a member (or None, if it is not in the database) '''
+    row = self.connection().execute('SELECT state FROM members WHERE rundir=?', (os.path.abspath(rundir),)).fetchone()
+    return None if row is None else row[0]
+
+  def states(self):
+    ''' return a dictionary with the current states of all members (keys are absolute paths) '''
+    return dict(self.connection().execute('SELECT rundir, state FROM members'))
+
+  def records(self, rundirs=None):
+    ''' return a list of member records (dictionaries); optionally only for the given run folders '''
+    cursor = self.connection().execute('SELECT * FROM members ORDER BY rundir')
+    columns = [column[0] for column in cursor.description]
+    records = [dict(zip(columns,row)) for row in cursor]
+    if rundirs is not None:
+      rundirs = set(os.path.abspath(rundir) for rundir in rundirs)
+      records = [record for record in records if record['rundir'] in rundirs]
+    return records
+
+  def history(self, rundir):
+    ''' return all state transitions of a member in chronological order '''
+    cursor = self.connection().execute('SELECT state, timestamp, ec, wall_time, host FROM transitions ' +
+                                       'WHERE rundir=? ORDER BY timestamp', (os.path.abspath(rundir),))
+    return [dict(zip(('state','timestamp','ec','wall_time','host'),row)) for row in cursor]
+
+  def counts(self):
+    ''' return the number of members in each state '''
+    return dict(self.connection().execute('SELECT state, COUNT(*) FROM members GROUP BY state'))
+
+
+# open databases are cached, so that all members of a process share one object (and connection)
+_databases = dict()
+_databases_lock = threading.Lock()
+
+def openStateDB(filename):
+  ''' return a (cached) StateDB instance for a database file '''
+  filename = os.path.abspath(filename)
+  with _databases_lock:
+    if filename not in _databases: _databases[filename] = StateDB(filename)
+    return _databases[filename]
@@ -0,0 +1,275 @@
+'''
+Created on Oct 19, 2026
+
+An asyncio-based supervisor that launches Grok and HGS as child processes of a single lightweight
+parent process; the output of each child is streamed into its log file and scanned for the exit
+banner and error messages as it appears.
+'''
+
+# external imports
+import os, re, time, asyncio, functools
+# internal imports
+from hgsrun.misc import GrokError, grok_exit, hgs_exit
+from hgsrun.history import predictRuntimes, longestFirst
+from hgsrun.watchdog import Watchdog
+from hgsrun.staging import Stager
+from hgsrun.compression import Compressor, bin_pattern
+from hgsrun.affinity import CoreSet, launchCommand
+
+# patterns in the Grok/HGS output that indicate an error
+error_patterns = (r'forrtl: severe', r'Segmentation fault', r'^\s*\**\s*ERROR', r'^\s*Error termination',
+                  r'^\s*STOP\b')
+
+
+# function to run a process and stream its output into a log file
+async def superviseProcess(command, cwd=None, logfile=None, exit_banner=None, error_patterns=error_patterns,
+                           lterminate=False, mode='w', callback=None, chunk_size=65536, watch=None, 
+                           poll_interval=60., affinity=None):
+  ''' launch a child process and stream its stdout/stderr into a log file, while scanning each line for
+      the exit banner and error patterns; if 'lterminate' is True, the process is terminated as soon as
+      an error is detected; the optional callback is called with each line; if a watch (see watchdog)
+      is given, it is checked periodically and the process is terminated, if it stalls; CPU affinity and
+      priority of the process are set according to 'affinity' (see hgsrun.affinity); returns a 
+      dictionary with exit code, banner detection, detected errors, termination reason and wall time '''
+  regex = re.compile('|'.join('(?:{})'.format(pattern) for pattern in error_patterns)) if error_patterns else None
+  report = dict(command=command, returncode=None, lexit=False, errors=[], reason=None, wall_time=time.time())
+  proc = await asyncio.create_subprocess_exec(*launchCommand(command, affinity), cwd=cwd, 
+                                              stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT)
+  
+  async def watchProcess():
+    ''' check the watchdog policies periodically and terminate the process, if triggered '''
+    while proc.returncode is None:
+      await asyncio.sleep(poll_interval)
+      reason = watch.check()
+      if reason is not None and proc.returncode is None:
+        report['reason'] = reason; proc.terminate()
+        try: await asyncio.wait_for(proc.wait(), timeout=watch.watchdog.grace)
+        except asyncio.TimeoutError: proc.kill()
+        return
+  watcher = asyncio.ensure_future(watchProcess()) if watch is not None else None
+
+  def scanLine(line):
+    ''' check a line for exit banner and error patterns '''
+    line = line.decode('utf-8', errors='replace').rstrip()
+    if callback is not None: callback(line)
+    if exit_banner is not None and line.strip() == exit_banner: report['lexit'] = True
+    elif regex is not None and regex.search(line):
+      report['errors'].append(line)
+      if lterminate and proc.returncode is None: proc.terminate()
+
+  with open(logfile if logfile else os.devnull, mode+'b', buffering=0) as lf:
+    partial = b'' # incomplete last line of a chunk
+    while True:
+      chunk = await proc.stdout.read(chunk_size)
+      if not chunk: break # end of stream (process closed stdout)
+      lf.write(chunk)
+      lines = (partial + chunk).split(b'\n'); partial = lines.pop()
+      for line in lines: scanLine(line)
+    if partial: scanLine(partial)
+  report['returncode'] = await proc.wait()
+  report['wall_time'] = time.time() - report['wall_time']
+  if watcher is not None and not watcher.done(): watcher.cancel()
+  if report['reason'] is not None: report['lexit'] = False
+  return report
+
+
+## core accounting for concurrent simulations
+class CoreLimiter(object):
+  '''
+    An asyncio equivalent of the core accounting in the CoreScheduler: a coroutine can acquire a number of
+    cores and has to wait until enough cores are released by other coroutines; optionally, disjoint sets of
+    cores are assigned (see hgsrun.affinity.CoreSet).
+  '''
+  ncores = None # total number of cores
+  free_cores = None # number of currently idle cores
+  coreset = None # free cores (only if cores are pinned)
+  _condition = None # asyncio condition (has to be created in the event loop)
+
+  def __init__(self, ncores=None, lpin=False, lnuma=True):
+    ''' initialize with number of cores (default: all available cores); must be called in the event loop '''
+    if ncores is None or ncores <= 0: ncores = os.cpu_count()
+    self.ncores = self.free_cores = int(ncores)
+    self.coreset = CoreSet(ncores=self.ncores, lnuma=lnuma) if lpin else None
+    self._condition = asyncio.Condition()
+
+  async def acquire(self, ncpu=1):
+    ''' wait until 'ncpu' cores are available and reserve them; return number of reserved cores and the
+        assigned cores (None, if cores are not pinned) '''
+    ncpu = min(max(1,ncpu or 1), self.ncores) # jobs larger than the node have to run alone
+    async with self._condition:
+      await self._condition.wait_for(lambda: self.free_cores >= ncpu)
+      self.free_cores -= ncpu
+      cpus = None if self.coreset is None else self.coreset.allocate(ncpu)
+    return ncpu, cpus
+
+  async def release(self, ncpu, cpus=None):
+    ''' release cores and wake up waiting coroutines '''
+    async with self._condition:
+      self.free_cores += ncpu
+      if self.coreset is not None: self.coreset.release(cpus)
+      self._condition.notify_all()
+
+
+## the supervisor
+class Supervisor(object):
+  '''
+    A class that runs Grok and HGS for many ensemble members concurrently from a single process, using
+    asyncio subprocesses; configuration and post-processing are performed by the member's own methods,
+    while the executables are supervised by the event loop.
+  '''
+  ncores = None # number of cores to pack simulations onto
+  error_patterns = error_patterns # patterns that indicate an error in the log output
+  lterminate = False # terminate simulations as soon as an error is detected
+  lpin = False # pin the processes of each member to a disjoint set of cores
+  lnuma = True # place members on a single NUMA node, if possible
+
+  def __init__(self, ncores=None, error_patterns=None, lterminate=False, lpin=False, lnuma=True):
+    ''' initialize supervisor with available cores and error detection settings '''
+    self.ncores = ncores
+    if error_patterns is not None: self.error_patterns = error_patterns
+    self.lterminate = lterminate
+    self.lpin = lpin
+    self.lnuma = lnuma
+
+  @staticmethod
+  async def _call(method, *args, **kwargs):
+    ''' run a blocking method (setup and post-processing) in a thread of the default executor, so that 
+        the event loop keeps streaming the output of other members '''
+    return await asyncio.get_running_loop().run_in_executor(None, functools.partial(method, *args, **kwargs))
+
+  async def runGrok(self, member, lerror=True, lcompress=True, ldryrun=False, affinity=None):
+    ''' the equivalent of HGS.runGrok (without configuration), supervised as an asyncio subprocess; the
+        CPU affinity and priority default to the settings of the member '''
+    command = await self._call(member.prepareGrok)
+    grok_log = os.path.join(member.rundir,member.grok_log)
+    if command is None:
+      with open(grok_log, 'w+') as lf: lf.write('Grok output is up-to-date or was restored from cache --- no execution')
+      lec = True; lcompress = False # no new debug output
+    elif ldryrun:
+      with open(grok_log, 'w+') as lf: lf.write('Dry-run --- no execution')
+      lec = True # pretend everything works
+    else:
+      report = await superviseProcess(command, cwd=member.rundir, logfile=grok_log, exit_banner=grok_exit,
+                                      error_patterns=self.error_patterns, lterminate=self.lterminate,
+                                      affinity=member.affinity if affinity is None else affinity)
+      lec = report['lexit']
+    return await self._call(member.finishGrok, lec=lec, lerror=lerror, lcompress=lcompress)
+
+  async def executeHGS(self, member, command, logfile=None, watchdog=None, ldryrun=False, staging=None, affinity=None):
+    ''' the equivalent of HGS.executeHGS, supervised as an asyncio subprocess; with staging, HGS runs in a
+        copy of the run folder on node-local scratch space (stage-in and stage-out run in a thread) '''
+    if not logfile: logfile = member.hgs_log
+    hgs_log = os.path.join(member.rundir,logfile)
+    if ldryrun:
+      with open(hgs_log, 'w+') as lf: lf.write('\nDry-run --- no execution\n')
+      return True, None, None # pretend everything works
+    loop = asyncio.get_running_loop()
+    folder = member.rundir; stager = None
+    if staging:
+      stager = Stager(member.rundir, **member.stagingOptions(staging))
+      folder = await loop.run_in_executor(None, stager.stageIn)
+      command = [stager.translate(command[0])] + command[1:]
+      hgs_log = os.path.join(folder,logfile)
+    if watchdog is None: watch = None; poll_interval = None
+    else: 
+      watch = watchdog.watch(os.path.join(folder,member.newton_file))
+      poll_interval = watchdog.poll_interval
+    try:
+      report = await superviseProcess(command, cwd=folder, logfile=hgs_log, exit_banner=hgs_exit,
+                                      error_patterns=self.error_patterns, lterminate=self.lterminate, 
+                                      watch=watch, poll_interval=poll_interval, 
+                                      affinity=member.affinity if affinity is None else affinity)
+      if report['errors'] or report['reason']:
+        with open(hgs_log, 'a') as lf:
+          if report['errors']: lf.write('\nErrors detected in HGS output:\n'+'\n'.join(report['errors'])+'\n')
+          if report['reason']: lf.write('\nHGS was terminated by the watchdog: {}\n'.format(report['reason']))
+    finally:
+      if stager is not None: await loop.run_in_executor(None, stager.stageOut)
+    return report['lexit'], report['wall_time'], report['reason']
+
+  async def runMember(self, member, limiter, executable=None, logfile=None, lerror=True, lcompress=True,
+                      skip_config=False, skip_grok=False, skip_pidx=False, ldryrun=False, watchdog=None, staging=None):
+    ''' the equivalent of HGS.runHGS, but Grok and HGS are supervised as asyncio subprocesses; returns
+        the cumulative exit code of the member '''
+    if isinstance(watchdog, dict): watchdog = Watchdog(**watchdog)
+    ncpu, cpus = await limiter.acquire(member.NP)
+    affinity = dict(member.affinity or dict(), cpus=cpus) if cpus else member.affinity
+    try:
+      cec = 0
+      # Grok configuration
+      if not skip_config and not member.configOK:
+        ec = await self._call(member.setupConfig, ldryrun=ldryrun)
+        if ec != 0:
+          if lerror: raise GrokError('Grok configuration did not complete properly.')
+          else: print('ERROR: Grok configuration did not complete properly.')
+        cec += ec
+      # Grok run
+      if not skip_grok and not member.GrokOK:
+        if not skip_config and member._lines is not None: await self._call(member.writeConfig)
+        cec += await self.runGrok(member, lerror=lerror, lcompress=lcompress, ldryrun=ldryrun, affinity=affinity)
+      # parallel index and indicators
+      command, ec = await self._call(member.prepareHGS, executable=executable, lerror=lerror, lcompress=lcompress,
+                                     skip_config=True, skip_grok=True, skip_pidx=skip_pidx, ldryrun=ldryrun)
+      cec += ec
+      # run HGS (holding a reference to the forcing cache)
+      forcing = None if ldryrun else await self._call(member.acquireForcing)
+      compressor = None # compress binary output in the background (see HGS.runHGS)
+      if lcompress == 'async' and not ldryrun:
+        compressor = Compressor(member.rundir); compressor.startWatch(pattern=bin_pattern)
+      try:
+        lec, wall_time, reason = await self.executeHGS(member, command, logfile=logfile, watchdog=watchdog, 
+                                                       ldryrun=ldryrun, staging=staging, affinity=affinity)
+        nrestart = 0
+        while reason is not None and watchdog.lresubmit(nrestart):
+          # resubmit stalled simulation from last restart output (cores are retained)
+          await asyncio.sleep(watchdog.backoffTime(nrestart)); nrestart += 1
+          command, ec = await self._call(member.prepareResubmit, lerror=lerror, lcompress=lcompress, skip_grok=True,
+                                         ldryrun=ldryrun)
+          if not skip_grok: 
+            ec += await self.runGrok(member, lerror=lerror, lcompress=lcompress, ldryrun=ldryrun, affinity=affinity)
+          cec += ec
+          lec, wall_time, reason = await self.executeHGS(member, command, logfile=logfile, watchdog=watchdog, 
+                                                         ldryrun=ldryrun, staging=staging, affinity=affinity)
+      except:
+        if compressor is not None: compressor.abort()
+        raise
+      finally: await self._call(member.releaseForcing, forcing)
+      # post-processing (indicators, restarts, compression)
+      fail_indicator = watchdog.indicator if reason is not None else 'FAILED'
+      return await self._call(member.finishHGS, logfile=logfile, lec=lec, cec=cec, wall_time=wall_time, 
+                              lerror=lerror, lcompress=lcompress, ldryrun=ldryrun, 
+                              fail_indicator=fail_indicator, compressor=compressor)
+    finally:
+      await limiter.release(ncpu, cpus)
+
+  async def _run(self, members, kwargs_list, callback=None):
+    ''' run all members concurrently and return results (exit codes or exceptions) '''
+    limiter = CoreLimiter(self.ncores, lpin=self.lpin, lnuma=self.lnuma)
+
+    async def runTask(member, kwargs):
+      wall_time = time.time()
+      ec = await self.runMember(member, limiter, **kwargs)
+      if callback is not None:
+        callback(dict(rundir=member.rundir, ec=ec, wall_time=time.time()-wall_time))
+      return ec
+
+    # create tasks in order of decreasing predicted run time, so that long simulations start first
+    order = longestFirst(predictRuntimes(members))
+    tasks = {i:asyncio.ensure_future(runTask(members[i], kwargs_list[i])) for i in order}
+    await asyncio.gather(*tasks.values(), return_exceptions=True)
+    return [tasks[i].exception() or tasks[i].result() for i in range(len(members))]
+
+  def run(self, members, kwargs_list=None, callback=None, **kwargs):
+    ''' run Grok and HGS for all members (keyword arguments as in HGS.runHGS, either common or as a list
+        with one entry per member) and return the exit codes; errors are raised after all simulations
+        have terminated '''
+    if callback is not None and not callable(callback): raise TypeError(callback)
+    if kwargs_list is None: kwargs_list = [kwargs]*len(members)
+    elif len(kwargs_list) != len(members):
+      raise ValueError('Length of argument list does not match number of members! {} ~= {}'.format(
+                       len(kwargs_list),len(members)))
+    results = asyncio.run(self._run(members, kwargs_list, callback=callback))
+    # raise first error (like the CoreScheduler)
+    for result in results:
+      if isinstance(result, BaseException): raise result
+    return results
@@ -0,0 +1,109 @@
+'''
+Created on Oct 19, 2026
+
+Watchdog policies for running HGS simulations: a simulation is considered stalled, if its Newton log
+did not advance for a given time, or if the time step remained below a threshold for a number of
+steps; stalled simulations are terminated (and can be restarted from their last restart output).
+'''
+
+# external imports
+import time, subprocess
+# internal imports
+from hgsrun.monitor import TimeseriesTail
+
+
+## watchdog settings
+class Watchdog(object):
+  '''
+    A class that defines the watchdog policies and the response: the process is terminated and the
+    simulation is marked as 'STALLED' (or 'FAILED'); optionally, the simulation is resubmitted from
+    its last restart output, after a waiting period that doubles with every restart.
+  '''
+  max_idle = None # maximum time without progress in the Newton log (minutes)
+  min_dt = None # minimum acceptable time step (seconds)
+  min_dt_steps = 10 # number of consecutive time steps below min_dt that trigger the watchdog
+  poll_interval = 60. # interval between checks (seconds)
+  max_restarts = 0 # maximum number of resubmissions of a stalled simulation
+  backoff = 60. # waiting time before the first resubmission (seconds; doubled for each restart)
+  indicator = 'STALLED' # indicator file for terminated simulations ('STALLED' or 'FAILED')
+  grace = 30. # time between SIGTERM and SIGKILL (seconds)
+
+  def __init__(self, max_idle=None, min_dt=None, min_dt_steps=10, poll_interval=60., max_restarts=0,
+               backoff=60., indicator='STALLED', grace=30.):
+    ''' initialize watchdog policies; at least one of max_idle and min_dt should be set '''
+    if indicator not in ('STALLED','FAILED'): raise ValueError(indicator)
+    self.max_idle = max_idle
+    self.min_dt = min_dt
+    self.min_dt_steps = max(1,int(min_dt_steps))
+    self.poll_interval = poll_interval
+    self.max_restarts = max_restarts
+    self.backoff = backoff
+    self.indicator = indicator
+    self.grace = grace
+
+  def __repr__(self):
+    return 'Watchdog(max_idle={}, min_dt={}, min_dt_steps={}, max_restarts={})'.format(
+           self.max_idle, self.min_dt, self.min_dt_steps, self.max_restarts)
+
+  def watch(self, newton_file, now=None):
+    ''' return a watch for a simulation (based on its Newton log) '''
+    return MemberWatch(self, newton_file, now=now)
+
+  def lresubmit(self, nrestart):
+    ''' check if a simulation that has already been restarted 'nrestart' times can be resubmitted '''
+    return nrestart < self.max_restarts
+
+  def backoffTime(self, nrestart):
+    ''' waiting time before the resubmission of a simulation that has been restarted 'nrestart' times '''
+    return self.backoff * 2**nrestart
+
+  def terminate(self, proc):
+    ''' terminate a process (subprocess.Popen); kill it, if it does not terminate within the grace period '''
+    proc.terminate()
+    try: proc.wait(timeout=self.grace)
+    except subprocess.TimeoutExpired:
+      proc.kill(); proc.wait()
+
+  def superviseProcess(self, proc, newton_file):
+    ''' wait for a process to terminate, while checking the watchdog policies; if triggered, the process
+        is terminated and the reason is returned (otherwise None) '''
+    watch = self.watch(newton_file)
+    while True:
+      try:
+        proc.wait(timeout=self.poll_interval)
+        return None # process terminated by itself
+      except subprocess.TimeoutExpired: pass
+      reason = watch.check()
+      if reason is not None:
+        self.terminate(proc)
+        return reason
+
+
+## state of the watchdog for a running simulation
+class MemberWatch(object):
+  '''
+    A class that tracks the progress of a single simulation and checks the watchdog policies.
+  '''
+  watchdog = None # the watchdog with the policies
+  tail = None # incremental reader for the Newton log
+  last_progress = None # wall time of the last progress
+
+  def __init__(self, watchdog, newton_file, now=None):
+    ''' initialize watch; the start time counts as the last progress '''
+    self.watchdog = watchdog
+    self.tail = TimeseriesTail(newton_file, nwindow=watchdog.min_dt_steps)
+    self.last_progress = time.time() if now is None else now
+
+  def check(self, now=None):
+    ''' read new records and check the watchdog policies; return the reason, if triggered (otherwise None) '''
+    now = time.time() if now is None else now
+    if self.tail.update() > 0: self.last_progress = now
+    watchdog = self.watchdog
+    if watchdog.max_idle and now - self.last_progress > watchdog.max_idle*60.:
+      return 'no progress for {:g} minutes'.format(watchdog.max_idle)
+    if watchdog.min_dt:
+      idt = self.tail.column('time_step')
+      window = self.tail.window
+      if idt is not None and len(window) >= watchdog.min_dt_steps and all(r[idt] < watchdog.min_dt for r in window):
+        return 'time step below {:g}s for {:d} steps'.format(watchdog.min_dt, watchdog.min_dt_steps)
+    return None
@@ -0,0 +1,168 @@
+'''
+Created on Oct 19, 2026
+
+A work queue on a shared file system that allows several instances of run_hgs_ensemble (e.g. on
+different nodes or in different cluster jobs) to process the members of one ensemble: members are
+claimed atomically with lock files (O_CREAT|O_EXCL), leases are renewed periodically by a background
+thread, and the leases of crashed instances expire, so that their members can be claimed again.
+'''
+
+# external imports
+import os, json, time, socket, hashlib, threading, atexit
+
+
+# helper function to check, if a process is still running on this host
+def processAlive(pid):
+  ''' check if a process with the given PID exists (on this host) '''
+  try: os.kill(pid, 0)
+  except ProcessLookupError: return False
+  except PermissionError: return True # exists, but belongs to somebody else
+  return True
+
+
+## the work queue
+class WorkQueue(object):
+  '''
+    A class that manages leases on work items (identified by keys, e.g. run folders) in a shared queue
+    folder; each item has a lock file while it is being processed and a done file, once it is finished.
+    A lease expires, if the lock file has not been renewed for 'lease_time' seconds; locks of processes
+    that no longer exist on the same host are released immediately.
+  '''
+  folder = None # the shared queue folder
+  lease_time = 600. # time after which a lease expires, if it is not renewed (seconds)
+  owner = None # identifier of this instance (host and PID)
+  held = None # dictionary of currently held leases (key -> lock file)
+  _lock = None # lock for the held leases (shared by worker threads)
+  _renewer = None # background thread that renews leases
+  _stop = None # event to stop the background thread
+
+  def __init__(self, folder, lease_time=600., lrenew=True):
+    ''' initialize queue folder; if 'lrenew' is True, leases are renewed by a background thread '''
+    self.folder = folder
+    os.makedirs(folder, exist_ok=True)
+    self.lease_time = float(lease_time)
+    self.host = socket.gethostname(); self.pid = os.getpid()
+    self.owner = '{}:{:d}'.format(self.host, self.pid)
+    self.held = dict(); self._lock = threading.Lock()
+    self._stop = threading.Event()
+    if lrenew:
+      self._renewer = threading.Thread(target=self._renewLeases, name='lease-renewal', daemon=True)
+      self._renewer.start()
+    atexit.register(self.close) # release leases on normal exit
+
+  def _filename(self, key, ext):
+    ''' return the name of the lock or done file of an item (readable prefix and hash of the key) '''
+    name = os.path.basename(os.path.normpath(key))[:40]
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(self.folder, '{}.{}.{}'.format(name, digest, ext))
+
+  def _renewLeases(self):
+    ''' periodically touch all held lock files (runs in a background thread) '''
+    while not self._stop.wait(self.lease_time/4.):
+      self.renew()
+
+  def renew(self):
+    ''' renew all held leases (update the modification time of the lock files) '''
+    with self._lock: lockfiles = list(self.held.values())
+    for lockfile in lockfiles:
+      try: os.utime(lockfile, None)
+      except FileNotFoundError: pass # lease was broken by another instance (should not happen)
+
+  def isDone(self, key):
+    ''' check if an item has been completed (by any instance) '''
+    return os.path.exists(self._filename(key, 'done'))
+
+  def doneRecord(self, key):
+    ''' return the record of a completed item (or None, if it is not done) '''
+    try:
+      with open(self._filename(key, 'done'), 'r') as df: return json.load(df)
+    except (FileNotFoundError, ValueError): return None
+
+  def lockInfo(self, key):
+    ''' return the contents of the lock file of an item (or None, if it is not locked) '''
+    try:
+      with open(self._filename(key, 'lock'), 'r') as lf: return json.load(lf)
+    except (FileNotFoundError, ValueError): return None
+
+  def _lockState(self, lockfile):
+    ''' return the modification time and the contents of a lock file (None, if it does not exist); the 
+        contents are None, if the lock file is incomplete (being written) '''
+    try:
+      mtime = os.stat(lockfile).st_mtime_ns
+      with open(lockfile, 'r') as lf: info = json.load(lf)
+    except FileNotFoundError: return None # released in the meantime
+    except ValueError: info = None
+    return mtime, info
+
+  def _isStale(self, state):
+    ''' check if a lock (state as returned by _lockState) has expired or belongs to a dead process on 
+        this host '''
+    if state is None: return False
+    mtime, info = state
+    if time.time() - mtime/1e9 > self.lease_time: return True
+    if info is None: return False # incomplete lock file (being written)
+    return info.get('host') == self.host and not processAlive(info.get('pid'))
+
+  def _breakLock(self, lockfile, state):
+    ''' break a stale lock (state as observed by _isStale); returns True, if the lock was removed '''
+    # N.B.: only one instance can rename the lock file, but another instance may have broken the stale
+    #       lock and claimed the item since the lock was found stale; the renamed file is therefore 
+    #       checked again and restored, if it is not the lock that was found stale
+    stale_file = '{}.stale.{}.{:d}.{:d}'.format(lockfile, self.host, self.pid, threading.get_ident())
+    try: os.rename(lockfile, stale_file)
+    except FileNotFoundError: return False # somebody else was faster
+    if self._lockState(stale_file) == state:
+      os.remove(stale_file); return True
+    try: os.link(stale_file, lockfile) # restore without replacing a newer lock
+    except FileExistsError: pass
+    os.remove(stale_file)
+    return False
+
+  def claim(self, key):
+    ''' try to claim an item; returns True, if the lease was acquired '''
+    if self.isDone(key): return False
+    lockfile = self._filename(key, 'lock')
+    for _ in range(2): # second attempt after breaking a stale lock
+      try:
+        fd = os.open(lockfile, os.O_CREAT|os.O_EXCL|os.O_WRONLY, 0o644)
+      except FileExistsError:
+        state = self._lockState(lockfile)
+        if not self._isStale(state): return False
+        self._breakLock(lockfile, state)
+        continue
+      with os.fdopen(fd, 'w') as lf:
+        json.dump(dict(key=key, owner=self.owner, host=self.host, pid=self.pid, claimed=time.time()), lf)
+      if self.isDone(key): # completed while we were claiming it
+        os.remove(lockfile); return False
+      with self._lock: self.held[key] = lockfile
+      return True
+    return False
+
+  def claimNext(self, keys):
+    ''' claim the first available item from a list of keys; returns the key or None, if all items are
+        done or claimed by other instances '''
+    for key in keys:
+      if self.claim(key): return key
+    return None
+
+  def release(self, key, ldone=False, **record):
+    ''' release a lease; if 'ldone' is True, the item is marked as done (with an optional record) '''
+    if ldone:
+      record = dict(record, key=key, owner=self.owner, finished=time.time())
+      donefile = self._filename(key, 'done')
+      with open(donefile+'.tmp.'+self.owner, 'w') as df: json.dump(record, df)
+      os.rename(donefile+'.tmp.'+self.owner, donefile)
+    with self._lock: lockfile = self.held.pop(key, None)
+    if lockfile is not None:
+      try: os.remove(lockfile)
+      except FileNotFoundError: pass
+
+  def pending(self, keys):
+    ''' return the keys of items that are not done (claimed or not) '''
+    return [key for key in keys if not self.isDone(key)]
+
+  def close(self):
+    ''' stop lease renewal and release all held leases (items are not marked as done) '''
+    self._stop.set()
+    with self._lock: keys = list(self.held.keys())
+    for key in keys: self.release(key)
@@ -0,0 +1,329 @@
+'''
+Created on Oct 19, 2026
+
+Benchmarks for the orchestration overhead of hgsrun: a synthetic template and stub Grok/HGS executables
+(small Python scripts that write logs, time series and numbered binary output files like the real
+programs, but do hardly any work) are used to time the phases of an ensemble (initialization, run
+folder setup, configuration, Grok, HGS, compression and restart) for different ensemble sizes; the
+timings are therefore dominated by the Python orchestration.
+The benchmarks use the work directory of the unittests (see hgsrun_test.py).
+
+Usage: python hgsrun_bench.py [-m 10 100 1000] [--phases init setup ...] [--ncores N] [--async] [--keep]
+'''
+
+import os, sys, stat, time, json, shutil, argparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+# import test fixtures (work directory and test case name)
+from hgsrun_test import workdir, hgs_testcase
+# import modules to be benchmarked
+from hgsrun.hgs_setup import clearFolder
+from hgsrun.hgs_ensemble import EnsHGS
+from hgsrun.compression import Compressor, bin_pattern
+from hgsrun.misc import RunDirIndex, newtonSummary, newton_file
+
+# benchmark settings
+bench_folder = os.path.join(workdir,'hgsrun_bench') # all benchmark data are stored here
+member_counts = (10,100,1000) # ensemble sizes
+all_phases = ('init','setup','config','grok','run','compress','restart')
+nnodes = 10000 # number of mesh nodes (determines the size of binary output files)
+noutput = 4 # number of output times (numbered binary output files per file type)
+nsteps = 50 # number of time steps between output times (records in time series files)
+runtime = 365*24*60*60 # simulated time in seconds
+hydro_tags = ('outlet','station_1','station_2') # hydrograph files
+input_prefix = 'bench' # prefix for synthetic climate forcing
+
+# Grok configuration of the synthetic template (only the parameters that hgsrun edits)
+grok_template = '''! synthetic Grok configuration for hgsrun benchmarks
+grid generation
+read mesh
+mesh.dat
+end
+use domain type
+porous media
+choose nodes all
+initial head from output file
+init_con/{problem}o.head_pm.0001
+clear chosen nodes
+use domain type
+surface
+choose nodes all
+initial head from output file
+init_con/{problem}o.head_olf.0001
+clear chosen nodes
+initial time
+0.0
+output times
+{runtime:e}
+end
+boundary condition
+type
+rain
+name
+rainfall
+time raster table
+include precip.inc
+end
+boundary condition
+type
+potential evapotranspiration
+name
+pet
+time raster table
+include pet.inc
+end
+'''
+
+# stub Grok executable: writes the mesh files and a log like Grok (the exit banner is the third line
+# from the end)
+grok_stub = '''#!{python:s}
+import os, sys, time
+wall_time = time.time()
+with open('batch.pfx') as f: problem = f.read().strip()
+print(' GROK (stub for hgsrun benchmarks)')
+print(' Reading {{:s}}.grok'.format(problem))
+with open(problem+'o.coordinates_pm', 'wb') as f: f.write(bytes(24*{nnodes:d}))
+with open(problem+'o.elements_pm', 'wb') as f: f.write(bytes(32*{nnodes:d}))
+with open('grok.dbg', 'w') as f: f.write('debug output\\n'*100)
+print(' Number of nodes: {nnodes:d}')
+print(' Elapsed wall time: {{:f}} s'.format(time.time()-wall_time))
+print('---- Normal exit ----'); print(''); print('')
+'''
+
+# stub HGS executable: reads initial and output times from the Grok file, writes time series records
+# (Newton info, water balance, hydrographs) and numbered head and saturation files at each output time,
+# and prints the exit banner (second line from the end); if the environment variable HGS_STUB_STOP is
+# set, the run is aborted (without exit banner) after this fraction of output times
+hgs_stub = '''#!{python:s}
+import os, sys, time, math, array
+wall_time = time.time()
+with open('batch.pfx') as f: problem = f.read().strip()
+with open(problem+'.grok') as f: lines = [line.strip() for line in f if line.strip() and not line.strip().startswith('!')]
+t0 = float(lines[lines.index('initial time')+1])
+i = lines.index('output times') + 1; out_times = []
+while lines[i] != 'end': out_times.append(float(lines[i])); i += 1
+stop = os.getenv('HGS_STUB_STOP'); nstop = int(len(out_times)*float(stop)) if stop else None
+def header(title, variables):
+  return 'TITLE = "{{}}"\\nVARIABLES = {{}}\\nzone t="{{}}"\\n'.format(title, ', '.join('"'+v+'"' for v in variables), title)
+def timeseries(name, title, variables):
+  f = open(name, 'a')
+  if f.tell() == 0: f.write(header(title, variables))
+  return f
+newton = timeseries(problem+'o.newton_info.dat', 'newton_info', ('Time','Time step','Number of iterations'))
+water = timeseries(problem+'o.water_balance.dat', 'water_balance', ('Time','Rainfall','PET','Storage'))
+hydros = [timeseries(problem+'o.hydrograph.'+tag+'.dat', 'hydrograph', ('Time','Surface','Porous media','Total'))
+          for tag in {hydro_tags!r}]
+print(' HydroGeoSphere (stub for hgsrun benchmarks)')
+time_ = t0
+for k,out_time in enumerate(out_times):
+  if nstop is not None and k == nstop:
+    newton.write('{{:14.6e}} {{:14.6e}} {{:4d}}\\n'.format(time_ + (out_time-time_)/2., 1., 3)) # partial
+    print(' Simulation aborted (HGS_STUB_STOP)'); sys.exit(1)
+  dt = (out_time - time_)/{nsteps:d}
+  for n in range({nsteps:d}):
+    time_ += dt
+    newton.write('{{:14.6e}} {{:14.6e}} {{:4d}}\\n'.format(time_, dt, 3 + n%5))
+    water.write('{{:14.6e}} {{:14.6e}} {{:14.6e}} {{:14.6e}}\\n'.format(time_, 1e-3, 5e-4, 1e3 + n))
+    for hydro in hydros: hydro.write('{{:14.6e}} {{:14.6e}} {{:14.6e}} {{:14.6e}}\\n'.format(time_, 1., 2., 3.))
+  for f in [newton, water] + hydros: f.flush()
+  values = array.array('d', (math.sin(0.001*i + k) for i in range({nnodes:d})))
+  for filetype in ('head_pm','head_olf','sat_pm'):
+    with open('{{}}o.{{}}.{{:04d}}'.format(problem, filetype, k+1), 'wb') as f: values.tofile(f)
+  print(' Output time {{:d}} of {{:d}}: {{:e}}'.format(k+1, len(out_times), out_time))
+print(' Elapsed wall time: {{:f}} s'.format(time.time()-wall_time))
+print('---- NORMAL EXIT ----'); print('')
+'''
+
+
+# functions to create the synthetic template and forcing data
+def writeExecutable(filepath, contents):
+  ''' write a script and make it executable '''
+  with open(filepath, 'w') as f: f.write(contents)
+  os.chmod(filepath, os.stat(filepath).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+def createTemplate(folder, problem=hgs_testcase, nnodes=nnodes):
+  ''' create a synthetic template folder with a Grok file, a mesh, static data and stub executables,
+      and a folder with synthetic periodic climate forcing; returns template and forcing folders '''
+  template = os.path.join(folder,'template'); forcing = os.path.join(folder,'climate_forcing')
+  for subfolder in (template,forcing):
+    if os.path.exists(subfolder): shutil.rmtree(subfolder)
+    os.makedirs(subfolder)
+  with open(os.path.join(template,problem+'.grok'), 'w') as f: 
+    f.write(grok_template.format(runtime=runtime, problem=problem))
+  with open(os.path.join(template,'mesh.dat'), 'w') as f:
+    f.writelines('{:d} {:f} {:f}\n'.format(i, i%100, i//100) for i in range(nnodes))
+  for static in ('prop','etprop'): # static data (linked, not copied)
+    os.makedirs(os.path.join(template,static))
+    with open(os.path.join(template,static,'material.'+static), 'w') as f: f.write('k 1e-5\n'*100)
+  os.makedirs(os.path.join(template,'init_con')) # initial conditions (also linked)
+  for filetype in ('head_pm','head_olf'):
+    with open(os.path.join(template,'init_con','{}o.{}.0001'.format(problem,filetype)), 'wb') as f: 
+      f.write(bytes(8*nnodes))
+  writeExecutable(os.path.join(template,'grok.exe'), grok_stub.format(python=sys.executable, nnodes=nnodes))
+  writeExecutable(os.path.join(template,'hgs.exe'), hgs_stub.format(python=sys.executable, nnodes=nnodes,
+                                                                      nsteps=nsteps, hydro_tags=hydro_tags))
+  raster = ''.join('{:f} '.format(0.1*i) + '\n' for i in range(100))
+  for var in ('liqwatflx','pet'):
+    for idx in range(1,13):
+      with open(os.path.join(forcing,'{}_{}_iTime_{:02d}.asc'.format(input_prefix,var,idx)), 'w') as f: f.write(raster)
+  return template, forcing
+
+def createEnsemble(folder, nmember, template, forcing, lrestart=False, loverwrite=True, lreport=False):
+  ''' create an EnsHGS instance with 'nmember' members in 'folder' '''
+  enshgs = EnsHGS(rundir=os.path.join(folder,'{M}'), project=hgs_testcase, runtime=runtime,
+                  output_interval=(noutput,), input_mode='periodic', input_interval='monthly',
+                  input_prefix=input_prefix, input_folder=forcing, NP=1, template_folder=template,
+                  grok_bin='grok.exe', hgs_bin='hgs.exe', M=['m{:04d}'.format(i) for i in range(nmember)],
+                  outer_list=['M'], loverwrite=loverwrite, lrestart=lrestart, lreport=lreport)
+  return enshgs
+
+def compressMember(rundir):
+  ''' compress the binary output of a member (like HGS.finishHGS) '''
+  return Compressor(rundir).finish(RunDirIndex(rundir).glob(bin_pattern), lremove=True)
+
+def interruptMembers(rundirs):
+  ''' mark members as interrupted (like a batch job that was killed while HGS was running) '''
+  for rundir in rundirs:
+    for indicator in ('FAILED','COMPLETED'):
+      if os.path.exists(os.path.join(rundir,indicator)): os.remove(os.path.join(rundir,indicator))
+    open(os.path.join(rundir,'IN_PROGRESS'),'a').close()
+
+def executableTime(rundirs, logfile):
+  ''' return the sum of the wall times that the stub executables report in their logs '''
+  total = 0.
+  for rundir in rundirs:
+    filepath = os.path.join(rundir,logfile)
+    if not os.path.exists(filepath): continue
+    with open(filepath, 'r') as f:
+      for line in f:
+        if line.strip().startswith('Elapsed wall time:'): total += float(line.split()[3])
+  return total
+
+
+## the benchmark
+class EnsembleBenchmark(object):
+  '''
+    A class that runs the phases of an ensemble with stub executables and records the wall time of
+    each phase; the time spent in the stub executables is reported separately, so that the orchestration
+    overhead can be estimated.
+  '''
+  folder = None # benchmark folder
+  nmember = None # number of ensemble members
+  ncores = None # number of cores for parallel execution
+  lasync = False # run HGS with the asyncio supervisor
+
+  def __init__(self, folder, nmember, ncores=None, lasync=False):
+    ''' initialize benchmark for an ensemble size '''
+    self.folder = folder
+    self.nmember = nmember
+    self.ncores = ncores or os.cpu_count()
+    self.lasync = lasync
+    self.template, self.forcing = createTemplate(folder)
+    self.timings = dict(); self.exe_times = dict()
+    self.enshgs = None
+
+  def timePhase(self, phase, fct, *args, **kwargs):
+    ''' execute a phase and record its wall time '''
+    wall_time = time.time()
+    result = fct(*args, **kwargs)
+    self.timings[phase] = time.time() - wall_time
+    return result
+
+  def check(self, ecs, phase):
+    ''' raise an error, if any member failed in a phase '''
+    nfail = sum(1 for ec in ecs if ec)
+    if nfail: raise RuntimeError("{:d} of {:d} members failed in phase '{:s}'".format(nfail, len(ecs), phase))
+
+  def run(self, phases=all_phases):
+    ''' run all phases in order (later phases require the earlier phases) '''
+    ens_folder = os.path.join(self.folder,'ensemble_{:d}'.format(self.nmember))
+    clearFolder(ens_folder)
+    kwargs = dict(lparallel=True, NP=self.ncores)
+    self.enshgs = self.timePhase('init', createEnsemble, ens_folder, self.nmember, self.template, self.forcing)
+    enshgs = self.enshgs
+    if 'setup' in phases:
+      self.check(self.timePhase('setup', enshgs.setupRundir, lthreads=True, bin_folder=None, **kwargs), 'setup')
+    if 'config' in phases:
+      self.check(self.timePhase('config', enshgs.setupConfig, lthreads=True, **kwargs), 'config')
+    if 'grok' in phases:
+      self.check(self.timePhase('grok', enshgs.runGrok, lerror=True, **kwargs), 'grok')
+      self.exe_times['grok'] = executableTime(enshgs.rundirs, 'log.grok')
+    if 'run' in phases:
+      if self.lasync:
+        ecs = self.timePhase('run', enshgs.runAsync, ncores=self.ncores, callback=None, skip_config=True,
+                             skip_grok=True, lcompress=False)
+      else:
+        ecs = self.timePhase('run', enshgs.runHGS, ncores=self.ncores, skip_config=True, skip_grok=True,
+                             lcompress=False, **kwargs)
+      self.check(ecs, 'run')
+      self.exe_times['run'] = executableTime(enshgs.rundirs, 'log.hgs_run')
+    if 'compress' in phases:
+      def compressAll():
+        with ThreadPoolExecutor(max_workers=self.ncores) as executor:
+          return list(executor.map(compressMember, enshgs.rundirs))
+      self.timePhase('compress', compressAll)
+    if 'restart' in phases: self.runRestart(phases=phases)
+    return self.timings
+
+  def runRestart(self, phases=all_phases):
+    ''' run a separate ensemble, interrupt HGS half-way and time the restart (initialization with state
+        probing, configuration with restart rewrite, Grok, HGS and concatenation of output) '''
+    ens_folder = os.path.join(self.folder,'restart_{:d}'.format(self.nmember))
+    clearFolder(ens_folder)
+    kwargs = dict(lparallel=True, NP=self.ncores)
+    enshgs = createEnsemble(ens_folder, self.nmember, self.template, self.forcing)
+    os.environ['HGS_STUB_STOP'] = '0.5'
+    try: enshgs.runSimulations(lsetup=True, lgrok=True, ncores=self.ncores, lcompress=False, lerror=False, 
+                               bin_folder=None, **kwargs)
+    except Exception: pass # all members fail
+    finally: del os.environ['HGS_STUB_STOP']
+    interruptMembers(enshgs.rundirs)
+    def restart():
+      enshgs = createEnsemble(ens_folder, self.nmember, self.template, self.forcing, lrestart=True, loverwrite=False)
+      return enshgs.runSimulations(lsetup=True, lgrok=True, ncores=self.ncores, lcompress='compress' in phases,
+                                   bin_folder=None, **kwargs)
+    self.timePhase('restart', restart)
+    # check that restarted output is complete
+    summary = newtonSummary(os.path.join(enshgs.rundirs[0],newton_file.format(PROBLEM=hgs_testcase)))
+    if not np.isclose(summary['end_time'], runtime): raise RuntimeError(summary)
+    self.exe_times['restart'] = executableTime(enshgs.rundirs, 'log.hgs_run')
+
+  def report(self):
+    ''' return a formatted table with the timings of all phases '''
+    lines = ['{:d} members ({:d} cores):'.format(self.nmember, self.ncores),
+             '  {:10s} {:>10s} {:>12s} {:>12s}'.format('phase','total [s]','member [ms]','stubs [s]')]
+    for phase in all_phases:
+      if phase not in self.timings: continue
+      exe_time = self.exe_times.get(phase)
+      lines.append('  {:10s} {:10.3f} {:12.2f} {:>12s}'.format(phase, self.timings[phase],
+                   1000.*self.timings[phase]/self.nmember, '' if exe_time is None else '{:.3f}'.format(exe_time)))
+    return '\n'.join(lines)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Benchmark the orchestration overhead of hgsrun with stub executables.")
+    parser.add_argument('-m', '--members', dest='members', nargs='+', type=int, default=list(member_counts),
+                        help="ensemble sizes [default: %(default)s]")
+    parser.add_argument('--phases', dest='phases', nargs='+', default=list(all_phases), choices=all_phases,
+                        help="phases to benchmark [default: all]")
+    parser.add_argument('--ncores', dest='ncores', type=int, default=None,
+                        help="number of cores for parallel execution [default: all]")
+    parser.add_argument('--async', dest='lasync', action='store_true',
+                        help="run HGS with the asyncio supervisor [default: %(default)s]")
+    parser.add_argument('--json', dest='json', default=None, type=str,
+                        help="write timings to a JSON file [default: %(default)s]")
+    parser.add_argument('--keep', dest='keep', action='store_true',
+                        help="keep benchmark folders [default: %(default)s]")
+    args = parser.parse_args()
+
+    results = dict()
+    for nmember in args.members:
+      benchmark = EnsembleBenchmark(bench_folder, nmember, ncores=args.ncores, lasync=args.lasync)
+      benchmark.run(phases=args.phases)
+      print(benchmark.report()); print('')
+      results[nmember] = dict(timings=benchmark.timings, exe_times=benchmark.exe_times, ncores=benchmark.ncores)
+      if not args.keep: shutil.rmtree(bench_folder)
+    if args.json:
+      with open(args.json, 'w') as f: json.dump(results, f, indent=1)
@@ -23,7 +23,24 @@ except NameError:
 # import modules to be tested
 from hgsrun.hgs_setup import lWin, clearFolder
 from hgsrun.hgs_setup import Grok, GrokError, HGS, HGSError
-from hgsrun.hgs_ensemble import EnsHGS, EnsembleError
+from hgsrun.hgs_ensemble import EnsHGS, EnsembleError, EnsembleWrapper, memberSpec, mergeState, apply_method,\
+  memberState
+from hgsrun.state_db import StateDB
+from hgsrun.work_queue import WorkQueue
+from hgsrun.staging import Stager
+from hgsrun.forcing_cache import ForcingCache
+from hgsrun.compression import Compressor, archiveMembers, readMember
+from hgsrun.input_list import rewriteInputFilelist
+from hgsrun.scheduler import CoreScheduler, Job
+from hgsrun.history import RunHistory, longestFirst
+from hgsrun.supervisor import superviseProcess
+from hgsrun.monitor import MemberMonitor, formatStatus
+from hgsrun.watchdog import Watchdog
+from hgsrun.misc import materializeFolder, breakLink, GrokLines, loadGrokFile, RunDirIndex,\
+  numberedPattern, binaryFiles, timeseriesFiles, firstRecord, lastRecord
+from hgsrun import grok_cache
+from hgsrun.autotune import Autotuner, candidateSettings
+from hgsrun.affinity import CoreSet, parseCPUList, numaNodes, launchCommand
 
 # work directory settings ("global" variable)
 data_root = os.getenv('HGS_ROOT', '')
@@ -503,6 +520,19 @@ class EnsHGSTest(unittest.TestCase):
         hgslog = '{0}/log.hgs_run'.format(rundir)
         assert os.path.isfile(hgslog), hgslog
 
+  def testRunPipeline(self):
+    ''' test pipelined execution of the ensemble (setup, Grok and HGS without phase barriers) '''
+    enshgs = self.enshgs
+    assert all(not g for g in enshgs.HGSOK), enshgs.HGSOK
+    # setup run folders and run Grok and HGS for each member independently
+    enshgs.runSimulations(lsetup=True, lpipeline=True, loverwrite=loverwrite, skip_grok=not lbin, lparallel=True, 
+                          NP=NP, runtime_override=120, ldryrun=not lbin, lcompress=not lWin)
+    assert not lbin or all(g for g in enshgs.HGSOK), enshgs.HGSOK
+    for rundir in enshgs.rundirs:
+      assert os.path.isdir(rundir), rundir
+      hgslog = '{0}/log.hgs_run'.format(rundir)
+      assert os.path.isfile(hgslog), hgslog
+
   def testSetupExp(self):
     ''' test experiment setup '''
     enshgs = self.enshgs
@@ -528,6 +558,819 @@ class EnsHGSTest(unittest.TestCase):
       assert os.path.exists(grok_bin), grok_bin
 
 
+## a base class for tests that need clean folders in the work directory
+class FolderTestCase(unittest.TestCase):  
+  '''
+    A base class for tests that work in their own folders in the work directory: the folders listed in 
+    'test_folders' are removed (if they exist) and created (if 'lcreate' is True) in setUp, and removed 
+    again in tearDown; the absolute paths are stored in 'self.folders' and the first folder in 'self.folder'.
+  '''
+  test_folders = () # names of the test folders (relative to the work directory)
+  lcreate = True # create empty test folders in setUp
+  
+  def setUp(self):
+    ''' provide clean test folders '''
+    self.folders = [os.path.join(workdir,folder) for folder in self.test_folders]
+    for folder in self.folders:
+      if os.path.exists(folder): shutil.rmtree(folder)
+      if self.lcreate: os.makedirs(folder)
+    self.folder = self.folders[0] if self.folders else None
+    
+  def tearDown(self):
+    ''' clean up '''
+    for folder in self.folders: 
+      if os.path.exists(folder): shutil.rmtree(folder)
+
+
+## tests for the job scheduler
+def sleepJob(idx, duration):
+  ''' a dummy job that just sleeps (needs to be defined at module level for pickling) '''
+  import time
+  tic = time.time(); time.sleep(duration)
+  return idx, tic, time.time()
+
+class SchedulerTest(unittest.TestCase):  
+  
+  def testBackfill(self):
+    ''' test that small jobs are started while large jobs wait for cores '''
+    jobs = [Job(0, args=(0,0.5), ncpu=3), Job(1, args=(1,0.5), ncpu=3), Job(2, args=(2,0.1), ncpu=1)]
+    results = CoreScheduler(ncores=4, lbackfill=True).run(sleepJob, jobs)
+    assert [r[0] for r in results] == [0,1,2], results
+    # job 2 fits next to job 0, job 1 has to wait for job 0
+    assert results[2][1] < results[0][2], results
+    assert results[1][1] >= results[0][2], results
+    
+  def testFirstFit(self):
+    ''' test strict first-fit ordering and oversized jobs '''
+    jobs = [Job(0, args=(0,0.2), ncpu=3), Job(1, args=(1,0.2), ncpu=8), Job(2, args=(2,0.1), ncpu=1)]
+    results = CoreScheduler(ncores=4, lbackfill=False).run(sleepJob, jobs)
+    # job 1 needs the whole node and job 2 has to wait for it
+    assert results[1][1] >= results[0][2], results
+    assert results[2][1] >= results[1][2], results
+    
+  def testPriority(self):
+    ''' test that jobs with higher priority (longer predicted run time) are started first '''
+    jobs = [Job(0, args=(0,0.1), priority=None), Job(1, args=(1,0.1), priority=10.), Job(2, args=(2,0.1), priority=5.)]
+    results = CoreScheduler(ncores=1).run(sleepJob, jobs)
+    assert [r[0] for r in results] == [0,1,2], results # results in submission order
+    assert results[1][2] <= results[2][1] and results[2][2] <= results[0][1], results
+
+  def testDependencies(self):
+    ''' test that dependent jobs start after their parents, while independent jobs keep cores busy '''
+    def prepare(job, results): job.args = (job.idx, results[0][2] - results[0][1]) # duration of parent
+    jobs = [Job(0, args=(0,0.3)), Job(1, args=(1,0.), depends=(0,), prepare=prepare), Job(2, args=(2,0.1)),
+            Job(3, args=(3,0.1), depends=(2,), prepare=lambda job, results: False), Job(4, args=(4,0.1), depends=(3,))]
+    results = CoreScheduler(ncores=2).run(sleepJob, jobs)
+    assert results[1][1] >= results[0][2] and results[1][2] - results[1][1] >= 0.3, results
+    assert results[2][2] <= results[0][2], results # independent job ran next to the parent
+    assert results[3] is None and results[4] is None, results # skipped
+
+
+## tests for the transfer of member state between processes
+class DummyMember(object):
+  ''' a minimal ensemble member with a large configuration attribute '''
+  _lines = None
+  def __init__(self, rundir):
+    self.rundir = rundir; self.configOK = True; self.HGSOK = None
+    self._lines = ['line'] * 100000
+  def runHGS(self):
+    self.HGSOK = self._lines is None # configuration should not be transferred
+    return 0
+
+class StateTest(unittest.TestCase):  
+  
+  def testMemberSpec(self):
+    ''' test compact member specification and merging of status records '''
+    member = DummyMember(rundir=workdir)
+    klass, atts = memberSpec(member)
+    assert klass is DummyMember and '_lines' not in atts, atts
+    record = apply_method((klass, atts), 'runHGS')
+    assert record['ec'] == 0 and record['rundir'] == workdir and record['wall_time'] >= 0, record
+    assert len(record['state']) < 5, record['state'] # only small state attributes
+    mergeState(member, record)
+    assert member.HGSOK is True and len(member._lines) == 100000
+    
+  def testThreads(self):
+    ''' test execution of member methods in worker threads (members are modified in place) '''
+    class DummyEnsemble(object): 
+      members = [DummyMember(rundir='{}/member_{:d}'.format(workdir,i)) for i in range(4)]
+    records = []
+    ecs = EnsembleWrapper(DummyEnsemble, 'runHGS')(lparallel=True, NP=2, lthreads=True, callback=records.append)
+    assert ecs == (0,0,0,0) and len(records) == 4, records
+    assert all(member.HGSOK is False for member in DummyEnsemble.members) # configuration was not removed
+
+
+## tests for the asyncio process supervisor
+class SupervisorTest(unittest.TestCase):  
+  
+  def testSuperviseProcess(self):
+    ''' test streaming of output into log files and detection of exit banner and errors '''
+    import asyncio
+    logfile = os.path.join(workdir,'log.supervisor_test')
+    script = 'echo "output"; echo "forrtl: severe (174): SIGSEGV" >&2; echo " ---- NORMAL EXIT ---- "; echo "done"'
+    report = asyncio.run(superviseProcess(['sh','-c',script], cwd=workdir, logfile=logfile, 
+                                          exit_banner='---- NORMAL EXIT ----'))
+    assert report['returncode'] == 0 and report['lexit'], report
+    assert len(report['errors']) == 1 and 'severe' in report['errors'][0], report
+    with open(logfile, 'r') as lf: lines = lf.readlines()
+    assert len(lines) == 4 and lines[-1].strip() == 'done', lines
+    os.remove(logfile)
+
+
+## tests for the progress monitor
+class MonitorTest(FolderTestCase):  
+  test_folders = ('monitor_test',)
+  
+  def setUp(self):
+    ''' create a fake run folder with Grok file and the beginning of a Newton log '''
+    super(MonitorTest,self).setUp()
+    self.rundir = self.folder
+    with open(os.path.join(self.rundir,'batch.pfx'), 'w') as f: f.write('test')
+    with open(os.path.join(self.rundir,'test.grok'), 'w') as f: 
+      f.write('output times\n5.0e+01\n1.0e+02\nend\n')
+    self.newton_file = os.path.join(self.rundir,'testo.newton_info.dat')
+    with open(self.newton_file, 'w') as f:
+      f.write('Title = "Newton iteration information"\n')
+      f.write('VARIABLES = "Time", "Time step", "Number of iterations"\nzone t="newton_info"\n')
+      f.write('1.0 1.0 4\n3.0 2.0 6\n')
+    
+  def testIncremental(self):
+    ''' test incremental reading of the Newton log and derived metrics '''
+    monitor = MemberMonitor(self.rundir)
+    status = monitor.update()
+    assert status['nsteps'] == 2 and status['sim_time'] == 3. and status['end_time'] == 100., status
+    assert status['dt'] == 1.5 and status['iters'] == 5., status
+    offset = monitor.newton.offset
+    # append a complete and an incomplete record; only the complete record should be read
+    with open(self.newton_file, 'a') as f: f.write('7.0 4.0 2\n11.0 4.')
+    status = monitor.update()
+    assert status['nsteps'] == 3 and status['sim_time'] == 7. and status['progress'] == 0.07, status
+    assert monitor.newton.offset == offset + len('7.0 4.0 2\n'), monitor.newton.offset
+    assert len(formatStatus([status]).splitlines()) == 3
+
+  def testTail(self):
+    ''' test first/last record queries and skipping to the end of a long Newton log '''
+    with open(self.newton_file, 'w') as f:
+      f.write('Title = "Newton iteration information"\n')
+      f.write('VARIABLES = "Time", "Time step", "Number of iterations"\nzone t="newton_info"\n')
+      f.writelines(['{:14.6e} {:14.6e} {:4d}\n'.format(2.*(i+1),2.,i%10) for i in range(1000)]) # fixed width
+      f.write('  2.002000e+03 2.') # incomplete
+    assert firstRecord(self.newton_file) == [2.,2.,0.] and lastRecord(self.newton_file) == [2000.,2.,9.]
+    assert lastRecord(self.newton_file, nrec=2) == [[1998.,2.,8.],[2000.,2.,9.]]
+    monitor = MemberMonitor(self.rundir, nwindow=10)
+    status = monitor.update()
+    assert status['nsteps'] == 1000 and status['sim_time'] == 2000. and status['iters'] == 4.5, status
+    assert monitor.newton.first == [2.,2.,0.] and monitor.newton.column('time_step') == 1
+    assert status['progress'] == 1., status
+
+  def testWellRecords(self):
+    ''' test that the last zone of an observation well file is only returned, once it is complete '''
+    well_file = os.path.join(self.rundir,'testo.observation_well_flow.well_1.dat')
+    with open(well_file, 'w') as f:
+      f.write('TITLE = "Observation well"\nVARIABLES = "X", "Y", "Z", "H"\n')
+      for time in (10.,20.):
+        f.write('ZONE T="well_1", SOLUTIONTIME={:e}\n'.format(time))
+        f.writelines(['0.0 0.0 {:.1f} 1.0\n'.format(z) for z in range(3)])
+      f.write('ZONE T="well_1", SOLUTIONTIME=3.000000e+01\n0.0 0.0 0.0 1.0\n') # incomplete zone
+    assert firstRecord(well_file, lwell=True) == [10.] and lastRecord(well_file, lwell=True) == [20.]
+    assert lastRecord(well_file, lwell=True, nrec=3) == [[10.],[20.]]
+    with open(well_file, 'a') as f: f.write('0.0 0.0 1.0 1.0\n0.0 0.0 2.0 1.0\n') # complete zone
+    assert lastRecord(well_file, lwell=True, nrec=2) == [[20.],[30.]]
+
+
+## tests for the watchdog
+class WatchdogTest(MonitorTest):  
+  
+  def testPolicies(self):
+    ''' test detection of missing progress and small time steps '''
+    watch = Watchdog(max_idle=1., min_dt=0.5, min_dt_steps=2).watch(self.newton_file, now=0.)
+    assert watch.check(now=30.) is None # two records with large time steps
+    assert watch.check(now=100.) is not None # no progress for more than a minute
+    with open(self.newton_file, 'a') as f: f.write('3.1 0.1 12\n3.2 0.1 14\n')
+    reason = watch.check(now=110.)
+    assert reason is not None and 'time step' in reason, reason
+    
+  def testTerminate(self):
+    ''' test that a stalled process is terminated '''
+    watchdog = Watchdog(max_idle=0.002, poll_interval=0.05, grace=1.)
+    proc = subprocess.Popen(['sleep','30'])
+    reason = watchdog.superviseProcess(proc, self.newton_file)
+    assert reason is not None and proc.returncode is not None, reason
+
+
+## tests for run folder materialization
+class MaterializeTest(FolderTestCase):  
+  test_folders = ('materialize_template','materialize_run')
+  
+  def setUp(self):
+    ''' create a small template folder '''
+    super(MaterializeTest,self).setUp()
+    self.template, self.rundir = self.folders
+    os.makedirs(os.path.join(self.template,'mesh'))
+    for filename in ('mesh/nodes.dat','test.grok','precip.inc','parallelindx.dat'):
+      with open(os.path.join(self.template,filename), 'w') as f: f.write(filename)
+    os.symlink('mesh/nodes.dat', os.path.join(self.template,'nodes_link'))
+    
+  def testLink(self):
+    ''' test hardlinking of static files and copying of files that will be rewritten '''
+    manifest = materializeFolder(self.template, self.rundir, mode='link', ignore=shutil.ignore_patterns('*.grok*'))
+    assert manifest == {'mesh/nodes.dat':'link', 'precip.inc':'copy', 'parallelindx.dat':'copy', 
+                        'nodes_link':'symlink'}, manifest
+    nodes = os.path.join(self.rundir,'mesh/nodes.dat')
+    assert os.stat(nodes).st_nlink == 2 and os.path.islink(os.path.join(self.rundir,'nodes_link'))
+    # break link before writing
+    assert breakLink(nodes) and os.stat(nodes).st_nlink == 1
+    assert os.stat(os.path.join(self.template,'mesh/nodes.dat')).st_nlink == 1
+
+
+## tests for the member state database
+class StateDBTest(FolderTestCase):  
+  test_folders = ('state_run_0','state_run_1')
+  
+  def setUp(self):
+    ''' create a fresh database and two run folders '''
+    super(StateDBTest,self).setUp()
+    self.db_file = os.path.join(workdir,'test_states.sqlite')
+    for suffix in ('','-wal','-shm'):
+      if os.path.exists(self.db_file+suffix): os.remove(self.db_file+suffix)
+    self.rundirs = self.folders
+    
+  def testTransitions(self):
+    ''' test recording and querying of state transitions '''
+    db = StateDB(self.db_file)
+    run0, run1 = self.rundirs
+    db.setState(run0, 'SCHEDULED'); db.setState(run0, 'IN_PROGRESS'); db.setState(run1, 'SCHEDULED')
+    db.setState(run0, 'COMPLETED', ec=0, wall_time=10.)
+    assert db.getState(run0) == 'COMPLETED' and db.getState(os.path.join(workdir,'missing')) is None
+    assert db.counts() == {'COMPLETED':1, 'SCHEDULED':1}, db.counts()
+    record = db.records(rundirs=[run0])[0]
+    assert record['ec'] == 0 and record['wall_time'] == 10. and record['finished'] >= record['started'], record
+    assert [h['state'] for h in db.history(run0)] == ['SCHEDULED','IN_PROGRESS','COMPLETED']
+    self.assertRaises(ValueError, db.setState, run0, 'UNKNOWN')
+    # the database takes precedence over indicator files
+    open(os.path.join(run1,'FAILED'),'a').close()
+    assert memberState(run1) == 'FAILED' and memberState(run1, db.states()) == 'SCHEDULED'
+
+
+## tests for the shared work queue
+def queueWorker(queue_folder, keys, log_folder):
+  ''' claim and 'run' items from a work queue in a separate process (logs the PID for each item) '''
+  import time
+  queue = WorkQueue(queue_folder, lease_time=5.)
+  while True:
+    key = queue.claimNext(keys)
+    if key is None: break
+    with open(os.path.join(log_folder,key),'a') as f: f.write('{:d}\n'.format(os.getpid()))
+    time.sleep(0.01)
+    queue.release(key, ldone=True, ec=0)
+  queue.close()
+
+def staleClaimer(queue_folder, key, barrier, log_folder):
+  ''' claim an item with a stale lock at the same time as other processes (logs the PID, if successful) '''
+  queue = WorkQueue(queue_folder, lease_time=60., lrenew=False)
+  barrier.wait()
+  if queue.claim(key):
+    with open(os.path.join(log_folder,key),'a') as f: f.write('{:d}\n'.format(os.getpid()))
+    queue.release(key, ldone=True) # keep other processes from claiming it after release
+  queue.close()
+
+class WorkQueueTest(FolderTestCase):  
+  test_folders = ('work_queue','work_queue_logs')
+  
+  def setUp(self):
+    ''' create an empty queue folder and a folder for worker logs '''
+    super(WorkQueueTest,self).setUp()
+    self.queue_folder, self.log_folder = self.folders
+    
+  def testProcesses(self):
+    ''' test that several processes claim each item exactly once '''
+    import multiprocessing
+    keys = ['member_{:02d}'.format(i) for i in range(20)]
+    workers = [multiprocessing.Process(target=queueWorker, args=(self.queue_folder, keys, self.log_folder)) 
+               for _ in range(4)]
+    for worker in workers: worker.start()
+    for worker in workers: worker.join()
+    queue = WorkQueue(self.queue_folder, lrenew=False)
+    assert queue.pending(keys) == [] and sorted(os.listdir(self.log_folder)) == keys
+    for key in keys:
+      with open(os.path.join(self.log_folder,key)) as f: assert len(f.readlines()) == 1, key
+    assert not any(filename.endswith('.lock') for filename in os.listdir(self.queue_folder))
+    
+  def testStaleLease(self):
+    ''' test that leases of crashed instances are released '''
+    import json
+    queue = WorkQueue(self.queue_folder, lease_time=60., lrenew=False)
+    assert queue.claim('run_1') and not queue.claim('run_1') # held by this process
+    # lock of a dead process on this host
+    pid = subprocess.Popen(['true']); pid.wait()
+    with open(queue._filename('run_2','lock'),'w') as f: json.dump(dict(host=queue.host, pid=pid.pid), f)
+    assert queue.claim('run_2')
+    # expired lock from another host
+    lockfile = queue._filename('run_3','lock')
+    with open(lockfile,'w') as f: json.dump(dict(host='other', pid=1), f)
+    assert not queue.claim('run_3')
+    os.utime(lockfile, (0,0))
+    assert queue.claim('run_3') and queue.lockInfo('run_3')['owner'] == queue.owner
+    # completed items can not be claimed again
+    queue.release('run_1', ldone=True, ec=0)
+    assert queue.isDone('run_1') and not queue.claim('run_1')
+    queue.close()
+    assert queue.lockInfo('run_2') is None and queue.pending(['run_1','run_2']) == ['run_2']
+
+  def testStaleRace(self):
+    ''' test that only one of several instances that find the same lock stale can claim the item '''
+    import json, multiprocessing
+    queue_a = WorkQueue(self.queue_folder, lease_time=60., lrenew=False)
+    queue_b = WorkQueue(self.queue_folder, lease_time=60., lrenew=False)
+    lockfile = queue_a._filename('run_1','lock')
+    with open(lockfile,'w') as f: json.dump(dict(host='other', pid=1), f)
+    os.utime(lockfile, (0,0))
+    # B finds the lock stale, but A breaks it and claims the item first
+    state = queue_b._lockState(lockfile)
+    assert queue_b._isStale(state)
+    assert queue_a.claim('run_1')
+    info = queue_a.lockInfo('run_1')
+    assert not queue_b._breakLock(lockfile, state) # B must not remove the fresh lock of A
+    assert queue_a.lockInfo('run_1') == info and not queue_b.claim('run_1')
+    assert sorted(os.listdir(self.queue_folder)) == [os.path.basename(lockfile)] # no leftover files
+    queue_a.close(); queue_b.close()
+    # several processes race for the same stale lock
+    for i in range(5):
+      key = 'run_{:d}'.format(i+2)
+      lockfile = queue_a._filename(key,'lock')
+      with open(lockfile,'w') as f: json.dump(dict(host='other', pid=1), f)
+      os.utime(lockfile, (0,0))
+      barrier = multiprocessing.Barrier(8)
+      workers = [multiprocessing.Process(target=staleClaimer, args=(self.queue_folder, key, barrier, self.log_folder)) 
+                 for _ in range(8)]
+      for worker in workers: worker.start()
+      for worker in workers: worker.join()
+      with open(os.path.join(self.log_folder,key)) as f: assert len(f.readlines()) == 1, key
+
+  def testRunQueue(self):
+    ''' test that members claimed by a crashed instance are run, once their leases expire '''
+    import json
+    class QueueMember(DummyMember):
+      def runPipeline(self, **kwargs): return 0
+    class DummyEnsemble(object):
+      lreport = False; work_queue = self.queue_folder; depends = None
+      members = [QueueMember(rundir=os.path.join(workdir,'queue_member_{:d}'.format(i))) for i in range(3)]
+    rundirs = [member.rundir for member in DummyEnsemble.members]
+    queue = WorkQueue(self.queue_folder, lrenew=False)
+    with open(queue._filename(rundirs[1],'lock'),'w') as f: json.dump(dict(host='other', pid=1), f) # crashed
+    assert EnsHGS.runQueue(DummyEnsemble(), NP=2, lease_time=0.5, llongest=False) == 0
+    assert queue.pending(rundirs) == [] and queue.doneRecord(rundirs[1])['owner'] == queue.owner
+    queue.close()
+
+
+## tests for dependencies between ensemble members
+class DependencyTest(FolderTestCase):  
+  test_folders = ('spinup',)
+  
+  def setUp(self):
+    ''' create a parent run folder with head output files '''
+    super(DependencyTest,self).setUp()
+    self.rundir = self.folder
+    for filename in ('testo.head_pm.0001','testo.head_olf.0001','testo.head_pm.0002','testo.head_olf.0002',
+                     'testo.head_pm.0003'):
+      open(os.path.join(self.rundir,filename),'w').close()
+    
+  def testLastOutput(self):
+    ''' test initial conditions from the last complete set of head files (also from the archive) '''
+    hgs = HGS(rundir=self.rundir, project='test', length=24, input_interval='monthly', input_mode='steady-state')
+    ic_pattern = os.path.join(os.path.abspath(self.rundir),'testo.{FILETYPE}.0002')
+    assert hgs.lastOutput() == ic_pattern, hgs.lastOutput()
+    # compress output like finishHGS
+    bin_files = sorted(os.listdir(self.rundir))
+    subprocess.check_call(['tar','czf','binary_fields.tgz'] + bin_files, cwd=self.rundir)
+    for filename in bin_files: os.remove(os.path.join(self.rundir,filename))
+    assert hgs.lastOutput() == ic_pattern
+    assert os.path.exists(ic_pattern.format(FILETYPE='head_olf')) # extracted
+    os.remove(os.path.join(self.rundir,'binary_fields.tgz'))
+    os.remove(ic_pattern.format(FILETYPE='head_olf'))
+    self.assertRaises(HGSError, hgs.lastOutput)
+
+
+## tests for concatenation of output from restarted simulations
+class ConcatTest(FolderTestCase):  
+  test_folders = ('concat',)
+  
+  def setUp(self):
+    ''' create a run folder with two restart folders and output from three segments '''
+    super(ConcatTest,self).setUp()
+    self.rundir = self.folder
+    segments = [os.path.join(self.rundir,'restart_0001'),os.path.join(self.rundir,'restart_0002'),self.rundir]
+    for segment in segments[:2]: os.makedirs(segment)
+    # segments: initial time, time-series records (the first two segments ran past the restart time)
+    for segment,t0,times in zip(segments,(0,3,6),((1,2,3,4),(4,5,6,7),(7,8,9))):
+      with open(os.path.join(segment,'test.grok'),'w') as f: f.write('initial time\n{:e}\n'.format(t0))
+      with open(os.path.join(segment,'testo.newton_info.dat'),'w') as f:
+        f.write('TITLE = "Newton"\nVARIABLES = "Time", "Iterations"\nzone t="newton"\n')
+        f.writelines(['{:e} {:d}\n'.format(t,i) for i,t in enumerate(times)])
+      with open(os.path.join(segment,'testo.observation_well_flow.W1.dat'),'w') as f:
+        f.write('TITLE = "Well"\nVARIABLES = "H", "Z"\n')
+        for t in times: f.write('ZONE T="{0:e}", SOLUTIONTIME={0:e}\n{0:e} 1.\n{0:e} 2.\n'.format(t))
+      # head output up to the restart time (and one more non-head file in the first segment)
+      for i in range(1 if segment == self.rundir else 3):
+        for filetype in ('head_pm','head_olf'):
+          with open(os.path.join(segment,'testo.{}.{:04d}'.format(filetype,i+1)),'w') as f: f.write(str(t0+i+1))
+    open(os.path.join(segments[0],'testo.sat_pm.0004'),'w').close()
+    with open(os.path.join(self.rundir,'testo.newton_info.dat'),'a') as f: f.write('1.0e+01') # incomplete
+    
+  def testConcat(self):
+    ''' test concatenation of time-series files at restart times and renumbering of binary output '''
+    hgs = HGS(rundir=self.rundir, project='test', length=24, input_interval='monthly', input_mode='steady-state')
+    hgs.concatOutput(nthreads=2)
+    with open(os.path.join(self.rundir,'testo.newton_info.dat')) as f: lines = f.readlines()
+    assert len(lines) == 3+9 and lines[0].startswith('TITLE'), lines
+    assert [float(line.split()[0]) for line in lines[3:]] == list(range(1,10)), lines
+    with open(os.path.join(self.rundir,'testo.observation_well_flow.W1.dat')) as f: lines = f.readlines()
+    zones = [line for line in lines if line.startswith('ZONE')]
+    assert len(lines) == 2+3*9 and len(zones) == 9 and zones[3].endswith('SOLUTIONTIME=4.000000e+00\n'), lines
+    # binary output is numbered continuously
+    for i in range(7):
+      with open(os.path.join(self.rundir,'testo.head_olf.{:04d}'.format(i+1))) as f: assert f.read() == str(i+1)
+    assert not os.path.exists(os.path.join(self.rundir,'testo.head_pm.0008'))
+    assert not os.path.exists(os.path.join(self.rundir,'testo.sat_pm.0004'))
+    assert os.path.samefile(os.path.join(self.rundir,'testo.head_pm.0004'),
+                            os.path.join(self.rundir,'restart_0002','testo.head_pm.0001'))
+
+
+## tests for staging on node-local scratch space
+class StagingTest(FolderTestCase):  
+  test_folders = ('staging','scratch')
+  
+  def setUp(self):
+    ''' create a run folder with a relative link to a sibling folder and a scratch folder '''
+    super(StagingTest,self).setUp()
+    self.scratch = self.folders[1]
+    self.rundir = os.path.join(self.folder,'hgs_run')
+    os.makedirs(self.rundir); os.makedirs(os.path.join(self.folder,'climate_forcing'))
+    open(os.path.join(self.folder,'climate_forcing','pet.inc'),'w').close()
+    with open(os.path.join(self.rundir,'test.grok'),'w') as f: f.write('../climate_forcing/pet.inc\n')
+    os.symlink('../climate_forcing', os.path.join(self.rundir,'inc'))
+    open(os.path.join(self.rundir,'IN_PROGRESS'),'w').close()
+    
+  def testStaging(self):
+    ''' test stage-in, background stage-out of stable files and final synchronization '''
+    stager = Stager(self.rundir, scratch=self.scratch, interval=3600., checkpoints=('testo.head_*',), 
+                    journals=('testo.newton_info.dat',))
+    stage_dir = stager.stageIn()
+    assert os.path.isfile(os.path.join(stage_dir,'test.grok')) and not os.path.islink(os.path.join(stage_dir,'test.grok'))
+    # relative paths still work
+    assert os.path.isfile(os.path.join(stage_dir,'inc','pet.inc'))
+    assert os.path.isfile(os.path.join(stage_dir,'..','climate_forcing','pet.inc'))
+    assert stager.translate(os.path.join(self.rundir,'hgs.x')) == os.path.join(stage_dir,'hgs.x')
+    # 'run' in the staged folder
+    for filename in ('testo.head_pm.0001','testo.newton_info.dat','testo.sat_pm.0001'):
+      with open(os.path.join(stage_dir,filename),'w') as f: f.write('output')
+    assert stager.sync() == ['testo.newton_info.dat'] # journals are copied immediately
+    assert stager.sync() == ['testo.head_pm.0001','testo.sat_pm.0001'] # checkpoints first, once stable
+    with open(os.path.join(stage_dir,'testo.newton_info.dat'),'a') as f: f.write('more')
+    open(os.path.join(stage_dir,'COMPLETED'),'w').close() # indicators are not copied
+    assert stager.stageOut() == [] and not os.path.exists(stage_dir)
+    with open(os.path.join(self.rundir,'testo.newton_info.dat')) as f: assert f.read() == 'outputmore'
+    assert not os.path.exists(os.path.join(self.rundir,'COMPLETED'))
+
+
+## tests for the node-local forcing cache
+class ForcingCacheTest(FolderTestCase):  
+  test_folders = ('forcing_test',)
+  
+  def setUp(self):
+    ''' create a forcing folder and a run folder with an include file '''
+    super(ForcingCacheTest,self).setUp()
+    self.rundir = os.path.join(self.folder,'hgs_run'); self.cache_folder = os.path.join(self.folder,'cache')
+    os.makedirs(self.rundir); os.makedirs(os.path.join(self.folder,'climate_forcing'))
+    with open(os.path.join(self.rundir,'pet.inc'),'w') as inc:
+      for i in range(3):
+        filename = 'pet_iTime_{:02d}.asc'.format(i+1)
+        with open(os.path.join(self.folder,'climate_forcing',filename),'w') as f: f.write('raster')
+        inc.write('{:15.0f}     ../climate_forcing/{:s}\n'.format(i*86400.,filename))
+    
+  def testCache(self):
+    ''' test population, rewriting of include files and reference counting '''
+    cache = ForcingCache(self.cache_folder)
+    sources = [os.path.join(self.folder,'climate_forcing','pet_iTime_{:02d}.asc'.format(i+1)) for i in range(3)]
+    mapping = cache.populate(sources)
+    assert all(os.path.isfile(cached) and cached.startswith(self.cache_folder) for cached in mapping.values())
+    # rewrite include file in place
+    rewriteInputFilelist(inc_file='pet.inc', inc_folder='.', rundir=self.rundir, path_map=mapping.get)
+    with open(os.path.join(self.rundir,'pet.inc')) as inc: lines = inc.readlines()
+    assert len(lines) == 3 and lines[2].split() == ['172800', mapping[sources[2]]], lines
+    # references: the cache is only removed, when the last reference is released
+    ref1 = cache.acquire(sources); ref2 = ForcingCache(self.cache_folder).acquire(sources)
+    assert not cache.release(ref1) and os.path.exists(mapping[sources[0]])
+    assert cache.release(ref2) and not os.path.exists(mapping[sources[0]])
+    # files are restored when a reference is acquired
+    cache.release(cache.acquire(sources), lcleanup=False)
+    assert os.path.exists(mapping[sources[0]])
+
+
+## tests for parallel compression of binary output
+class CompressionTest(FolderTestCase):  
+  test_folders = ('compression',)
+  
+  def setUp(self):
+    ''' create a run folder with binary output files '''
+    super(CompressionTest,self).setUp()
+    self.rundir = self.folder
+    self.bin_files = ['testo.head_pm.0001','testo.head_olf.0001','testo.head_pm.0002','testo.head_olf.0002',
+                      'testo.sat_pm.0002']
+    for i,filename in enumerate(self.bin_files):
+      with open(os.path.join(self.rundir,filename),'wb') as f: f.write(bytes([i])*(1000*(i+1)))
+    
+  def testCompression(self):
+    ''' test archive with index, random access and initial conditions from the archive '''
+    compressor = Compressor(self.rundir, nthreads=2)
+    compressor.submit(self.bin_files[:2]) # e.g. from the watch thread
+    with open(os.path.join(self.rundir,self.bin_files[0]),'ab') as f: f.write(b'modified') # recompressed
+    index = compressor.finish(self.bin_files)
+    assert archiveMembers(self.rundir) == sorted(self.bin_files)
+    assert not any(os.path.exists(os.path.join(self.rundir,filename)) for filename in self.bin_files)
+    assert not os.path.exists(os.path.join(self.rundir,compressor.tmp_folder))
+    assert index['members']['testo.sat_pm.0002']['size'] == 5000
+    assert readMember(self.rundir, 'testo.head_pm.0001') == bytes([0])*1000 + b'modified'
+    assert readMember(self.rundir, 'testo.sat_pm.0002') == bytes([4])*5000
+    # the archive is a regular tar file
+    tar = subprocess.check_output(['tar','tf',compressor.archive], cwd=self.rundir).decode().split()
+    assert tar == [filename+'.gz' for filename in sorted(self.bin_files)], tar
+    # initial conditions are extracted from the archive
+    hgs = HGS(rundir=self.rundir, project='test', length=24, input_interval='monthly', input_mode='steady-state')
+    ic_pattern = os.path.join(os.path.abspath(self.rundir),'testo.{FILETYPE}.0002')
+    assert hgs.lastOutput() == ic_pattern
+    with open(ic_pattern.format(FILETYPE='head_olf'),'rb') as f: assert f.read() == bytes([3])*4000
+    assert not os.path.exists(os.path.join(self.rundir,'testo.head_pm.0001'))
+    # archive members are not added to the shared run folder index
+    index = hgs.rundirIndex()
+    assert hgs.rundirIndex() is index and 'testo.head_pm.0001' not in index.entries
+
+
+## tests for the run folder index
+class RunDirIndexTest(FolderTestCase):  
+  test_folders = ('rundir_index',)
+  
+  def setUp(self):
+    ''' create a run folder with a few output files '''
+    super(RunDirIndexTest,self).setUp()
+    self.rundir = self.folder
+    os.makedirs(os.path.join(self.rundir,'restart_0001'))
+    for filename in ('testo.head_pm.0001','testo.head_pm.0002','testo.head_olf.0002','testo.sat_pm.0002',
+                     'testo.ElemK_pm.0001','testo.hydrograph.outlet.dat','testo.newton_info.dat',
+                     'testo.water_balance.dat','log.grok','log.hgs_run','test.grok'):
+      open(os.path.join(self.rundir,filename),'w').close()
+    
+  def testClassify(self):
+    ''' test classification and collectors based on a single scan '''
+    index = RunDirIndex(self.rundir, prefix='test')
+    binary_files = binaryFiles(prefix='test', ldict=True, index=index)
+    assert binary_files['head_pm'] == ['testo.head_pm.0001','testo.head_pm.0002'], binary_files
+    assert binary_files['others'] == ['testo.sat_pm.0002'], binary_files
+    ts_files = timeseriesFiles(prefix='test', ldict=True, index=index)
+    assert ts_files['hydrographs'] == ['testo.hydrograph.outlet.dat'] and ts_files['wells'] == []
+    assert numberedPattern('testo.head_pm.', nidx=4, index=index) == [1,2]
+    assert numberedPattern('restart_', nidx=4, folder=self.rundir) == [1]
+    # incremental refresh
+    assert not index.refresh() # folder was not modified
+    open(os.path.join(self.rundir,'testo.head_olf.0003'),'w').close()
+    os.utime(self.rundir, ns=(0,0)) # make sure the modification time changes
+    assert index.refresh() and index.category('testo.head_olf.0003') == 'head_olf'
+    index.discard('testo.head_pm.0001')
+    assert index.glob('*.[0-9][0-9][0-9][0-9]') == ['testo.ElemK_pm.0001','testo.head_olf.0002','testo.head_olf.0003',
+                                                   'testo.head_pm.0002','testo.sat_pm.0002']
+    # copies are independent
+    copy = index.copy(); copy.add('testo.head_pm.0004')
+    assert 'testo.head_pm.0004' not in index.entries and not copy.refresh()
+
+
+## tests for the indexed Grok configuration
+class GrokLinesTest(unittest.TestCase):  
+  
+  def testIndex(self):
+    ''' test lookups and incremental index updates '''
+    lines = GrokLines(['initial time','0','output times','1','2','end','ic','h1','ic','h2'])
+    assert lines.index('ic') == 6 and lines.index('ic', 7) == 8 and lines.find('ic', 9) is None
+    assert lines.findAll('ic') == [6,8] and lines.blockEnd(2) == 5 and 'end' in lines
+    lines[6] = '! ic'; lines += ['ic','h3']
+    assert lines.findAll('ic') == [8,10] and lines.find('! ic') == 6
+    # splicing invalidates the index
+    lines[3:5] = ['1','2','3']
+    assert lines.blockEnd(2) == 6 and lines.findAll('ic') == [9,11]
+    # slices of the same length are updated in place
+    lines[3:6] = ['4','1','end']
+    assert lines._index is not None and lines.findAll('end') == [5,6] and lines.find('1') == 4
+    assert '2' not in lines and lines.count('3') == 0
+    self.assertRaises(ValueError, lines.index, 'missing')
+    
+  def testEdit(self):
+    ''' test Grok parameter editing with the indexed configuration '''
+    grok = Grok.__new__(Grok) # no files required
+    grok._lines = GrokLines(['output times','1','2','end','x','1','2','end','y','x','3','end'])
+    grok.setParam('output times', [5,6,7], formatter='{:e}')
+    assert grok.getParam('output times', float) == [5.,6.,7.]
+    assert grok.remParam('x', llist=True, lall=True) == [9,13]
+    assert grok._lines[8:13] == ['! end','y','! x','! 3','! end'], grok._lines
+    assert grok.getParam('y', llist=False) == '! x'
+    
+  def testTemplateCache(self):
+    ''' test that templates are parsed once and copies are independent '''
+    folder = os.path.join(workdir,'grok_template')
+    if os.path.exists(folder): shutil.rmtree(folder)
+    os.makedirs(folder)
+    with open(os.path.join(folder,'test.grok'), 'w') as f: f.write('initial time\n0\ninclude props.inc\n')
+    with open(os.path.join(folder,'props.inc'), 'w') as f: f.write('k\n1\n')
+    lines1 = loadGrokFile(os.path.join(folder,'test.grok'))
+    lines2 = loadGrokFile(os.path.join(folder,'test.grok'))
+    assert lines1 == lines2 == ['initial time','0','k','1'] and lines1 is not lines2
+    lines1[3] = '2'; assert lines2[3] == '1' and lines2.index('1') == 3 and lines1.index('2') == 3
+    # modified includes are parsed again
+    with open(os.path.join(folder,'props.inc'), 'w') as f: f.write('k\n3\n')
+    os.utime(os.path.join(folder,'props.inc'), ns=(0,0))
+    assert loadGrokFile(os.path.join(folder,'test.grok'))[3] == '3'
+    shutil.rmtree(folder)
+
+
+## tests for the Grok output cache
+class GrokCacheTest(FolderTestCase):  
+  test_folders = ('grok_cache','grok_run_1','grok_run_2')
+  
+  def setUp(self):
+    ''' create two run folders with identical inputs and a cache folder '''
+    super(GrokCacheTest,self).setUp()
+    self.lines = ['read nodes', 'nodes.dat', 'end']
+    for rundir in self.folders[1:]:
+      with open(os.path.join(rundir,'nodes.dat'), 'w') as f: f.write('1 2 3')
+    
+  def testHash(self):
+    ''' test that the hash depends on configuration and referenced files '''
+    cache, run1, run2 = self.folders
+    key = grok_cache.grokHash(self.lines, run1)
+    assert key == grok_cache.grokHash(self.lines, run2)
+    assert grok_cache.referencedFiles(self.lines, run1) == ['nodes.dat']
+    assert key != grok_cache.grokHash(self.lines+['! comment'], run1)
+    with open(os.path.join(run2,'nodes.dat'), 'w') as f: f.write('1 2 4')
+    assert key != grok_cache.grokHash(self.lines, run2)
+    
+  def testStoreRestore(self):
+    ''' test storing of Grok output and restoring in another run folder '''
+    cache, run1, run2 = self.folders
+    key = grok_cache.grokHash(self.lines, run1)
+    before = grok_cache.snapshotFolder(run1)
+    for filename in ('testo.coordinates_pm','log.grok','COMPLETED'):
+      with open(os.path.join(run1,filename), 'w') as f: f.write(filename)
+    files = grok_cache.changedFiles(before, grok_cache.snapshotFolder(run1))
+    assert files == ['testo.coordinates_pm'], files
+    grok_cache.storeOutput(cache, key, run1, files)
+    assert grok_cache.restoreOutput(cache, 'missing', run2) is None
+    assert grok_cache.restoreOutput(cache, key, run2) == files
+    with open(os.path.join(run2,'testo.coordinates_pm'), 'r') as f: assert f.read() == 'testo.coordinates_pm'
+    grok_cache.writeHash(run2, key)
+    assert grok_cache.readHash(run2) == key and grok_cache.readHash(run1) is None
+    # writing to restored files does not modify the cache (also for hardlinks, once they are removed)
+    with open(os.path.join(run2,'testo.coordinates_pm'), 'w') as f: f.write('modified')
+    cached = os.path.join(cache,key,'testo.coordinates_pm')
+    with open(cached, 'r') as f: assert f.read() == 'testo.coordinates_pm'
+    assert grok_cache.restoreOutput(cache, key, run2, mode='link') == files and os.stat(cached).st_nlink == 2
+    assert grok_cache.removeOutput(cache, run2) == files and grok_cache.readHash(run2) is None
+    assert not os.path.exists(os.path.join(run2,'testo.coordinates_pm')) and os.stat(cached).st_nlink == 1
+    
+  def testConcurrentStore(self):
+    ''' test that threads storing the same entry concurrently do not interfere '''
+    from concurrent.futures import ThreadPoolExecutor
+    cache, run1, run2 = self.folders
+    files = ['testo.coordinates_pm{:d}'.format(i) for i in range(20)]
+    for filename in files:
+      with open(os.path.join(run1,filename), 'w') as f: f.write(filename*1000)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+      entries = list(executor.map(lambda i: grok_cache.storeOutput(cache, 'key', run1, files), range(16)))
+    assert len(set(entries)) == 1 and os.listdir(cache) == ['key'], os.listdir(cache)
+    assert grok_cache.restoreOutput(cache, 'key', run2) == files
+
+
+## tests for autotuning of parallel settings
+class TuneMember(object):
+  ''' a minimal member that writes a mesh in setup and a Newton log, whose throughput depends on the
+      parallel settings '''
+  problem = 'test'; NP = 2; template_folder = None; hgs_bin = 'hgs.exe'
+  newton_file = 'testo.newton_info.dat'
+  lindicators = True; history_file = None; state_db = None; forcing_cache = None; lrestart = False
+  def __init__(self, rundir): self.rundir = rundir; self.rundirOK = None; self.settings = None
+  def setupRundir(self, **kwargs):
+    os.makedirs(self.rundir); self.rundirOK = True
+    with open(os.path.join(self.rundir,'testo.coordinates_pm'), 'w') as f: f.write('mesh')
+    return 0
+  def setupConfig(self, **kwargs): return 0
+  def runGrok(self, **kwargs): return 0
+  def writeParallelIndex(self, **settings): self.settings = settings; return 0
+  def executeHGS(self, command, logfile=None):
+    sim_time = 10. * self.settings['dom_parts'] * self.settings['solver'] # fake throughput
+    with open(os.path.join(self.rundir,self.newton_file), 'w') as f:
+      f.write('TITLE = "Newton"\nVARIABLES = "Time", "Time step"\nzone t="newton"\n')
+      f.write('{:f} {:f}\n'.format(sim_time, sim_time))
+    return True, 1., None
+
+class AutotuneTest(FolderTestCase):  
+  test_folders = ('autotune_cache','autotune_run','autotune_run_autotune')
+  lcreate = False # the run folder is created by the member
+  
+  def setUp(self):
+    ''' provide clean cache and run folders '''
+    super(AutotuneTest,self).setUp()
+    self.cache, self.rundir = self.folders[:2]
+    
+  def testCandidates(self):
+    ''' test the generation of candidate settings '''
+    settings = candidateSettings(2)
+    assert len(settings) == 8 and settings[0] == dict(NP=2, dom_parts=2, solver=1, input_coloring=False)
+    assert len(candidateSettings(1, nps=(1,1), dom_factors=(1,), colorings=(False,))) == 2
+    
+  def testTune(self):
+    ''' test trial runs, selection of the best settings and caching '''
+    member = TuneMember(self.rundir)
+    tuner = Autotuner(cache_folder=self.cache, runtime=60., ncores=4)
+    record = tuner.tune(member)
+    assert record['settings'] == dict(NP=2, dom_parts=4, solver=2, input_coloring=False), record['settings']
+    assert len(record['trials']) == 8 and not os.path.exists(self.rundir+'_autotune')
+    # the cache is keyed by mesh (looked up in the run folder)
+    assert tuner.lookup(member) is None
+    TuneMember(self.rundir).setupRundir()
+    assert tuner.lookup(member)['settings'] == record['settings']
+    # settings are used as defaults for the parallel index file
+    hgs = HGS.__new__(HGS); hgs.rundir = self.rundir; hgs.NP = 2
+    hgs.pidx_settings = {k:v for k,v in record['settings'].items() if k != 'NP'}
+    hgs.writeParallelIndex()
+    with open(os.path.join(self.rundir,hgs.pidx_file)) as f: lines = [line.strip() for line in f]
+    assert lines[3] == '4' and lines[5] == '2', lines
+
+
+## tests for CPU affinity and process priority
+def reportCores(cpus=None): return cpus
+
+class AffinityTest(unittest.TestCase):  
+  
+  def testCoreSet(self):
+    ''' test NUMA topology and assignment of disjoint core sets '''
+    assert parseCPUList('0-3,8,10-11\n') == [0,1,2,3,8,10,11]
+    folder = os.path.join(workdir,'numa_test')
+    for i,cpulist in enumerate(('0-3','4-7')):
+      os.makedirs(os.path.join(folder,'node{:d}'.format(i)), exist_ok=True)
+      with open(os.path.join(folder,'node{:d}'.format(i),'cpulist'), 'w') as f: f.write(cpulist)
+    assert numaNodes(cores=range(10), folder=folder) == [[0,1,2,3],[4,5,6,7],[8,9]]
+    shutil.rmtree(folder)
+    coreset = CoreSet(nodes=[[0,1,2,3],[4,5,6,7]])
+    assert coreset.allocate(2) == [0,1] and coreset.allocate(4) == [4,5,6,7] # best fit
+    assert coreset.allocate(2) == [2,3] and coreset.allocate(1) is None
+    coreset.release([0,1,4,5,6]); assert coreset.nfree() == 5
+    assert coreset.allocate(4) == [0,4,5,6] # spread over nodes
+    coreset = CoreSet(ncores=6, nodes=[[0,1,2,3],[4,5,6,7]]) # whole nodes first
+    assert coreset.nodes == [[0,1,2,3],[4,5]] and len(coreset) == 6
+    
+  def testLaunch(self):
+    ''' test pinning and renicing of a child process and core assignment by the scheduler '''
+    if not hasattr(os, 'sched_getaffinity'): return
+    core = sorted(os.sched_getaffinity(0))[0]
+    script = 'import os; print(sorted(os.sched_getaffinity(0)), os.nice(0))'
+    command = launchCommand([sys.executable, '-c', script], dict(cpus=[core], nice=2))
+    assert command[-3] == sys.executable
+    output = subprocess.check_output(command).decode().strip()
+    assert output == '[{:d}] {:d}'.format(core, os.nice(0)+2), output
+    assert launchCommand(['hgs'], None) == ['hgs']
+    # cores are passed to the job function
+    jobs = [Job(i) for i in range(2)]
+    assert CoreScheduler(ncores=1, lpin=True).run(reportCores, jobs) == [[core],[core]]
+    assert CoreScheduler(ncores=1).run(reportCores, jobs) == [None,None]
+
+
+## tests for the run time history
+class HistoryTest(FolderTestCase):  
+  test_folders = ('history_test',)
+  
+  def setUp(self):
+    ''' create a history file with a few records '''
+    super(HistoryTest,self).setUp()
+    self.history_file = os.path.join(self.folder,'test_history.jsonl')
+    history = RunHistory(self.history_file)
+    # wall time proportional to simulated time and mesh size
+    for i,(sim_time,mesh_size) in enumerate([(100,10),(200,10),(100,40),(400,20)]):
+      history.record(rundir=os.path.abspath('run_{:d}'.format(i)), sim_time=sim_time, mesh_size=mesh_size, 
+                     wall_time=0.5*sim_time*mesh_size, success=True) # like HGS.recordHistory
+    # a run that crashed early (ignored for prediction)
+    history.record(rundir=os.path.abspath('run_1'), sim_time=10, mesh_size=10, wall_time=1000., success=False)
+    
+  def testPredict(self):
+    ''' test run time prediction from history and regression '''
+    history = RunHistory(self.history_file)
+    assert len(history.records) == 5, history.records
+    # same rundir (relative or absolute path): scale previous successful run
+    assert np.isclose(history.predict(rundir='run_1', sim_time=400), 2000.)
+    assert np.isclose(history.predict(rundir=os.path.abspath('run_1'), sim_time=400), 2000.)
+    # new rundir: regression on simulated time and mesh size
+    assert np.isclose(history.predict(rundir='new', sim_time=300, mesh_size=30), 4500.)
+    assert history.predict(rundir='new', sim_time=None) is None
+    # ordering
+    assert longestFirst([10.,None,30.,20.]) == [2,3,0,1]
+
+
 if __name__ == "__main__":
 
     
@@ -540,6 +1383,7 @@ if __name__ == "__main__":
 #     specific_tests += ['RunEns']
 #     specific_tests += ['RunGrok']
 #     specific_tests += ['RunHGS']
+#     specific_tests += ['RunPipeline']
 #     specific_tests += ['SetTime']
 #     specific_tests += ['Setup']
 #     specific_tests += ['SetupExp']
@@ -552,6 +1396,25 @@ if __name__ == "__main__":
     # list of variable tests
 #     tests += ['Grok']
 #     tests += ['HGS']    
+#     tests += ['Scheduler']
+#     tests += ['History']
+#     tests += ['State']
+#     tests += ['Supervisor']
+#     tests += ['Monitor']
+#     tests += ['Watchdog']
+#     tests += ['Materialize']
+#     tests += ['GrokLines']
+#     tests += ['RunDirIndex']
+#     tests += ['StateDB']
+#     tests += ['WorkQueue']
+#     tests += ['Dependency']
+#     tests += ['Staging']
+#     tests += ['ForcingCache']
+#     tests += ['Compression']
+#     tests += ['Concat']
+#     tests += ['GrokCache']
+#     tests += ['Autotune']
+#     tests += ['Affinity']
     tests += ['EnsHGS']
 
     # construct dictionary of test classes defined above